@@ -0,0 +1,263 @@
+"""
+Cubo de estatísticas por área (MSOA ou LTLA), calculado uma vez a partir da
+FlowTable e guardado em colunas (Arrow IPC).
+
+Para cada área: total que chega (inflow, postos de trabalho) e que sai
+(outflow, moradores que trabalham), quem mora e trabalha na própria área
+(internal), autocontenção (internal/outflow e internal/inflow), número de
+parceiros, top-k origens e destinos e o histograma das contagens dos fluxos
+nas faixas da MobilityLegend. Fluxos da área para ela mesma entram nos totais
+mas não nos parceiros nem nos histogramas (não viram linhas no mapa).
+
+No nível MSOA os totais (inflow, outflow, internal) vêm de `od_totals`: todas
+as linhas do parquet, como o groupby antigo do analyze_top_areas.py, inclusive
+áreas e parceiros sem centróide (essas áreas entram no cubo só com os totais).
+Parceiros, top-k e histogramas usam a FlowTable, ou seja, só fluxos que viram
+linha no mapa. No nível LTLA tudo vem da tabela agregada.
+
+Tudo é vetorizado: totais e histogramas com np.bincount e o top-k sai do
+próprio índice CSR (já ordenado por contagem dentro de cada área). Consultar
+uma área é indexar os arrays pela posição na AreaTable: O(1).
+"""
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from index_file import StaleIndexError, fingerprint, matches_fingerprint
+
+FORMAT_VERSION = 2
+TOP_K = 10
+# Mesmas faixas da MobilityLegend
+BIN_EDGES = np.array([100, 500, 1000, 5000])
+BIN_LABELS = ["0-100", "100-500", "500-1000", "1000-5000", "5000+"]
+
+
+def _top_partners(csr, partner_ids, counts, internal, k):
+    """(ids, contagens) dos k maiores parceiros de cada área, sem o fluxo interno; -1 = vazio.
+
+    O CSR já vem ordenado por contagem dentro de cada área: basta numerar as
+    linhas de cada grupo e ficar com as k primeiras.
+    """
+    indptr, order = csr
+    n = len(indptr) - 1
+    order = np.asarray(order)
+    external = ~internal[order]
+    rows = order[external]
+    group = np.repeat(np.arange(n), np.diff(indptr))[external]
+    starts = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(group, minlength=n), out=starts[1:])
+    rank = np.arange(len(rows)) - starts[group]
+    top = rank < k
+    ids = np.full((n, k), -1, dtype=np.int32)
+    top_counts = np.zeros((n, k), dtype=np.int64)
+    ids[group[top], rank[top]] = partner_ids[rows[top]]
+    top_counts[group[top], rank[top]] = counts[rows[top]]
+    return ids, top_counts
+
+
+def od_totals(parquet_path):
+    """Totais por código sobre todas as linhas do parquet (groupby do caminho antigo).
+
+    Retorna {"codes", "names", "inflow", "outflow", "internal"}, códigos
+    ordenados; o nome é o primeiro rótulo do censo visto para o código.
+    Só lê as colunas do parquet: não depende do lookup de centróides.
+    """
+    text_cols = ["origin_code", "origin_name", "dest_code", "dest_name"]
+    table = pq.read_table(parquet_path, columns=text_cols + ["count"], read_dictionary=text_cols)
+    sides = {}
+    for side in ("origin", "dest"):
+        codes = table.column(f"{side}_code").combine_chunks()
+        sides[side] = (codes.dictionary.to_numpy(zero_copy_only=False).astype(str), codes.indices.to_numpy())
+    all_codes = np.unique(np.concatenate([values for values, _ in sides.values()]))
+    n = len(all_codes)
+    ids = {side: np.searchsorted(all_codes, values)[indices] for side, (values, indices) in sides.items()}
+    counts = table.column("count").to_numpy().astype(np.int64)
+    same = ids["origin"] == ids["dest"]
+
+    names = np.full(n, None, dtype=object)
+    for side in ("origin", "dest"):  # destino por último prevalece, como na FlowTable.from_parquet
+        column = table.column(f"{side}_name").combine_chunks()
+        uniq, first = np.unique(ids[side], return_index=True)
+        names[uniq] = column.dictionary.to_numpy(zero_copy_only=False)[column.indices.to_numpy()[first]]
+    return {
+        "codes": all_codes,
+        "names": names,
+        "inflow": np.bincount(ids["dest"], weights=counts, minlength=n).astype(np.int64),
+        "outflow": np.bincount(ids["origin"], weights=counts, minlength=n).astype(np.int64),
+        "internal": np.bincount(ids["origin"][same], weights=counts[same], minlength=n).astype(np.int64),
+    }
+
+
+def _self_containment(internal, total):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, internal / total, np.nan).astype(np.float32)
+
+
+def _with_totals(codes, names, columns, totals):
+    """Estende o cubo às áreas de `totals` e troca os totais pelos de `od_totals`."""
+    all_codes = np.union1d(codes, totals["codes"])
+    rows = np.searchsorted(all_codes, codes)  # linha no cubo de cada id da FlowTable
+    n = len(all_codes)
+    extended = {}
+    for name, values in columns.items():
+        fill = -1 if name.endswith("_ids") else (np.nan if values.dtype.kind == "f" else 0)
+        out = np.full((n,) + values.shape[1:], fill, dtype=values.dtype)
+        out[rows] = np.where(values >= 0, rows[values], -1) if name.endswith("_ids") else values
+        extended[name] = out
+
+    total_rows = np.searchsorted(all_codes, totals["codes"])
+    for name in ("inflow", "outflow", "internal"):
+        extended[name] = np.zeros(n, dtype=np.int64)
+        extended[name][total_rows] = totals[name]
+    extended["self_containment"] = _self_containment(extended["internal"], extended["outflow"])
+    extended["job_self_containment"] = _self_containment(extended["internal"], extended["inflow"])
+
+    all_names = np.full(n, None, dtype=object)
+    all_names[total_rows] = totals["names"]
+    known = np.array([isinstance(v, str) for v in names], dtype=bool)
+    all_names[rows[known]] = np.asarray(names, dtype=object)[known]
+    return all_codes, all_names, extended
+
+
+class AreaStats:
+    """Estatísticas por área alinhadas com a AreaTable (linha i = área de id i)."""
+
+    def __init__(self, codes, names, columns, level, k=TOP_K):
+        self.codes = np.asarray(codes).astype(str)
+        self.names = np.asarray(names, dtype=object)
+        self.columns = columns
+        self.level = level
+        self.k = k
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, flows, level, k=TOP_K, totals=None):
+        """Calcula o cubo a partir de uma FlowTable (com índice CSR).
+
+        Com `totals` (od_totals), os totais e a autocontenção contam todas as
+        linhas do parquet e as áreas sem centróide também ganham uma linha.
+        """
+        areas = flows.areas
+        n = len(areas)
+        origin, dest = np.asarray(flows.origin_ids), np.asarray(flows.dest_ids)
+        counts = np.asarray(flows.counts, dtype=np.int64)
+        internal = origin == dest
+
+        inflow = np.bincount(dest, weights=counts, minlength=n).astype(np.int64)
+        outflow = np.bincount(origin, weights=counts, minlength=n).astype(np.int64)
+        self_flow = np.bincount(origin[internal], weights=counts[internal], minlength=n).astype(np.int64)
+        self_containment = _self_containment(self_flow, outflow)
+        job_self_containment = _self_containment(self_flow, inflow)
+
+        external = ~internal
+        bins = np.searchsorted(BIN_EDGES, counts[external], side="left")
+        nb = len(BIN_LABELS)
+        in_bins = np.bincount(dest[external] * nb + bins, minlength=n * nb).reshape(n, nb)
+        out_bins = np.bincount(origin[external] * nb + bins, minlength=n * nb).reshape(n, nb)
+
+        top_origins, top_origin_counts = _top_partners(flows.index.incoming, origin, counts, internal, k)
+        top_dests, top_dest_counts = _top_partners(flows.index.outgoing, dest, counts, internal, k)
+        columns = {
+            "inflow": inflow,
+            "outflow": outflow,
+            "internal": self_flow,
+            "self_containment": self_containment,
+            "job_self_containment": job_self_containment,
+            "n_origins": in_bins.sum(axis=1).astype(np.int32),
+            "n_destinations": out_bins.sum(axis=1).astype(np.int32),
+            "top_origin_ids": top_origins,
+            "top_origin_counts": top_origin_counts,
+            "top_dest_ids": top_dests,
+            "top_dest_counts": top_dest_counts,
+            "in_bins": in_bins.astype(np.int32),
+            "out_bins": out_bins.astype(np.int32),
+        }
+        codes, names = areas.codes, areas.names
+        if totals is not None:
+            codes, names, columns = _with_totals(np.asarray(codes).astype(str), names, columns, totals)
+        return cls(codes, names, columns, level, k)
+
+    def write(self, path, sources):
+        """Grava em Arrow IPC; `sources` (nome -> caminho) detecta arquivos desatualizados."""
+        table = {"code": pa.array(self.codes.tolist(), type=pa.string()),
+                 "name": pa.array([n if isinstance(n, str) else None for n in self.names], type=pa.string())}
+        for name, values in self.columns.items():
+            if values.ndim == 2:
+                flat = pa.array(values.reshape(-1))
+                table[name] = pa.FixedSizeListArray.from_arrays(flat, values.shape[1])
+            else:
+                table[name] = pa.array(values)
+        meta = {"version": str(FORMAT_VERSION), "level": self.level, "k": str(self.k),
+                "sources": json.dumps({k: fingerprint(p) for k, p in sources.items()})}
+        table = pa.table(table).replace_schema_metadata(meta)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, sources=None):
+        """Abre o arquivo via memory-map; StaleIndexError se versão/origem não baterem."""
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        meta = {k.decode(): v.decode() for k, v in table.schema.metadata.items()}
+        if int(meta["version"]) != FORMAT_VERSION:
+            raise StaleIndexError(f"versão das estatísticas {meta['version']} != {FORMAT_VERSION}")
+        saved = json.loads(meta["sources"])
+        for name, src in (sources or {}).items():
+            if name not in saved or (os.path.exists(src) and not matches_fingerprint(saved[name], src)):
+                raise StaleIndexError(f"estatísticas desatualizadas em relação a {src}")
+        columns = {}
+        for name in table.column_names[2:]:
+            column = table.column(name).combine_chunks()
+            if pa.types.is_fixed_size_list(column.type):
+                columns[name] = column.flatten().to_numpy().reshape(len(column), column.type.list_size)
+            else:
+                columns[name] = column.to_numpy(zero_copy_only=False)
+        return cls(table.column("code").to_numpy(zero_copy_only=False),
+                   table.column("name").to_numpy(zero_copy_only=False), columns, meta["level"], int(meta["k"]))
+
+    def lookup(self, code):
+        i = int(np.searchsorted(self.codes, code))
+        if i < len(self.codes) and self.codes[i] == code:
+            return i
+        return None
+
+    def _partners(self, ids, counts):
+        return [{"code": str(self.codes[j]), "name": self.names[j] if isinstance(self.names[j], str) else None,
+                 "count": int(c)} for j, c in zip(ids.tolist(), counts.tolist()) if j >= 0]
+
+    def area_json(self, i):
+        """Estatísticas de uma área (id) como dict serializável."""
+        c = self.columns
+
+        def ratio(value):
+            return None if np.isnan(value) else round(float(value), 4)
+
+        return {
+            "code": str(self.codes[i]),
+            "name": self.names[i] if isinstance(self.names[i], str) else None,
+            "level": self.level,
+            "inflow": int(c["inflow"][i]),
+            "outflow": int(c["outflow"][i]),
+            "internal": int(c["internal"][i]),
+            "net_inflow": int(c["inflow"][i] - c["outflow"][i]),
+            "self_containment": ratio(c["self_containment"][i]),
+            "job_self_containment": ratio(c["job_self_containment"][i]),
+            "n_origins": int(c["n_origins"][i]),
+            "n_destinations": int(c["n_destinations"][i]),
+            "top_origins": self._partners(c["top_origin_ids"][i], c["top_origin_counts"][i]),
+            "top_destinations": self._partners(c["top_dest_ids"][i], c["top_dest_counts"][i]),
+            "count_bins": {"labels": BIN_LABELS,
+                           "incoming": c["in_bins"][i].tolist(),
+                           "outgoing": c["out_bins"][i].tolist()},
+        }
+
+    def top(self, column, n=10):
+        """Ids das n áreas com maior valor em `column` (ordem decrescente)."""
+        values = self.columns[column]
+        return np.argsort(-values, kind="stable")[:n]
@@ -0,0 +1,108 @@
+"""
+Tabela compartilhada de áreas (MSOA): código, nome e centróide em float32.
+
+Os fluxos guardam apenas ids int32 que apontam para esta tabela; nomes e
+coordenadas só são "juntados" na hora de serializar a resposta. Os trechos
+JSON de cada área (código, nome, [lon,lat]) são pré-codificados uma vez.
+"""
+import copy
+import json
+
+import numpy as np
+import pandas as pd
+
+MAX_PRECISION = 8  # float32 não tem mais casas significativas que isso
+
+
+def _normalize_precision(precision):
+    if precision is None:
+        return None
+    precision = max(0, min(int(precision), MAX_PRECISION))
+    return None if precision == MAX_PRECISION else precision
+
+
+def format_coords(lon, lat, precision=None):
+    """Trechos JSON "[lon,lat]" para vetores float32 de coordenadas."""
+    if precision is None:
+        # repr mais curto do float32 (ex.: -0.09471934)
+        pairs = zip(map(str, lon), map(str, lat))
+    else:
+        pairs = zip(np.round(np.asarray(lon, dtype=np.float64), precision).tolist(),
+                    np.round(np.asarray(lat, dtype=np.float64), precision).tolist())
+    return [f"[{x},{y}]" for x, y in pairs]
+
+
+class AreaTable:
+    """Áreas ordenadas por código; o id de uma área é sua posição na tabela."""
+
+    def __init__(self, codes, names, lat, lon):
+        order = np.argsort(np.asarray(codes).astype(str), kind="stable")
+        self.codes = np.asarray(codes).astype(str)[order]
+        self.names = np.asarray(names, dtype=object)[order]
+        self.lat = np.asarray(lat, dtype=np.float32)[order]
+        self.lon = np.asarray(lon, dtype=np.float32)[order]
+        # Fragmentos JSON prontos (listas Python: indexação barata por id)
+        self.code_json = [json.dumps(c) for c in self.codes.tolist()]
+        self.name_json = [json.dumps(n) if isinstance(n, str) else "null" for n in self.names]
+        self._coord_json = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_csv(cls, lookup_path):
+        """Lê o areas_centroids.csv (code, name, lat, lon), ignorando áreas sem centróide."""
+        lut = pd.read_csv(lookup_path, dtype={"code": "string"})
+        lut = lut.dropna(subset=["lat", "lon"]).drop_duplicates(subset=["code"])
+        return cls(lut["code"].to_numpy(), lut["name"].to_numpy(), lut["lat"].to_numpy(), lut["lon"].to_numpy())
+
+    def lookup(self, area_code):
+        """Busca binária do id de uma área; None se não existir."""
+        i = int(np.searchsorted(self.codes, area_code))
+        if i < len(self.codes) and self.codes[i] == area_code:
+            return i
+        return None
+
+    def ids_of(self, codes):
+        """Ids para um vetor de códigos (-1 para códigos desconhecidos)."""
+        codes = np.asarray(codes).astype(str)
+        pos = np.searchsorted(self.codes, codes)
+        pos = np.minimum(pos, len(self.codes) - 1)
+        return np.where(self.codes[pos] == codes, pos, -1).astype(np.int32)
+
+    def set_names(self, ids, names):
+        """Sobrescreve nomes (ex.: rótulos do censo) para os ids dados."""
+        self.names[ids] = names
+        for i, name in zip(np.asarray(ids).tolist(), list(names)):
+            self.name_json[i] = json.dumps(name) if isinstance(name, str) else "null"
+
+    def coord_json(self, precision=None):
+        """Lista com o trecho "[lon,lat]" de cada área, cacheada por precisão."""
+        precision = _normalize_precision(precision)
+        if precision not in self._coord_json:
+            self._coord_json[precision] = format_coords(self.lon, self.lat, precision)
+        return self._coord_json[precision]
+
+    def with_point(self, code, name, lat, lon):
+        """Cópia rasa com uma área sintética extra no id len(self).
+
+        Usada para serializar agregações (ex.: "seleção" no endpoint batch).
+        A cópia serve só para codificar respostas: lookup() não enxerga o ponto.
+        """
+        lat32 = np.asarray([lat], dtype=np.float32)
+        lon32 = np.asarray([lon], dtype=np.float32)
+        extended = copy.copy(self)
+        extended.codes = np.append(self.codes, code)
+        extended.names = np.append(self.names, np.asarray([name], dtype=object))
+        extended.lat = np.append(self.lat, lat32)
+        extended.lon = np.append(self.lon, lon32)
+        extended.code_json = self.code_json + [json.dumps(code)]
+        extended.name_json = self.name_json + [json.dumps(name)]
+        extended._coord_json = {p: frags + format_coords(lon32, lat32, p)
+                                for p, frags in self._coord_json.items()}
+        return extended
+
+    @property
+    def nbytes(self):
+        return int(self.codes.nbytes + self.lat.nbytes + self.lon.nbytes
+                   + sum(len(n) for n in self.name_json))
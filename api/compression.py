@@ -0,0 +1,36 @@
+"""
+Compressão das respostas da API (brotli ou gzip) negociada pelo Accept-Encoding.
+
+As respostas de fluxos são texto GeoJSON bem repetitivo (códigos, nomes e
+coordenadas): comprimir reduz o tráfego em 5-10x. O corpo comprimido de cada
+codificação fica guardado junto da entrada do cache LRU, então cada resposta
+é comprimida uma única vez. brotli é opcional: sem o pacote, só gzip.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+MIN_SIZE = 1024  # abaixo disso o cabeçalho da compressão não compensa
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # bom equilíbrio entre taxa e tempo para respostas dinâmicas
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings, size):
+    """Melhor codificação aceita pelo cliente para um corpo de `size` bytes (ou None)."""
+    if size < MIN_SIZE:
+        return None
+    best = accept_encodings.best_match(ENCODINGS)
+    return best if best in ENCODINGS else None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, GZIP_LEVEL)
+    raise ValueError(f"codificação não suportada: {encoding}")
@@ -0,0 +1,203 @@
+"""
+Backend DuckDB para a API de fluxos: consulta o parquet ordenado em vez de
+manter os fluxos em memória.
+
+Mesma interface de consulta da FlowTable (areas, flows, selection_flows,
+aggregate_selection), então o flows_api troca de backend sem mudar as rotas
+(FLOWS_BACKEND=duckdb). Só a AreaTable (~7k áreas) fica em memória.
+
+- Pool de cursores: cada requisição pega um cursor da mesma base DuckDB
+  (cursores são conexões independentes e podem rodar em paralelo).
+- Consultas por área com parâmetros ligados (código, limite, LTLA de
+  origem): nada do cliente é interpolado no SQL.
+- Mesma ordem da FlowTable: contagem decrescente e, nos empates, a ordem das
+  linhas no parquet (file_row_number). Na cópia particionada a ordem do
+  arquivo se perde; os empates vão por destino, que é a ordem do parquet
+  gravado pelo 01_csv_to_parquet.py (ordenado por dest_code). Na seleção
+  (batch) os empates vão pela ordem do parquet, sem agrupar por área.
+- Nomes: min() dos rótulos do censo de cada área (determinístico; os
+  rótulos de um código são iguais em todas as linhas).
+- Predicate pushdown: o parquet está ordenado por dest_code, então o filtro
+  por destino lê só os row groups daquela área (estatísticas min/max). Para
+  saídas, se existir a cópia particionada por LTLA de origem
+  (01_csv_to_parquet.py --partition-by-origin-region), o filtro pela
+  partição descarta os outros arquivos inteiros.
+- Os códigos viram ids da AreaTable no próprio SQL (join com a tabela
+  `areas`), descartando fluxos sem centróide como a FlowTable.
+"""
+import os
+import queue
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from areas import AreaTable
+
+NO_LIMIT = 2**62
+
+_FLOWS_SQL = """
+    SELECT a.id AS origin_id, b.id AS dest_id, f.count
+    FROM {source} f
+    JOIN areas a ON f.origin_code = a.code
+    JOIN areas b ON f.dest_code = b.code
+    WHERE {where}
+    ORDER BY f.count DESC, {ties}
+    LIMIT $2
+"""
+
+# Fluxos que tocam a seleção (registrada como relação `selection` no cursor)
+_SELECTION_SQL = """
+    SELECT a.id AS origin_id, b.id AS dest_id, f.count, f.file_row_number AS row,
+           f.origin_code IN (SELECT code FROM selection) AS o_in,
+           f.dest_code IN (SELECT code FROM selection) AS d_in
+    FROM flows f
+    JOIN areas a ON f.origin_code = a.code
+    JOIN areas b ON f.dest_code = b.code
+    WHERE f.dest_code IN (SELECT code FROM selection) OR f.origin_code IN (SELECT code FROM selection)
+"""
+
+
+def sql_literal(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+class DuckDBFlows:
+    """Fluxos MSOA consultados no parquet via DuckDB, com a interface da FlowTable."""
+
+    def __init__(self, parquet_path, lookup_path, ltla_lookup_path=None, partitioned_dir=None, pool_size=4):
+        import duckdb  # dependência opcional: só quando FLOWS_BACKEND=duckdb
+
+        self.areas = AreaTable.from_csv(lookup_path)
+        self.con = duckdb.connect(database=":memory:")
+        self.con.execute("CREATE VIEW flows AS SELECT * FROM "
+                         f"read_parquet({sql_literal(parquet_path)}, file_row_number = true)")
+        codes = pa.table({"id": pa.array(np.arange(len(self.areas), dtype=np.int32)),
+                          "code": pa.array(self.areas.codes.tolist(), type=pa.string())})
+        self.con.register("areas_arrow", codes)
+        self.con.execute("CREATE TABLE areas AS SELECT * FROM areas_arrow")
+        self.con.unregister("areas_arrow")
+
+        # Saídas pela cópia particionada: LTLA de origem de cada área
+        self.origin_ltla = None
+        if partitioned_dir and ltla_lookup_path and os.path.isdir(partitioned_dir):
+            lut = pd.read_csv(ltla_lookup_path, usecols=["msoa21cd", "ltla22cd"], dtype="string")
+            lut = lut.dropna().drop_duplicates(subset=["msoa21cd"])
+            self.origin_ltla = dict(zip(lut["msoa21cd"], lut["ltla22cd"]))
+            pattern = os.path.join(partitioned_dir, "*", "*.parquet")
+            self.con.execute("CREATE VIEW flows_by_origin AS SELECT * FROM "
+                             f"read_parquet({sql_literal(pattern)}, hive_partitioning = true)")
+
+        # Nomes exibidos: rótulos do censo no parquet (como FlowTable.from_parquet)
+        for side in ("origin", "dest"):
+            names = self.con.execute(f"""
+                SELECT a.id, min(f.{side}_name) AS name FROM flows f JOIN areas a ON f.{side}_code = a.code
+                GROUP BY a.id
+            """).fetchnumpy()
+            self.areas.set_names(names["id"], np.asarray(names["name"], dtype=object))
+        self.n_flows = self.con.execute("""
+            SELECT count(*) FROM flows f
+            JOIN areas a ON f.origin_code = a.code JOIN areas b ON f.dest_code = b.code
+        """).fetchone()[0]
+
+        # Consultas por área ($1 = código, $2 = limite, $3 = LTLA de origem)
+        self.sql = {"incoming": _FLOWS_SQL.format(source="flows", where="f.dest_code = $1",
+                                                  ties="f.file_row_number")}
+        if self.origin_ltla is not None:
+            self.sql["outgoing"] = _FLOWS_SQL.format(
+                source="flows_by_origin", where="f.origin_ltla = $3 AND f.origin_code = $1", ties="b.id")
+        else:
+            self.sql["outgoing"] = _FLOWS_SQL.format(source="flows", where="f.origin_code = $1",
+                                                     ties="f.file_row_number")
+
+        self.pool = queue.Queue()
+        for _ in range(pool_size):
+            self.pool.put(self.con.cursor())
+
+    @contextmanager
+    def cursor(self):
+        cursor = self.pool.get()
+        try:
+            yield cursor
+        finally:
+            self.pool.put(cursor)
+
+    def __len__(self):
+        return self.n_flows
+
+    @staticmethod
+    def _arrays(result):
+        return (result["origin_id"].astype(np.int32), result["dest_id"].astype(np.int32),
+                result["count"].astype(np.int32))
+
+    def flows(self, area_code, direction="incoming", limit=None):
+        """(origin_ids, dest_ids, counts) dos fluxos de uma área, ordenados por contagem."""
+        if self.areas.lookup(area_code) is None:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty, empty
+        direction = "incoming" if direction == "incoming" else "outgoing"
+        params = [str(area_code), NO_LIMIT if limit is None else int(limit)]
+        if direction == "outgoing" and self.origin_ltla is not None:
+            params.append(self.origin_ltla.get(area_code, "unknown"))
+        with self.cursor() as cursor:
+            result = cursor.execute(self.sql[direction], params).fetchnumpy()
+        return self._arrays(result)
+
+    def _selection_query(self, area_ids, sql):
+        selection = pa.table({"code": pa.array(self.areas.codes[np.asarray(area_ids)].tolist(), type=pa.string())})
+        with self.cursor() as cursor:
+            cursor.register("selection", selection)
+            try:
+                return cursor.execute(sql).fetchnumpy()
+            finally:
+                cursor.unregister("selection")
+
+    def selection_flows(self, area_ids, direction="both", limit=None):
+        """(origin_ids, dest_ids, counts) do top-N dos fluxos de um conjunto de áreas."""
+        where = {"incoming": "d_in", "outgoing": "o_in", "both": "d_in OR o_in"}[direction]
+        sql = (f"SELECT origin_id, dest_id, count FROM ({_SELECTION_SQL}) WHERE {where} "
+               f"ORDER BY count DESC, row LIMIT {NO_LIMIT if limit is None else int(limit)}")
+        return self._arrays(self._selection_query(area_ids, sql))
+
+    def aggregate_selection(self, area_ids, direction="both"):
+        """Soma os fluxos entre o conjunto e cada área de fora (GROUP BY no DuckDB).
+
+        Mesmo retorno da FlowTable.aggregate_selection: a seleção é o pseudo-id
+        len(self.areas).
+        """
+        n = len(self.areas)
+        result = self._selection_query(area_ids, f"""
+            WITH s AS ({_SELECTION_SQL})
+            SELECT 'incoming' AS side, origin_id AS other, sum(count) AS total FROM s
+                WHERE d_in AND NOT o_in GROUP BY origin_id
+            UNION ALL
+            SELECT 'outgoing', dest_id, sum(count) FROM s WHERE o_in AND NOT d_in GROUP BY dest_id
+            UNION ALL
+            SELECT 'internal', -1, coalesce(sum(count), 0) FROM s WHERE o_in AND d_in
+        """)
+        side = np.asarray(result["side"], dtype=object)
+        other = np.asarray(result["other"], dtype=np.int64)
+        total = np.asarray(result["total"], dtype=np.int64)
+        summary = {"areas": len(np.unique(area_ids)), "internal": int(total[side == "internal"].sum())}
+
+        parts = []
+        for name in ("incoming", "outgoing"):
+            if direction not in (name, "both"):
+                continue
+            pick = side == name
+            others = other[pick]
+            order = np.argsort(others, kind="stable")
+            others, totals = others[order], total[pick][order]
+            selection = np.full(len(others), n)
+            parts.append((others, selection, totals) if name == "incoming" else (selection, others, totals))
+            summary[name] = int(totals.sum())
+
+        origin_ids = np.concatenate([p[0] for p in parts]).astype(np.int32)
+        dest_ids = np.concatenate([p[1] for p in parts]).astype(np.int32)
+        counts = np.concatenate([p[2] for p in parts]).astype(np.int64)
+        return origin_ids, dest_ids, counts, summary
+
+    @property
+    def nbytes(self):
+        return self.areas.nbytes
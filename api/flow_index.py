@@ -0,0 +1,215 @@
+"""
+Índice de adjacência no estilo CSR (compressed sparse row) para os fluxos MSOA.
+
+Construído uma única vez na inicialização da API. Para cada área guardamos o
+intervalo [indptr[i], indptr[i+1]) dentro de um vetor de posições de linhas,
+já ordenado por contagem decrescente. Uma consulta com `limit` vira apenas
+uma busca binária pelo código + um slice, sem varrer nem ordenar a tabela.
+
+A tabela de fluxos em memória é compacta: três vetores int32 (origem, destino,
+contagem) com ids que apontam para a AreaTable compartilhada.
+"""
+import numpy as np
+import pyarrow.parquet as pq
+
+from areas import AreaTable
+
+
+def build_csr(keys, counts, n_keys):
+    """Agrupa as linhas por `keys` e ordena cada grupo por contagem decrescente.
+
+    Retorna (indptr, order): as linhas da chave i são order[indptr[i]:indptr[i+1]].
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    # lexsort é estável: empates mantêm a ordem original das linhas
+    order = np.lexsort((-counts, keys))
+    indptr = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=indptr[1:])
+    return indptr, order.astype(np.int32)
+
+
+def top_n_order(counts, limit=None):
+    """Posições dos `limit` maiores valores, em ordem decrescente.
+
+    Usa argpartition e só ordena os N escolhidos (em vez de ordenar tudo).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    candidates = np.arange(len(counts))
+    if limit is not None and limit < len(counts):
+        if limit <= 0:
+            return candidates[:0]
+        candidates = np.argpartition(-counts, limit - 1)[:limit]
+    return candidates[np.argsort(-counts[candidates], kind="stable")]
+
+
+class FlowIndex:
+    """Índice de fluxos por origem (outgoing) e por destino (incoming)."""
+
+    def __init__(self, incoming, outgoing):
+        # Cada direção é um par (indptr, order) como o retornado por build_csr
+        self.incoming = incoming
+        self.outgoing = outgoing
+
+    @classmethod
+    def build(cls, origin_ids, dest_ids, counts, n_areas):
+        return cls(build_csr(dest_ids, counts, n_areas), build_csr(origin_ids, counts, n_areas))
+
+    def _csr(self, direction):
+        return self.incoming if direction == "incoming" else self.outgoing
+
+    def rows(self, area_id, direction="incoming", limit=None):
+        """Posições dos fluxos da área, ordenadas por contagem decrescente."""
+        indptr, order = self._csr(direction)
+        if area_id is None:
+            return order[:0]
+        return order[indptr[area_id]:indptr[area_id + 1]][:limit]
+
+    def rows_many(self, area_ids, direction="incoming"):
+        """Concatena (sem laço Python) as linhas de várias áreas."""
+        indptr, order = self._csr(direction)
+        area_ids = np.asarray(area_ids, dtype=np.int64)
+        starts, ends = indptr[area_ids], indptr[area_ids + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return order[:0]
+        # posição k da saída -> starts[grupo] + (k - início do grupo na saída)
+        group_start = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return order[group_start + np.arange(total)]
+
+    def degrees(self, direction="incoming"):
+        """Número de fluxos de cada área na direção pedida."""
+        indptr, _ = self._csr(direction)
+        return np.diff(indptr)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for csr in (self.incoming, self.outgoing) for a in csr)
+
+
+class FlowTable:
+    """Fluxos como ids int32 + índice CSR, com áreas numa tabela compartilhada."""
+
+    def __init__(self, areas, origin_ids, dest_ids, counts, index=None):
+        # Sem cópia quando os arrays já são int32 (ex.: views de um mmap)
+        self.areas = areas
+        self.origin_ids = np.asarray(origin_ids, dtype=np.int32)
+        self.dest_ids = np.asarray(dest_ids, dtype=np.int32)
+        self.counts = np.asarray(counts, dtype=np.int32)
+        if index is None:
+            index = FlowIndex.build(self.origin_ids, self.dest_ids, self.counts, len(areas))
+        self.index = index
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_parquet(cls, parquet_path, lookup_path):
+        """Lê o parquet com códigos/nomes dicionarizados e converte para ids.
+
+        Fluxos cujas áreas não têm centróide são descartados (como o antigo
+        merge + dropna). Os nomes exibidos vêm dos rótulos do censo no parquet.
+        """
+        areas = AreaTable.from_csv(lookup_path)
+        text_cols = ["origin_code", "origin_name", "dest_code", "dest_name"]
+        table = pq.read_table(parquet_path, columns=text_cols + ["count"], read_dictionary=text_cols)
+
+        ids = {}
+        for side in ("origin", "dest"):
+            codes = table.column(f"{side}_code").combine_chunks()
+            names = table.column(f"{side}_name").combine_chunks()
+            # Converte só o dicionário (~7k códigos) e depois indexa pelos índices
+            dict_ids = areas.ids_of(codes.dictionary.to_numpy(zero_copy_only=False))
+            row_ids = dict_ids[codes.indices.to_numpy()]
+            ids[side] = row_ids
+            # Primeiro rótulo do censo visto para cada área
+            valid = np.flatnonzero(row_ids >= 0)
+            uniq, first = np.unique(row_ids[valid], return_index=True)
+            name_idx = names.indices.to_numpy()[valid[first]]
+            areas.set_names(uniq, names.dictionary.to_numpy(zero_copy_only=False)[name_idx])
+
+        counts = table.column("count").to_numpy()
+        keep = (ids["origin"] >= 0) & (ids["dest"] >= 0)
+        return cls(areas, ids["origin"][keep], ids["dest"][keep], counts[keep])
+
+    def rows_for_selection(self, area_ids, direction="both"):
+        """Linhas dos fluxos que chegam/saem de um conjunto de áreas.
+
+        Com direction="both", fluxos internos ao conjunto aparecem uma só vez.
+        """
+        if direction == "incoming":
+            return self.index.rows_many(area_ids, "incoming")
+        if direction == "outgoing":
+            return self.index.rows_many(area_ids, "outgoing")
+        member = self.membership(area_ids)
+        incoming = self.index.rows_many(area_ids, "incoming")
+        outgoing = self.index.rows_many(area_ids, "outgoing")
+        outgoing = outgoing[~member[self.dest_ids[outgoing]]]
+        return np.concatenate([incoming, outgoing])
+
+    def membership(self, area_ids):
+        member = np.zeros(len(self.areas), dtype=bool)
+        member[np.asarray(area_ids, dtype=np.int64)] = True
+        return member
+
+    def top_rows(self, rows, limit=None):
+        """Top-N das linhas por contagem decrescente."""
+        return rows[top_n_order(self.counts[rows], limit)]
+
+    def aggregate_selection(self, area_ids, direction="both"):
+        """Soma os fluxos entre o conjunto e cada área de fora.
+
+        O conjunto vira um pseudo-id (len(self.areas)). Retorna
+        (origin_ids, dest_ids, counts, resumo com totais internos/entrada/saída).
+        """
+        n = len(self.areas)
+        selection_id = n
+        member = self.membership(area_ids)
+        incoming = self.index.rows_many(area_ids, "incoming")
+        internal = incoming[member[self.origin_ids[incoming]]]
+        summary = {"areas": int(member.sum()), "internal": int(self.counts[internal].sum())}
+
+        parts = []
+        if direction in ("incoming", "both"):
+            rows = incoming[~member[self.origin_ids[incoming]]]
+            totals = np.bincount(self.origin_ids[rows], weights=self.counts[rows], minlength=n)
+            others = np.flatnonzero(totals)
+            parts.append((others, np.full(len(others), selection_id), totals[others]))
+            summary["incoming"] = int(totals.sum())
+        if direction in ("outgoing", "both"):
+            outgoing = self.index.rows_many(area_ids, "outgoing")
+            rows = outgoing[~member[self.dest_ids[outgoing]]]
+            totals = np.bincount(self.dest_ids[rows], weights=self.counts[rows], minlength=n)
+            others = np.flatnonzero(totals)
+            parts.append((np.full(len(others), selection_id), others, totals[others]))
+            summary["outgoing"] = int(totals.sum())
+
+        origin_ids = np.concatenate([p[0] for p in parts]).astype(np.int32)
+        dest_ids = np.concatenate([p[1] for p in parts]).astype(np.int32)
+        counts = np.concatenate([p[2] for p in parts]).astype(np.int64)
+        return origin_ids, dest_ids, counts, summary
+
+    def sorted_by_destination(self):
+        """Cópia com as linhas na ordem do índice incoming (melhor localidade)."""
+        order = self.index.incoming[1]
+        return FlowTable(self.areas, self.origin_ids[order], self.dest_ids[order], self.counts[order])
+
+    def rows(self, area_code, direction="incoming", limit=None):
+        """Posições dos fluxos de uma área (por código), ordenadas por contagem."""
+        return self.index.rows(self.areas.lookup(area_code), direction, limit)
+
+    def flows(self, area_code, direction="incoming", limit=None):
+        """(origin_ids, dest_ids, counts) dos fluxos de uma área, ordenados por contagem."""
+        rows = self.rows(area_code, direction, limit)
+        return self.origin_ids[rows], self.dest_ids[rows], self.counts[rows]
+
+    def selection_flows(self, area_ids, direction="both", limit=None):
+        """(origin_ids, dest_ids, counts) do top-N dos fluxos de um conjunto de áreas."""
+        rows = self.top_rows(self.rows_for_selection(area_ids, direction), limit)
+        return self.origin_ids[rows], self.dest_ids[rows], self.counts[rows]
+
+    @property
+    def nbytes(self):
+        arrays = (self.origin_ids, self.dest_ids, self.counts)
+        return sum(a.nbytes for a in arrays) + self.index.nbytes + self.areas.nbytes
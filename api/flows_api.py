@@ -2,10 +2,52 @@
 API simples para servir fluxos MSOA sob demanda
 Carrega do Parquet e filtra apenas os dados necessários
 """
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-import pandas as pd
+import gc
+import gzip
+import hashlib
+import json
+import math
 import os
+import resource
+import threading
+
+import yaml
+
+from area_stats import AreaStats, od_totals
+from compression import ENCODINGS, choose_encoding
+from duckdb_backend import DuckDBFlows
+from flow_index import FlowTable, top_n_order
+from generalize import Generalizer, bundle_paths, parse_zoom
+from index_file import StaleIndexError, load_index
+from instrumentation import (METRICS_ENABLED, METRICS_MIMETYPE, NULL_TIMER, PROFILING_ALLOWED, Metrics,
+                             RequestTimer, direction_label)
+from ltla import aggregate_msoa_flows
+from od_datasets import DatasetRegistry, DeltaTable, read_manifest
+from od_graph import DIRECTIONS, METRICS, ODGraph
+from response_cache import ResponseCache
+from spatial import BoundaryIndex, PointIndex, parse_bbox, parse_circle
+from tile_archive import TileArchive
+import numpy as np
+from serializers import ARROW_MIMETYPE, JSON_MIMETYPE, encode_arrow, encode_feature_collection
+from similarity import SimilarityIndex
+
+
+def rss_mb():
+    """RSS atual do processo em MB (Linux: /proc; senão, pico via getrusage)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Pico de RSS do processo em MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if os.uname().sysname == "Darwin" else peak / 1024
+
 
 app = Flask(__name__)
 CORS(app)  # Permite requisições do React
@@ -16,73 +58,783 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 parquet_path = os.path.join(project_root, "data/interim/odwp01ew.parquet")
 lookup_path = os.path.join(project_root, "data/lookup/areas_centroids.csv")
+index_path = os.path.join(project_root, "data/interim/odwp01ew.flowidx")
+ltla_lookup_path = os.path.join(project_root, "public/data/lookup/ltla_lookup.csv")
+ltla_centroids_path = os.path.join(project_root, "public/data/lookup/ltla_centroids.csv")
+ltla_index_path = os.path.join(project_root, "data/interim/ltla_od.flowidx")
+tiles_path = os.path.join(project_root, "data/interim/flows_tiles.mbtiles")
+ltla_boundaries_path = os.path.join(project_root, "public/data/lookup/ltla_boundaries.geojson")
+partitioned_dir = os.path.join(project_root, "data/interim/odwp01ew_by_origin")
+area_stats_path = os.path.join(project_root, "data/interim/area_stats_msoa.arrow")
+ltla_area_stats_path = os.path.join(project_root, "data/interim/area_stats_ltla.arrow")
+similar_areas_path = os.path.join(project_root, "data/interim/similar_areas.arrow")
+manifest_path = os.path.join(project_root, "data/interim/datasets.json")
+config_path = os.path.join(project_root, "config.yaml")
+
+# Backend das consultas MSOA: "memory" (índice CSR em memória/mmap) ou
+# "duckdb" (consultas no parquet ordenado, só as áreas ficam em memória)
+FLOWS_BACKEND = os.environ.get("FLOWS_BACKEND", "memory")
+
+
+def load_flows():
+    """Abre o índice pré-construído via mmap; se ausente/desatualizado, usa o Parquet"""
+    if FLOWS_BACKEND == "duckdb":
+        pool_size = int(os.environ.get("FLOWS_DUCKDB_POOL", 4))
+        print(f"🦆 DuckDB sobre {parquet_path} (pool de {pool_size} cursores)")
+        return DuckDBFlows(parquet_path, lookup_path, ltla_lookup_path, partitioned_dir, pool_size), "duckdb"
+    if FLOWS_BACKEND != "memory":
+        raise SystemExit(f"❌ FLOWS_BACKEND desconhecido: {FLOWS_BACKEND} (use memory ou duckdb)")
+    try:
+        flows = load_index(index_path, {"parquet": parquet_path, "lookup_areas": lookup_path})
+        print(f"⚡ Índice mmap: {index_path}")
+        return flows, "mmap"
+    except FileNotFoundError:
+        print("⚠️  Índice pré-construído não encontrado (rode scripts/build_flow_index.py)")
+    except StaleIndexError as e:
+        print(f"⚠️  Ignorando índice: {e}")
+    # Tabela compacta: ids int32 de origem/destino + contagem, áreas (nomes e
+    # centróides float32) numa tabela única, índice CSR ordenado por contagem
+    return FlowTable.from_parquet(parquet_path, lookup_path), "parquet"
+
+
+def load_ltla_flows():
+    """Matriz OD LTLA: índice mmap (scripts/06_aggregate_flows_by_ltla.py) ou agregação na hora"""
+    sources = {"parquet": parquet_path, "ltla_lookup": ltla_lookup_path, "ltla_centroids": ltla_centroids_path}
+    try:
+        ltla = load_index(ltla_index_path, sources)
+        print(f"⚡ Índice LTLA mmap: {ltla_index_path}")
+        return ltla, "mmap"
+    except FileNotFoundError:
+        print("⚠️  Índice LTLA não encontrado (rode scripts/06_aggregate_flows_by_ltla.py)")
+    except StaleIndexError as e:
+        print(f"⚠️  Ignorando índice LTLA: {e}")
+    if not os.path.exists(parquet_path):
+        return None, None
+    return aggregate_msoa_flows(parquet_path, ltla_lookup_path, ltla_centroids_path), "parquet"
+
+
+def load_area_stats(path, sources, table, level, totals_parquet=None):
+    """Estatísticas por área (scripts/build_area_stats.py); sem o arquivo, calcula da FlowTable
+
+    `totals_parquet`: totais sobre todas as linhas desse parquet (nível MSOA).
+    """
+    try:
+        stats = AreaStats.load(path, sources)
+        print(f"⚡ Estatísticas {level.upper()}: {path}")
+        return stats
+    except FileNotFoundError:
+        print(f"⚠️  Estatísticas {level.upper()} não encontradas (rode scripts/build_area_stats.py)")
+    except StaleIndexError as e:
+        print(f"⚠️  Ignorando estatísticas {level.upper()}: {e}")
+    if not isinstance(table, FlowTable):
+        return None
+    return AreaStats.build(table, level, totals=od_totals(totals_parquet) if totals_parquet else None)
+
+
+def load_similarity(graph):
+    """Tabela de áreas similares (scripts/build_similar_areas.py) + perfis do grafo para k maiores"""
+    profiles = SimilarityIndex.from_graph(graph) if graph is not None else None
+    try:
+        table = SimilarityIndex.load(similar_areas_path, {"parquet": parquet_path, "lookup_areas": lookup_path},
+                                     profiles.profiles if profiles is not None else None)
+        if profiles is None or (len(table) == len(profiles) and (table.codes == profiles.codes).all()):
+            print(f"⚡ Áreas similares: {similar_areas_path} (k={table.table_k})")
+            return table
+        print("⚠️  Tabela de áreas similares com outras áreas; ignorando")
+    except FileNotFoundError:
+        print("⚠️  Tabela de áreas similares não encontrada (rode scripts/build_similar_areas.py)")
+    except StaleIndexError as e:
+        print(f"⚠️  Ignorando tabela de áreas similares: {e}")
+    return profiles
+
+
+def dataset_version(paths):
+    """Versão curta dos dados servidos (tamanho + mtime dos arquivos carregados)"""
+    digest = hashlib.sha1()
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
 
-df = pd.read_parquet(parquet_path)
-print(f"✅ Carregado: {len(df):,} fluxos MSOA")
+# Cache LRU das respostas codificadas (chave inclui a versão dos dados)
+CACHE_MAX_ENTRIES = int(os.environ.get("FLOWS_CACHE_SIZE", 512))
+CACHE_CONTROL = "public, max-age=300"
 
-# Carregar centróides
-lut = pd.read_csv(lookup_path, dtype={"code":"string"})
-lut = lut.rename(columns={"code":"code_area", "name":"area_name"})
+# Prontidão: /api/health só responde "ok" (e as rotas de dados só atendem)
+# depois que os índices estão montados
+ready = threading.Event()
+load_error = None
 
-# Fazer merge uma vez
-df = df.merge(lut.add_prefix("o_"), left_on="origin_code", right_on="o_code_area", how="left")
-df = df.merge(lut.add_prefix("d_"), left_on="dest_code", right_on="d_code_area", how="left")
-df = df.dropna(subset=["o_lat","o_lon","d_lat","d_lon"])
 
-print(f"✅ Pronto para servir dados!")
+def default_dataset_name():
+    """`datasets.default` do config.yaml (o mesmo nome que o 01_csv_to_parquet.py grava no manifesto)"""
+    if not os.path.exists(config_path):
+        return "odwp01ew"
+    with open(config_path) as f:
+        cfg = yaml.safe_load(f) or {}
+    return (cfg.get("datasets") or {}).get("default", "odwp01ew")
+
+
+def load_data():
+    """Carrega fluxos, índices e caches (uma vez; antes do fork no modo produção)"""
+    global flows, flows_source, rss_before_mb, rss_after_mb, ltla_flows, ltla_source, tiles
+    global area_index, boundary_index, generalizers, response_cache, load_error, area_stats, graph, similarity
+    global registry
+    try:
+        rss_before_mb = rss_mb()
+        flows, flows_source = load_flows()
+        gc.collect()
+        rss_after_mb = rss_mb()
+        print(f"✅ Carregado: {len(flows):,} fluxos MSOA, {len(flows.areas):,} áreas")
+        print(f"💾 Memória: {flows.nbytes / 2**20:.1f} MB em arrays, RSS {rss_before_mb:.0f} → {rss_after_mb:.0f} MB")
+
+        ltla_flows, ltla_source = load_ltla_flows()
+        if ltla_flows is not None:
+            print(f"✅ LTLA: {len(ltla_flows):,} pares entre {len(ltla_flows.areas):,} distritos")
+
+        area_stats = {'msoa': load_area_stats(area_stats_path, {"parquet": parquet_path, "lookup_areas": lookup_path},
+                                              flows, 'msoa', totals_parquet=parquet_path)}
+        if ltla_flows is not None:
+            area_stats['ltla'] = load_area_stats(ltla_area_stats_path, {
+                "parquet": parquet_path, "ltla_lookup": ltla_lookup_path, "ltla_centroids": ltla_centroids_path,
+            }, ltla_flows, 'ltla')
+
+        # Grafo OD esparso para /api/network (PageRank, comunidades e bacias calculados sob demanda)
+        graph = ODGraph.from_flows(flows) if isinstance(flows, FlowTable) else None
+        if graph is not None:
+            print(f"🕸️  Grafo OD: {graph.matrix.nnz:,} arestas ({graph.nbytes / 2**20:.1f} MB)")
+        similarity = load_similarity(graph)
+
+        # Outros conjuntos OD (?dataset=/compare=), carregados na primeira consulta
+        registry = None
+        if isinstance(flows, FlowTable):
+            registry = DatasetRegistry(read_manifest(manifest_path), project_root, lookup_path, flows,
+                                       default_name=default_dataset_name())
+            print(f"🗃️  Conjuntos OD: {', '.join(registry.names())} (padrão: {registry.default})")
+
+        tiles = TileArchive(tiles_path) if os.path.exists(tiles_path) else None
+        if tiles is not None:
+            print(f"🧱 Vector tiles: {tiles_path} (z{tiles.metadata['minzoom']}–{tiles.metadata['maxzoom']})")
+        else:
+            print("⚠️  Vector tiles não encontrados (rode scripts/08_build_vector_tiles.py)")
+
+        # Índices espaciais: centróides MSOA (cKDTree na esfera) + bboxes dos limites LTLA
+        area_index = PointIndex(flows.areas.lon, flows.areas.lat)
+        boundary_index = None
+        if os.path.exists(ltla_boundaries_path):
+            with open(ltla_boundaries_path) as f:
+                boundary_index = BoundaryIndex(json.load(f)["features"])
+        print(f"🗺️  Índice espacial: {len(area_index):,} centróides, "
+              f"{len(boundary_index) if boundary_index is not None else 0} limites LTLA")
+
+        # Generalização por zoom (?zoom=): MSOA → grid/centróides LTLA, LTLA → grid
+        if ltla_flows is not None:
+            generalizers = {'msoa': Generalizer.with_ltla(flows.areas, ltla_flows.areas, ltla_lookup_path),
+                            'ltla': Generalizer(ltla_flows.areas)}
+        else:
+            generalizers = {'msoa': Generalizer(flows.areas)}
+
+        version_paths = [index_path] if flows_source == "mmap" else [parquet_path, lookup_path]
+        if os.path.exists(manifest_path):
+            version_paths.append(manifest_path)
+        if flows_source == "duckdb" and os.path.isdir(partitioned_dir):
+            version_paths.append(partitioned_dir)
+        if ltla_source == "mmap":
+            version_paths.append(ltla_index_path)
+        response_cache = ResponseCache(CACHE_MAX_ENTRIES, dataset_version(version_paths))
+    except Exception as e:
+        load_error = f"{type(e).__name__}: {e}"
+        print(f"❌ Falha ao carregar os dados: {load_error}")
+        raise
+    ready.set()
+    print(f"✅ Pronto para servir dados!")
+
+
+# Por padrão carrega já no import (gunicorn --preload carrega antes do fork e
+# os workers compartilham as páginas). FLOWS_LOAD_IN_BACKGROUND=1 sobe o
+# servidor na hora e carrega numa thread: /api/health responde 503 até lá.
+if os.environ.get("FLOWS_LOAD_IN_BACKGROUND") == "1":
+    threading.Thread(target=load_data, name="load_data", daemon=True).start()
+else:
+    load_data()
+
+metrics = Metrics()
+
+@app.before_request
+def start_timer():
+    """Timer da requisição (nulo com FLOWS_METRICS=0); ?profile=1 liga o profiler"""
+    profile = PROFILING_ALLOWED and request.args.get('profile') == '1'
+    g.timer = RequestTimer() if METRICS_ENABLED or profile else NULL_TIMER
+    if profile and not g.timer.start_profile():
+        return jsonify({"error": "outra requisição já está sendo perfilada; tente de novo"}), 409
+
+@app.after_request
+def finish_timer(response):
+    """Registra latência/etapas nas métricas; no modo profile devolve o resumo"""
+    timer = g.get('timer', NULL_TIMER)
+    if timer.profiler is not None:
+        stages = "\n".join(f"  {name:<12} {seconds * 1000:9.2f} ms" for name, seconds in timer.stages.items())
+        report = (f"{request.full_path} → {response.status_code}, {timer.rows} linhas, "
+                  f"{response.content_length or 0:,} bytes\nEtapas:\n{stages}\n\n{timer.profile_report()}")
+        response = Response(report, mimetype='text/plain')
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if timer.enabled:
+        if timer.stages:
+            response.headers['Server-Timing'] = timer.server_timing()
+        metrics.observe(timer, request.endpoint or 'unknown', direction_label(request.args.get('direction')),
+                        response.status_code, response.content_length or 0)
+    return response
+
+@app.teardown_request
+def stop_profiler(exc):
+    """Libera o profiler mesmo se a requisição falhou antes do after_request"""
+    g.get('timer', NULL_TIMER).stop_profile()
+
+def cache_get(key):
+    """Entrada do cache de respostas; no modo profile sempre recalcula"""
+    return response_cache.get(key) if g.timer.profiler is None else None
+
+@app.before_request
+def require_ready():
+    """503 nas rotas de dados enquanto os índices ainda estão sendo carregados"""
+    if not ready.is_set() and request.endpoint not in ('health', 'get_metrics'):
+        response = jsonify({"error": "dados ainda carregando", "detail": load_error})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+def response_format():
+    """Negocia o formato da resposta: GeoJSON (padrão) ou Arrow IPC"""
+    fmt = request.args.get('format')
+    if fmt in ('json', 'geojson', 'arrow'):
+        return 'arrow' if fmt == 'arrow' else 'json'
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE, ARROW_MIMETYPE])
+    return 'arrow' if best == ARROW_MIMETYPE else 'json'
 
 @app.route('/api/flows/<area_code>')
 def get_flows(area_code):
-    """Retorna fluxos MSOA que chegam ou saem de uma área específica"""
+    """Retorna fluxos MSOA que chegam ou saem de uma área específica
+
+    ?dataset=NOME usa outro conjunto OD; com &compare=OUTRO os fluxos são a
+    variação por par (dataset − compare), ordenados por |variação|.
+    """
+    try:
+        table, dataset = dataset_table(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return serve_flows(table, 'msoa', area_code, dataset)
+
+@app.route('/api/ltla/flows/<ltla_code>')
+def get_ltla_flows(ltla_code):
+    """Retorna fluxos agregados por LTLA que chegam ou saem de um distrito"""
+    if ltla_flows is None:
+        return jsonify({"error": "matriz LTLA indisponível (rode scripts/06_aggregate_flows_by_ltla.py)"}), 503
+    return serve_flows(ltla_flows, 'ltla', ltla_code)
+
+def dataset_table(params):
+    """(tabela, rótulo) do conjunto pedido em ?dataset=/compare=; ValueError se inválido"""
+    name, compare = params.get('dataset'), params.get('compare')
+    if name is None and compare is None:
+        return flows, None
+    if registry is None:
+        raise ValueError("dataset/compare só com FLOWS_BACKEND=memory")
+    name = name or registry.default
+    if compare is None:
+        return registry.table(name), name
+    return registry.delta(name, compare), f"{name}-{compare}"
+
+def parse_limit(value, default=1000):
+    """`limit` inteiro >= 0 (ValueError senão): memória e DuckDB recebem o mesmo valor"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit deve ser um inteiro >= 0") from None
+    if limit < 0:
+        raise ValueError("limit deve ser um inteiro >= 0")
+    return limit
+
+def serve_flows(table, scope, area_code, dataset=None):
+    """Slice do índice de `table` para uma área, com cache LRU + ETag"""
     direction = request.args.get('direction', 'incoming')  # incoming ou outgoing
-    limit = int(request.args.get('limit', 1000))
     
-    print(f"📊 Requisição: {area_code}, direção: {direction}, limit: {limit}")
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        zoom, bundle = generalization_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = response_format()
+    precision = request.args.get('precision', type=int) if fmt == 'json' else None
+    key = (scope, area_code, 'incoming' if direction == 'incoming' else 'outgoing', limit, fmt, precision,
+           zoom, bundle, dataset)
     
-    # Filtrar fluxos MSOA
-    if direction == 'incoming':
-        filtered = df[df['dest_code'] == area_code]
-    else:
-        filtered = df[df['origin_code'] == area_code]
+    timer = g.timer
+    entry = cache_get(key)
+    if entry is None:
+        # Fluxos da área já ordenados por contagem e limitados (slice do índice
+        # ou consulta no DuckDB); com zoom, o limite vale depois de somar os
+        # fluxos generalizados
+        with timer.stage('lookup'):
+            selected = table.flows(area_code, direction, limit if zoom is None else None)
+        with timer.stage('generalize'):
+            areas, origin_ids, dest_ids, counts, members = generalized(table, scope, *selected, zoom, limit)
+        timer.rows = len(counts)
+        entry = encode_response(key, fmt, areas, origin_ids, dest_ids, counts, precision, members, bundle)
     
-    # Ordenar por contagem e limitar
-    filtered = filtered.sort_values('count', ascending=False).head(limit)
+    return cached_response(entry)
+
+def encode_response(key, fmt, areas, origin_ids, dest_ids, counts, precision=None, members=None, bundle=False):
+    """Codifica os fluxos (Arrow IPC ou GeoJSON) e guarda no cache de respostas"""
+    timer = g.timer
+    # Formato binário (Arrow IPC) se pedido via ?format=arrow ou header Accept
+    if fmt == 'arrow':
+        with timer.stage('serialize'):
+            body = encode_arrow(areas, origin_ids, dest_ids, counts)
+        return response_cache.put(key, body, ARROW_MIMETYPE)
+    # GeoJSON: nomes e coordenadas vêm da tabela de áreas
+    with timer.stage('bundle'):
+        paths = bundle_paths(areas, origin_ids, dest_ids) if bundle else None
+    with timer.stage('serialize'):
+        body = encode_feature_collection(areas, origin_ids, dest_ids, counts, precision=precision,
+                                         members=members, paths=paths)
+    return response_cache.put(key, body, JSON_MIMETYPE)
+
+def generalization_params(params):
+    """(zoom, bundle) da requisição; sem zoom os fluxos MSOA/LTLA vão como estão"""
+    zoom = parse_zoom(params.get('zoom'))
+    bundle = str(params.get('bundle', 'false')).lower() in ('1', 'true', 'yes')
+    return zoom, bundle
+
+def generalized(table, scope, origin_ids, dest_ids, counts, zoom, limit):
+    """Fluxos dados, generalizados para o zoom (soma os paralelos) e limitados"""
+    if zoom is None:
+        return table.areas, origin_ids, dest_ids, counts, None
+    areas, origin_ids, dest_ids, counts, summary = generalizers[scope].apply(zoom, origin_ids, dest_ids, counts)
+    order = top_n_order(ranking(table, counts), limit)
+    return areas, origin_ids[order], dest_ids[order], counts[order], {"generalization": summary}
+
+def ranking(table, counts):
+    """Chave do top-N: a contagem, ou |variação| numa DeltaTable"""
+    return np.abs(counts) if isinstance(table, DeltaTable) else counts
+
+def cached_response(entry):
+    """Resposta com ETag forte + Cache-Control; 304 se o If-None-Match bater
+
+    Comprime com brotli/gzip se o cliente aceitar (uma vez por entrada do
+    cache); cada codificação tem seu próprio ETag.
+    """
+    encoding = choose_encoding(request.accept_encodings, len(entry.body))
+    if encoding is None:
+        response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+    else:
+        with g.timer.stage('compress'):
+            body = response_cache.encoded(entry, encoding)
+        response = Response(body, mimetype=entry.mimetype)
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{entry.etag}-{encoding}")
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+def selected_area_ids(params):
+    """Resolve a seleção (códigos, bbox, raio e/ou polígono) em ids de área"""
+    areas = flows.areas
+    selected = np.zeros(len(areas), dtype=bool)
+    codes = params.get('areas')
+    if codes:
+        if isinstance(codes, str):
+            codes = codes.split(',')
+        ids = areas.ids_of([c.strip() for c in codes])
+        selected[ids[ids >= 0]] = True
+    if params.get('bbox'):
+        selected[area_index.in_bbox(parse_bbox(params['bbox']))] = True
+    if params.get('radius'):
+        selected[area_index.within_radius(*parse_circle(params['radius']))[0]] = True
+    if params.get('polygon'):
+        polygon = params['polygon']
+        if isinstance(polygon, str):
+            polygon = json.loads(polygon)
+        selected[area_index.in_polygon(polygon)] = True
+    return np.flatnonzero(selected)
+
+@app.route('/api/flows/batch', methods=['GET', 'POST'])
+def get_flows_batch():
+    """Fluxos combinados de várias áreas (lista de códigos, bbox ou polígono)
+
+    Parâmetros (JSON no corpo do POST ou query string no GET):
+      areas: lista de códigos (ou "E02000001,E02000002")
+      bbox: [minLon, minLat, maxLon, maxLat]; polygon: [[lon, lat], ...]
+      radius: [lon, lat, raio_km] (ou "lon,lat,raio_km")
+      direction: incoming | outgoing | both (padrão)
+      limit: máximo de fluxos (padrão 1000)
+      aggregate: se true, soma os fluxos entre a seleção e cada área de fora
+      zoom: generaliza os extremos para o zoom do mapa (ignorado com aggregate)
+      bundle: se true, aplica edge bundling às maiores linhas (GeoJSON)
+      dataset / compare: outro conjunto OD / variação entre dois conjuntos
+    """
+    params = dict(request.args)
+    params.update(request.get_json(silent=True) or {})
+    direction = params.get('direction', 'both')
+    try:
+        limit = parse_limit(params.get('limit'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    aggregate = str(params.get('aggregate', 'false')).lower() in ('1', 'true', 'yes')
+    if direction not in ('incoming', 'outgoing', 'both'):
+        return jsonify({"error": "direction deve ser incoming, outgoing ou both"}), 400
+    timer = g.timer
+    try:
+        with timer.stage('select'):
+            area_ids = selected_area_ids(params)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if len(area_ids) == 0:
+        return jsonify({"error": "nenhuma área selecionada (use areas, bbox, radius ou polygon)"}), 400
+    try:
+        zoom, bundle = generalization_params(params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if aggregate:
+        zoom = None
+    try:
+        table, dataset = dataset_table(params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    print(f"✅ Encontrados {len(filtered)} fluxos")
+    fmt = response_format()
+    precision = int(params['precision']) if fmt == 'json' and params.get('precision') is not None else None
+    selection_key = hashlib.sha1(area_ids.astype(np.int32).tobytes()).hexdigest()
+    key = ('batch', selection_key, direction, limit, aggregate, fmt, precision, zoom, bundle, dataset)
     
-    # Converter para GeoJSON
-    features = []
-    for _, row in filtered.iterrows():
-        features.append({
-            "type": "Feature",
-            "properties": {
-                "origin_code": row['origin_code'],
-                "origin_name": row['origin_name'],
-                "dest_code": row['dest_code'],
-                "dest_name": row['dest_name'],
-                "count": int(row['count'])
-            },
-            "geometry": {
-                "type": "LineString",
-                "coordinates": [
-                    [float(row['o_lon']), float(row['o_lat'])],
-                    [float(row['d_lon']), float(row['d_lat'])]
-                ]
-            }
-        })
+    entry = cache_get(key)
+    if entry is None:
+        areas = flows.areas
+        if aggregate:
+            # A seleção vira um pseudo-ponto no centróide médio das áreas
+            with timer.stage('aggregate'):
+                origin_ids, dest_ids, counts, summary = table.aggregate_selection(area_ids, direction)
+                order = top_n_order(ranking(table, counts), limit)
+            origin_ids, dest_ids, counts = origin_ids[order], dest_ids[order], counts[order]
+            areas = areas.with_point(
+                "SELECTION", f"Seleção ({len(area_ids)} áreas)",
+                float(areas.lat[area_ids].mean()), float(areas.lon[area_ids].mean()),
+            )
+            members = {"selection": summary}
+        else:
+            with timer.stage('lookup'):
+                selected = table.selection_flows(area_ids, direction, limit if zoom is None else None)
+            with timer.stage('generalize'):
+                areas, origin_ids, dest_ids, counts, members = generalized(table, 'msoa', *selected, zoom, limit)
+            members = {"selection": {"areas": len(area_ids)}, **(members or {})}
+        timer.rows = len(counts)
+        entry = encode_response(key, fmt, areas, origin_ids, dest_ids, counts, precision, members, bundle)
     
-    return jsonify({
-        "type": "FeatureCollection",
-        "features": features
+    return cached_response(entry)
+
+def area_json(area_id, distance_km=None):
+    areas = flows.areas
+    name = areas.names[area_id]
+    item = {"code": str(areas.codes[area_id]), "name": name if isinstance(name, str) else None,
+            "lon": round(float(areas.lon[area_id]), 6), "lat": round(float(areas.lat[area_id]), 6)}
+    if distance_km is not None:
+        item["distance_km"] = round(float(distance_km), 4)
+    return item
+
+@app.route('/api/areas/nearest')
+def get_nearest_areas():
+    """Área(s) MSOA mais próxima(s) de um ponto (clique no mapa) e o LTLA que o contém
+
+    Parâmetros: lon, lat, k (padrão 1, máximo 100)
+    """
+    try:
+        lon, lat = float(request.args['lon']), float(request.args['lat'])
+        k = max(1, min(int(request.args.get('k', 1)), 100))
+        if not (math.isfinite(lon) and math.isfinite(lat)):
+            raise ValueError
+    except (KeyError, ValueError):
+        return jsonify({"error": "informe lon e lat numéricos (e k opcional)"}), 400
+    ids, dist = area_index.nearest(lon, lat, k)
+    ltla = boundary_index.containing(lon, lat) if boundary_index is not None else None
+    return jsonify({"areas": [area_json(i, d) for i, d in zip(ids.tolist(), dist.tolist())], "ltla": ltla})
+
+@app.route('/api/areas/within', methods=['GET', 'POST'])
+def get_areas_within():
+    """Áreas MSOA cujo centróide está numa bbox, raio ou polígono (mesmos parâmetros do batch)"""
+    params = dict(request.args)
+    params.update(request.get_json(silent=True) or {})
+    try:
+        area_ids = selected_area_ids(params)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"count": len(area_ids), "areas": [area_json(i) for i in area_ids.tolist()]})
+
+@app.route('/api/areas/<area_code>/stats')
+def get_area_stats(area_code):
+    """Estatísticas pré-calculadas de uma área MSOA ou LTLA (totais, autocontenção, top-k, histograma)"""
+    available = [stats for stats in area_stats.values() if stats is not None]
+    if not available:
+        return jsonify({"error": "estatísticas indisponíveis (rode scripts/build_area_stats.py)"}), 503
+    for stats in available:
+        area_id = stats.lookup(area_code)
+        if area_id is not None:
+            response = jsonify(stats.area_json(area_id))
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+    return jsonify({"error": f"área {area_code} não encontrada"}), 404
+
+def graph_unavailable():
+    return jsonify({"error": "grafo OD indisponível (só com FLOWS_BACKEND=memory)"}), 503
+
+def json_response(payload):
+    response = jsonify(payload)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+@app.route('/api/areas/<area_code>/network')
+def get_area_network(area_code):
+    """Centralidade (PageRank, hub, autoridade, com posições) e comunidade de uma área MSOA"""
+    if graph is None:
+        return graph_unavailable()
+    area_id = graph.areas.lookup(area_code)
+    if area_id is None:
+        return jsonify({"error": f"área {area_code} não encontrada"}), 404
+    with g.timer.stage('network'):
+        item = area_json(area_id)
+        for metric in METRICS:
+            item[metric] = round(float(graph.metric(metric)[area_id]), 8)
+            item[f"{metric}_rank"] = int(graph.ranks(metric)[area_id])
+        labels, _ = graph.communities()
+        item["community"] = graph.community_stats()[labels[area_id]]
+    return json_response(item)
+
+@app.route('/api/areas/<area_code>/catchment')
+def get_area_catchment(area_code):
+    """Bacia de uma área: maiores origens (incoming) ou destinos (outgoing) que somam `coverage`
+
+    Parâmetros: direction (incoming|outgoing), coverage (0–1, padrão 0.8)
+    """
+    if graph is None:
+        return graph_unavailable()
+    direction = request.args.get('direction', 'incoming')
+    try:
+        coverage = float(request.args.get('coverage', 0.8))
+    except ValueError:
+        coverage = -1
+    if direction not in DIRECTIONS or not 0 < coverage <= 1:
+        return jsonify({"error": "use direction=incoming|outgoing e 0 < coverage <= 1"}), 400
+    area_id = graph.areas.lookup(area_code)
+    if area_id is None:
+        return jsonify({"error": f"área {area_code} não encontrada"}), 404
+    with g.timer.stage('network'):
+        members, counts, total = graph.catchment(area_id, direction, coverage)
+        areas = [{**area_json(i), "count": int(c), "share": round(c / total, 4)}
+                 for i, c in zip(members.tolist(), counts.tolist())]
+        ring = graph.hull(members)
+    g.timer.rows = len(areas)
+    return json_response({
+        "code": area_code, "direction": direction, "coverage": coverage,
+        "total": int(total), "covered": int(counts.sum()), "areas": areas,
+        "boundary": {"type": "Polygon", "coordinates": [ring]} if ring is not None else None,
     })
 
+@app.route('/api/areas/<area_code>/similar')
+def get_similar_areas(area_code):
+    """Áreas MSOA com padrão de deslocamento mais parecido (cosseno entre perfis)
+
+    Parâmetros: by (outgoing = para onde os moradores vão, incoming = de onde vêm
+    os trabalhadores, both = média; padrão both), k (padrão 10, máximo 200)
+    """
+    if similarity is None:
+        return jsonify({"error": "áreas similares indisponíveis (rode scripts/build_similar_areas.py)"}), 503
+    try:
+        k = max(1, min(int(request.args.get('k', 10)), 200))
+    except ValueError:
+        return jsonify({"error": "k deve ser inteiro"}), 400
+    by = request.args.get('by', 'both')
+    area_id = similarity.lookup(area_code)
+    if area_id is None:
+        return jsonify({"error": f"área {area_code} não encontrada"}), 404
+    try:
+        with g.timer.stage('similar'):
+            ids, values = similarity.similar(area_id, by, k)
+    except (ValueError, LookupError) as e:
+        return jsonify({"error": str(e)}), 400
+    g.timer.rows = len(ids)
+    areas = []
+    for i, value in zip(ids.tolist(), values.tolist()):
+        area_id = flows.areas.lookup(similarity.codes[i])
+        if area_id is not None:
+            areas.append({**area_json(area_id), "similarity": round(value, 4)})
+    return json_response({"code": area_code, "by": by, "areas": areas})
+
+@app.route('/api/network/top')
+def get_network_top():
+    """Áreas MSOA com maior PageRank/hub/autoridade (metric, n até 500)"""
+    if graph is None:
+        return graph_unavailable()
+    metric = request.args.get('metric', 'pagerank')
+    try:
+        n = max(1, min(int(request.args.get('n', 20)), 500))
+        values = graph.metric(metric)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with g.timer.stage('network'):
+        labels, _ = graph.communities()
+        ids = np.argsort(-values, kind="stable")[:n]
+        areas = [{**area_json(i), metric: round(float(values[i]), 8), "community": int(labels[i])}
+                 for i in ids.tolist()]
+    return json_response({"metric": metric, "areas": areas})
+
+@app.route('/api/network/communities')
+def get_network_communities():
+    """Comunidades de deslocamento (propagação de rótulos com modularidade); members=1 lista as áreas"""
+    if graph is None:
+        return graph_unavailable()
+    with g.timer.stage('network'):
+        labels, modularity = graph.communities()
+        communities = [dict(c) for c in graph.community_stats()]
+        if request.args.get('members') == '1':
+            for code, label in zip(graph.areas.codes.tolist(), labels.tolist()):
+                communities[label].setdefault("members", []).append(code)
+    return json_response({"modularity": round(modularity, 4), "count": len(communities),
+                          "communities": communities})
+
+def datasets_unavailable():
+    return jsonify({"error": "conjuntos OD só com FLOWS_BACKEND=memory"}), 503
+
+@app.route('/api/datasets')
+def get_datasets():
+    """Conjuntos OD disponíveis (manifesto data/interim/datasets.json)"""
+    if registry is None:
+        return datasets_unavailable()
+    return jsonify({"default": registry.default, "datasets": registry.describe()})
+
+@app.route('/api/areas/<area_code>/delta')
+def get_area_delta(area_code):
+    """Variação de chegadas/saídas de uma área entre dois conjuntos (?dataset=&compare=)"""
+    if registry is None:
+        return datasets_unavailable()
+    if not request.args.get('compare'):
+        return jsonify({"error": "informe compare=<conjunto base>"}), 400
+    try:
+        table, dataset = dataset_table(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    area_id = table.areas.lookup(area_code)
+    if area_id is None:
+        return jsonify({"error": f"área {area_code} não encontrada"}), 404
+    return json_response({**area_json(area_id), "dataset": dataset, **table.area_delta(area_id)})
+
+@app.route('/api/deltas/areas')
+def get_area_deltas():
+    """Áreas com maior |variação| de chegadas (by=inflow) ou saídas (by=outflow) entre dois conjuntos"""
+    if registry is None:
+        return datasets_unavailable()
+    by = request.args.get('by', 'inflow')
+    limit = request.args.get('limit', 50, type=int)
+    if by not in ('inflow', 'outflow'):
+        return jsonify({"error": "by deve ser inflow ou outflow"}), 400
+    if not request.args.get('compare'):
+        return jsonify({"error": "informe compare=<conjunto base>"}), 400
+    try:
+        table, dataset = dataset_table(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    ids = table.top_area_changes(by, limit)
+    return json_response({"dataset": dataset, "by": by,
+                          "areas": [{**area_json(i), **table.area_delta(i)} for i in ids.tolist()]})
+
+@app.route('/api/tiles.json')
+def get_tilejson():
+    """TileJSON dos vector tiles (camadas flows + boundaries) para o MapLibre"""
+    if tiles is None:
+        return jsonify({"error": "vector tiles indisponíveis (rode scripts/08_build_vector_tiles.py)"}), 503
+    return jsonify(tiles.tilejson(request.host_url + 'api/tiles/{z}/{x}/{y}.pbf'))
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>.pbf')
+def get_tile(z, x, y):
+    """Um vector tile (MVT); 204 para tiles vazios ou fora do intervalo de zoom"""
+    if tiles is None:
+        return jsonify({"error": "vector tiles indisponíveis (rode scripts/08_build_vector_tiles.py)"}), 503
+    data = tiles.tile(z, x, y)
+    if data is None:
+        return Response(status=204)
+    # Tiles ficam gzipados no MBTiles: repassa como está se o cliente aceitar
+    # (ETag próprio por codificação, como em cached_response)
+    etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if 'gzip' in request.accept_encodings:
+        response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f"{etag}-gzip")
+    else:
+        response = Response(gzip.decompress(data), mimetype='application/vnd.mapbox-vector-tile')
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Métricas do processo no formato de exposição do Prometheus"""
+    cache = response_cache.stats() if ready.is_set() else {}
+    extra = {
+        "flows_ready": int(ready.is_set()),
+        "flows_rss_bytes": int(rss_mb() * 2**20),
+        "flows_response_cache_entries": cache.get("entries", 0),
+        "flows_response_cache_bytes": cache.get("bytes", 0),
+        "flows_response_cache_hits_total": (cache.get("hits", 0), "counter"),
+        "flows_response_cache_misses_total": (cache.get("misses", 0), "counter"),
+        "flows_response_cache_evictions_total": (cache.get("evictions", 0), "counter"),
+    }
+    return Response(metrics.render(extra), mimetype=METRICS_MIMETYPE)
+
 @app.route('/api/health')
 def health():
-    return jsonify({"status": "ok", "total_flows": len(df)})
+    """Prontidão: 503 ("loading"/"error") até os índices estarem montados"""
+    if not ready.is_set():
+        return jsonify({"status": "error" if load_error else "loading", "error": load_error}), 503
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "total_flows": len(flows),
+        "total_areas": len(flows.areas),
+        "source": flows_source,
+        "ltla": {"source": ltla_source, "total_flows": len(ltla_flows) if ltla_flows is not None else 0},
+        "memory": {
+            "flow_table_mb": round(flows.nbytes / 2**20, 2),
+            "rss_before_load_mb": round(rss_before_mb, 1),
+            "rss_after_load_mb": round(rss_after_mb, 1),
+            "rss_current_mb": round(rss_mb(), 1),
+            "rss_peak_mb": round(peak_rss_mb(), 1),
+        },
+        "graph": {"edges": int(graph.matrix.nnz), "mb": round(graph.nbytes / 2**20, 2)} if graph is not None else None,
+        "similar_areas": {"k": similarity.table_k, "on_demand": bool(similarity.profiles)} if similarity is not None else None,
+        "datasets": registry.describe() if registry is not None else None,
+        "area_stats": {level: len(stats) if stats is not None else 0 for level, stats in area_stats.items()},
+        "response_cache": response_cache.stats(),
+        "compression": list(ENCODINGS),
+        "tiles": tiles.stats() if tiles is not None else None,
+    })
 
 if __name__ == '__main__':
     print("\n🚀 Servidor rodando em http://localhost:5000")
     print("📡 Endpoints disponíveis:")
-    print("   - GET /api/flows/<area_code>?direction=incoming&limit=1000")
-    print("   - GET /api/health")
+    print("   - GET /api/flows/<area_code>?direction=incoming&limit=1000[&precision=5][&format=arrow][&zoom=6&bundle=1]")
+    print("   - GET|POST /api/flows/batch?areas=E02000001,E02000002|bbox=...|radius=lon,lat,km&direction=both")
+    print("   - GET /api/ltla/flows/<ltla_code>?direction=incoming&limit=1000")
+    print("   - GET /api/areas/nearest?lon=-0.1&lat=51.5&k=1 | GET|POST /api/areas/within?radius=-0.1,51.5,5")
+    print("   - GET /api/areas/<code>/stats (MSOA ou LTLA)")
+    print("   - GET /api/areas/<code>/network | /api/areas/<code>/catchment?direction=incoming&coverage=0.8")
+    print("   - GET /api/network/top?metric=pagerank&n=20 | /api/network/communities?members=1")
+    print("   - GET /api/areas/<code>/similar?by=both&k=10")
+    print("   - GET /api/datasets | /api/flows/<code>?dataset=wu03ew-2011 | ...&compare=wu03ew-2011 (variação)")
+    print("   - GET /api/areas/<code>/delta?compare=wu03ew-2011 | /api/deltas/areas?compare=wu03ew-2011&by=inflow")
+    print("   - GET /api/tiles.json | /api/tiles/<z>/<x>/<y>.pbf")
+    print("   - GET /api/health | /api/metrics (Prometheus) | qualquer rota com ?profile=1 (FLOWS_PROFILING=1)")
+    print(f"🗄️  Backend MSOA: {flows_source} (FLOWS_BACKEND=memory|duckdb)")
+    print("🏭 Produção (vários workers, dados compartilhados): cd api && gunicorn -c gunicorn.conf.py flows_api:app")
     app.run(debug=True, port=5000)
@@ -0,0 +1,216 @@
+"""
+Generalização dos fluxos por zoom: menos linhas (e bytes) nos zooms baixos.
+
+Os extremos de cada fluxo são "encaixados" numa geometria mais grossa de
+acordo com o zoom do mapa e os fluxos paralelos resultantes são somados:
+- zoom <= ZOOM_LTLA: centróides LTLA (distritos)
+- até ZOOM_FULL: grid de GRID_PX pixels em Web Mercator (área única mantém
+  código/nome; células com várias áreas viram um ponto no centróide médio)
+- zoom >= ZOOM_FULL: fluxos MSOA originais
+
+O encaixe de cada área é pré-calculado uma vez por zoom (alguns ms para ~7k
+áreas); por requisição sobra só um groupby vetorizado (np.unique +
+np.bincount) sobre as linhas já selecionadas pelo índice.
+
+Opcionalmente, as maiores linhas passam por um force-directed edge bundling
+(Holten & van Wijk, 2009) vetorizado, que curva fluxos compatíveis (mesma
+direção, escala e região) uns em direção aos outros.
+"""
+import numpy as np
+
+from areas import AreaTable
+from vector_tiles import lonlat_to_world, world_to_lonlat
+
+ZOOM_LTLA = 7
+ZOOM_FULL = 12
+GRID_PX = 24  # lado da célula em pixels de um tile de 256 px
+BUNDLE_MAX_EDGES = 200  # o bundling é O(E²): só as maiores linhas são curvadas
+
+
+def parse_zoom(value):
+    """Zoom da requisição (None = sem generalização)."""
+    if value is None or value == "":
+        return None
+    zoom = int(float(value))
+    if not 0 <= zoom <= 24:
+        raise ValueError("zoom deve estar entre 0 e 24")
+    return zoom
+
+
+class Generalizer:
+    """Encaixe das áreas por zoom (cacheado) + soma dos fluxos paralelos."""
+
+    def __init__(self, areas, ltla_areas=None, area_ltla=None):
+        self.areas = areas
+        self.ltla_areas = ltla_areas
+        self.area_ltla = area_ltla
+        self._wx, self._wy = lonlat_to_world(areas.lon, areas.lat)
+        self._snaps = {}
+
+    @classmethod
+    def with_ltla(cls, areas, ltla_areas, lookup_path):
+        """Generalizer MSOA que usa os centróides LTLA nos zooms baixos."""
+        from ltla import msoa_to_ltla_ids
+
+        msoa_codes, msoa_ltla = msoa_to_ltla_ids(lookup_path, ltla_areas)
+        pos = np.minimum(np.searchsorted(msoa_codes, areas.codes), len(msoa_codes) - 1)
+        area_ltla = np.where(msoa_codes[pos] == areas.codes, msoa_ltla[pos], -1).astype(np.int32)
+        return cls(areas, ltla_areas, area_ltla)
+
+    def mode(self, zoom):
+        if zoom is None or zoom >= ZOOM_FULL:
+            return "none"
+        if zoom <= ZOOM_LTLA and self.ltla_areas is not None:
+            return "ltla"
+        return "grid"
+
+    def snap(self, zoom):
+        """(AreaTable dos pontos encaixados, id do ponto de cada área) para um zoom."""
+        snap = self._snaps.get(zoom)
+        if snap is None:
+            if self.mode(zoom) == "ltla":
+                snap = (self.ltla_areas, self.area_ltla)
+            else:
+                snap = self._grid(zoom)
+            self._snaps[zoom] = snap
+        return snap
+
+    def _grid(self, zoom):
+        cell_size = GRID_PX / (256 * 2 ** zoom)
+        cx = np.floor(self._wx / cell_size).astype(np.int64)
+        cy = np.floor(self._wy / cell_size).astype(np.int64)
+        keys, first, cell = np.unique(cx * (2 ** 31) + cy, return_index=True, return_inverse=True)
+        members = np.bincount(cell)
+        lat = np.bincount(cell, weights=self.areas.lat) / members
+        lon = np.bincount(cell, weights=self.areas.lon) / members
+        # Célula com uma área só mantém o código/nome da área
+        codes = np.where(members == 1, self.areas.codes[first],
+                         [f"grid-{zoom}-{k >> 31}-{k & (2 ** 31 - 1)}" for k in keys.tolist()])
+        names = np.where(members == 1, self.areas.names[first],
+                         np.array([f"{n} áreas" for n in members.tolist()], dtype=object))
+        cells = AreaTable(codes, names, lat, lon)
+        return cells, cells.ids_of(codes[cell])
+
+    def apply(self, zoom, origin_ids, dest_ids, counts):
+        """Soma os fluxos cujos extremos caem nos mesmos pontos encaixados.
+
+        Retorna (áreas, origin_ids, dest_ids, counts, resumo). Fluxos que
+        viram um laço (origem e destino no mesmo ponto) saem do resultado e
+        entram no resumo como `local`.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        mode = self.mode(zoom)
+        if mode == "none":
+            return self.areas, origin_ids, dest_ids, counts, {"zoom": zoom, "mode": mode}
+        cells, cell_of = self.snap(zoom)
+        o, d = cell_of[origin_ids], cell_of[dest_ids]
+        keep = (o >= 0) & (d >= 0) & (o != d)
+        n = len(cells)
+        keys, inverse = np.unique(o[keep].astype(np.int64) * n + d[keep], return_inverse=True)
+        totals = np.bincount(inverse, weights=counts[keep], minlength=len(keys)).astype(np.int64)
+        summary = {
+            "zoom": zoom,
+            "mode": mode,
+            "input_flows": int(len(counts)),
+            "output_flows": int(len(keys)),
+            "local": int(counts[~keep].sum()),
+        }
+        return cells, (keys // n).astype(np.int32), (keys % n).astype(np.int32), totals, summary
+
+
+# --- Force-directed edge bundling -----------------------------------------------
+
+def _visibility(p0, p1):
+    """V[i, j]: quanto a projeção da aresta j na reta da aresta i cobre o meio de i."""
+    v = p1 - p0
+    len2 = np.maximum((v ** 2).sum(axis=1), 1e-24)[:, None]
+    t0 = ((p0[None, :, :] - p0[:, None, :]) * v[:, None, :]).sum(axis=-1) / len2
+    t1 = ((p1[None, :, :] - p0[:, None, :]) * v[:, None, :]).sum(axis=-1) / len2
+    # em coordenadas da reta de i: meio de i em 0.5, projeções de j em t0, t1
+    span = np.abs(t1 - t0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vis = 1 - 2 * np.abs(0.5 - (t0 + t1) / 2) / span
+    return np.clip(np.nan_to_num(vis, nan=0.0), 0, None)
+
+
+def compatibility(p0, p1):
+    """Matriz E×E de compatibilidade (ângulo · escala · posição · visibilidade)."""
+    v = p1 - p0
+    length = np.maximum(np.hypot(v[:, 0], v[:, 1]), 1e-12)
+    angle = np.abs(v @ v.T) / np.outer(length, length)
+    lavg = (length[:, None] + length[None, :]) / 2
+    scale = 2 / (lavg / np.minimum.outer(length, length) + np.maximum.outer(length, length) / lavg)
+    mid = (p0 + p1) / 2
+    mid_dist = np.hypot(mid[:, None, 0] - mid[None, :, 0], mid[:, None, 1] - mid[None, :, 1])
+    position = lavg / (lavg + mid_dist)
+    vis = _visibility(p0, p1)
+    compat = angle * scale * position * np.minimum(vis, vis.T)
+    np.fill_diagonal(compat, 0)
+    return compat
+
+
+def _resample(polylines, n_points):
+    """`n_points` pontos internos igualmente espaçados em cada polilinha (E, K, 2)."""
+    seg = np.hypot(*np.diff(polylines, axis=1).transpose(2, 0, 1))
+    cum = np.concatenate([np.zeros((len(seg), 1)), np.cumsum(seg, axis=1)], axis=1)
+    target = cum[:, -1:] * np.arange(1, n_points + 1) / (n_points + 1)
+    idx = np.clip((cum[:, None, :] <= target[:, :, None]).sum(axis=-1) - 1, 0, seg.shape[1] - 1)
+    rows = np.arange(len(polylines))[:, None]
+    start, seg_len = cum[rows, idx], seg[rows, idx]
+    t = np.divide(target - start, seg_len, out=np.zeros_like(target), where=seg_len > 0)[..., None]
+    return polylines[rows, idx] * (1 - t) + polylines[rows, idx + 1] * t
+
+
+def bundle_edges(p0, p1, cycles=5, iterations=50, step=0.1, stiffness=0.1, threshold=0.6):
+    """FDEB: polilinhas (E, 2**(cycles-1) + 2, 2) para os segmentos p0→p1 (E, 2).
+
+    As coordenadas são normalizadas para uma diagonal de 1000 "pixels", onde
+    os parâmetros padrão do algoritmo (passo, rigidez) fazem sentido.
+    """
+    p0 = np.asarray(p0, dtype=np.float64)
+    p1 = np.asarray(p1, dtype=np.float64)
+    origin = np.minimum(p0.min(axis=0), p1.min(axis=0))
+    span = np.hypot(*(np.maximum(p0.max(axis=0), p1.max(axis=0)) - origin))
+    scale = 1000.0 / max(span, 1e-12)
+    a, b = (p0 - origin) * scale, (p1 - origin) * scale
+    weights = (compatibility(a, b) >= threshold).astype(np.float64)
+    length = np.maximum(np.hypot(*(b - a).T), 1e-9)
+
+    n_sub = 1
+    points = ((a + b) / 2)[:, None, :]
+    for cycle in range(cycles):
+        kp = (stiffness / (length * (n_sub + 1)))[:, None, None]
+        for _ in range(max(int(iterations), 1)):
+            full = np.concatenate([a[:, None], points, b[:, None]], axis=1)
+            spring = full[:, :-2] + full[:, 2:] - 2 * points
+            diff = points[None, :, :, :] - points[:, None, :, :]
+            dist = np.hypot(diff[..., 0], diff[..., 1])[..., None]
+            unit = np.divide(diff, dist, out=np.zeros_like(diff), where=dist > 1e-9)
+            electro = np.einsum("ij,ijpk->ipk", weights, unit)
+            points = points + step * (kp * spring + electro)
+        if cycle < cycles - 1:
+            n_sub *= 2
+            points = _resample(np.concatenate([a[:, None], points, b[:, None]], axis=1), n_sub)
+            step /= 2
+            iterations *= 2 / 3
+    full = np.concatenate([a[:, None], points, b[:, None]], axis=1)
+    return full / scale + origin
+
+
+def bundle_paths(areas, origin_ids, dest_ids, max_edges=BUNDLE_MAX_EDGES):
+    """Geometrias [lon, lat] por fluxo: as `max_edges` primeiras curvadas, o resto reto."""
+    origin_ids = np.asarray(origin_ids)
+    dest_ids = np.asarray(dest_ids)
+    wx, wy = lonlat_to_world(areas.lon, areas.lat)
+    n = min(len(origin_ids), max_edges)
+    paths = [None] * len(origin_ids)
+    if n >= 2:
+        o, d = origin_ids[:n], dest_ids[:n]
+        bundled = bundle_edges(np.column_stack([wx[o], wy[o]]), np.column_stack([wx[d], wy[d]]))
+        lon, lat = world_to_lonlat(bundled[..., 0], bundled[..., 1])
+        # extremos exatos (sem ida e volta pela projeção)
+        lon[:, 0], lat[:, 0] = areas.lon[o], areas.lat[o]
+        lon[:, -1], lat[:, -1] = areas.lon[d], areas.lat[d]
+        for i in range(n):
+            paths[i] = np.column_stack([lon[i], lat[i]]).astype(np.float32)
+    return paths
@@ -0,0 +1,44 @@
+"""
+Configuração do gunicorn para servir a API em produção.
+
+Uso (dentro de api/):
+    gunicorn -c gunicorn.conf.py flows_api:app
+
+- preload_app: os dados são carregados uma vez no processo mestre e os
+  workers nascem por fork, compartilhando as páginas (copy-on-write; o índice
+  mmap é compartilhado pelo próprio page cache). gc.freeze() antes do fork
+  evita que o coletor de lixo toque nesses objetos e force cópias.
+- Com FLOWS_BACKEND=duckdb não há preload: conexões DuckDB não sobrevivem
+  ao fork, então cada worker abre a sua.
+- Workers gthread: cada worker atende FLOWS_THREADS requisições em paralelo
+  (numpy e a serialização liberam o GIL em boa parte do trabalho).
+
+Variáveis: FLOWS_BIND (0.0.0.0:5000), FLOWS_WORKERS (nº de CPUs),
+FLOWS_THREADS (4), FLOWS_BACKEND, FLOWS_CACHE_SIZE.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("FLOWS_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("FLOWS_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("FLOWS_THREADS", 4))
+preload_app = os.environ.get("FLOWS_BACKEND", "memory") != "duckdb"
+chdir = os.path.dirname(os.path.abspath(__file__))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get("FLOWS_ACCESS_LOG")  # ex.: "-" para stdout
+
+if preload_app:
+    # Uma thread de carga no mestre não existiria nos workers depois do fork
+    os.environ["FLOWS_LOAD_IN_BACKGROUND"] = "0"
+
+
+def when_ready(server):
+    """Roda no mestre depois do preload e antes de criar os workers."""
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+    server.log.info("API pronta: %d workers x %d threads (preload=%s)", workers, threads, preload_app)
@@ -0,0 +1,221 @@
+"""
+Arquivo de índice pré-construído (memory-mapped) para a API de fluxos.
+
+Formato (little-endian):
+    MAGIC (8 bytes) | tamanho do cabeçalho (uint32) | cabeçalho JSON | arrays
+
+O cabeçalho guarda a versão do formato, a impressão digital (tamanho, mtime e
+sha256) dos arquivos de origem, um crc32 dos dados e a posição/dtype/shape de
+cada array. Os arrays ficam alinhados em 64 bytes e são lidos como views de
+um único np.memmap: a inicialização leva milissegundos e as páginas são
+compartilhadas entre os processos (workers) que abrem o mesmo arquivo.
+
+Qualquer arquivo malformado (MAGIC errado, cabeçalho que não é JSON válido,
+arrays faltando, curtos ou com tamanhos incoerentes) vira StaleIndexError,
+como um índice desatualizado: quem chama cai no parquet.
+"""
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from areas import AreaTable
+from flow_index import FlowIndex, FlowTable
+
+MAGIC = b"MSOAFIDX"
+FORMAT_VERSION = 2
+ALIGN = 64
+
+
+class StaleIndexError(Exception):
+    """O arquivo de índice não corresponde à versão ou aos dados de origem."""
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(path):
+    """Impressão digital de um arquivo de origem."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path)}
+
+
+def matches_fingerprint(saved, path):
+    """Compara com a origem atual; só recalcula o sha256 se tamanho/mtime mudaram."""
+    st = os.stat(path)
+    if st.st_size != saved["size"]:
+        return False
+    if st.st_mtime_ns == saved["mtime_ns"]:
+        return True
+    return file_sha256(path) == saved["sha256"]
+
+
+def _table_arrays(flows):
+    areas = flows.areas
+    # Nome ausente (None) não vira "": a máscara mantém o null do caminho via parquet
+    present = np.array([isinstance(n, str) for n in areas.names], dtype=np.uint8)
+    names = [n if isinstance(n, str) else "" for n in areas.names]
+    name_bytes = [n.encode("utf-8") for n in names]
+    name_offsets = np.zeros(len(name_bytes) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in name_bytes], out=name_offsets[1:])
+    return {
+        "origin_ids": flows.origin_ids,
+        "dest_ids": flows.dest_ids,
+        "counts": flows.counts,
+        "incoming_indptr": flows.index.incoming[0],
+        "incoming_order": flows.index.incoming[1],
+        "outgoing_indptr": flows.index.outgoing[0],
+        "outgoing_order": flows.index.outgoing[1],
+        "area_codes": areas.codes,
+        "area_lat": areas.lat,
+        "area_lon": areas.lon,
+        "area_name_offsets": name_offsets,
+        "area_name_bytes": np.frombuffer(b"".join(name_bytes), dtype=np.uint8),
+        "area_name_present": present,
+    }
+
+
+def write_index(path, flows, sources):
+    """Grava a FlowTable (já com índice) em `path`.
+
+    `sources` é um dict nome -> caminho dos arquivos de origem (parquet, lookup)
+    usados para detectar índices desatualizados.
+    """
+    arrays = {k: np.ascontiguousarray(v) for k, v in _table_arrays(flows).items()}
+    layout, offset, crc = {}, 0, 0
+    for name, arr in arrays.items():
+        offset = -(-offset // ALIGN) * ALIGN
+        layout[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset += arr.nbytes
+        crc = zlib.crc32(arr.tobytes(), crc)
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "sources": {k: fingerprint(p) for k, p in sources.items()},
+        "crc32": crc,
+        "n_flows": len(flows),
+        "n_areas": len(flows.areas),
+        "arrays": layout,
+    }).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGN) * ALIGN
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)  # escrita atômica: workers nunca veem arquivo pela metade
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise StaleIndexError(f"{path} não é um arquivo de índice de fluxos")
+        raw_size = f.read(4)
+        if len(raw_size) != 4:
+            raise StaleIndexError(f"cabeçalho truncado em {path}")
+        (size,) = struct.unpack("<I", raw_size)
+        try:
+            header = json.loads(f.read(size))
+        except (UnicodeDecodeError, ValueError) as e:
+            raise StaleIndexError(f"cabeçalho inválido em {path}: {e}") from None
+    if not isinstance(header, dict) or not {"version", "sources", "arrays"} <= header.keys():
+        raise StaleIndexError(f"cabeçalho inválido em {path}")
+    header["data_start"] = -(-(len(MAGIC) + 4 + size) // ALIGN) * ALIGN
+    return header
+
+
+def _map_arrays(path, header):
+    """Views dos arrays sobre o mmap, conferindo dtype, shape e limites do arquivo."""
+    size = os.path.getsize(path)
+    mm = np.memmap(path, dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+    arrays = {}
+    try:
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            shape = [int(n) for n in spec["shape"]]
+            count = int(np.prod(shape))
+            start = header["data_start"] + int(spec["offset"])
+            if min(shape, default=0) < 0 or spec["offset"] < 0 or start + count * dtype.itemsize > size:
+                raise StaleIndexError(f"array {name} fora dos limites de {path} (arquivo truncado?)")
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=start).reshape(shape)
+    except (KeyError, TypeError, ValueError) as e:
+        raise StaleIndexError(f"layout inválido em {path}: {e}") from None
+    return arrays
+
+
+def _check_shapes(path, header, arrays):
+    """Tamanhos coerentes entre si (e com n_flows/n_areas do cabeçalho)."""
+    n_flows, n_areas = header.get("n_flows"), header.get("n_areas")
+    expected = {
+        "origin_ids": n_flows, "dest_ids": n_flows, "counts": n_flows,
+        "incoming_order": n_flows, "outgoing_order": n_flows,
+        "incoming_indptr": n_areas + 1 if isinstance(n_areas, int) else None,
+        "outgoing_indptr": n_areas + 1 if isinstance(n_areas, int) else None,
+        "area_codes": n_areas, "area_lat": n_areas, "area_lon": n_areas, "area_name_present": n_areas,
+        "area_name_offsets": n_areas + 1 if isinstance(n_areas, int) else None,
+        "area_name_bytes": None,
+    }
+    for name, length in expected.items():
+        if name not in arrays:
+            raise StaleIndexError(f"array {name} ausente em {path}")
+        if arrays[name].ndim != 1 or (length is not None and len(arrays[name]) != length):
+            raise StaleIndexError(f"array {name} com tamanho inválido em {path}")
+    for side in ("incoming", "outgoing"):
+        indptr = arrays[f"{side}_indptr"]
+        if indptr[0] != 0 or indptr[-1] != n_flows or np.any(np.diff(indptr) < 0):
+            raise StaleIndexError(f"índice CSR {side} inválido em {path}")
+    offsets = arrays["area_name_offsets"]
+    if offsets[0] != 0 or offsets[-1] != len(arrays["area_name_bytes"]) or np.any(np.diff(offsets) < 0):
+        raise StaleIndexError(f"nomes das áreas inválidos em {path}")
+
+
+def load_index(path, sources=None, verify=False):
+    """Abre o índice via mmap e monta a FlowTable sem copiar os arrays de fluxos.
+
+    Levanta StaleIndexError se a versão do formato for outra, se algum
+    arquivo de `sources` existente não bater com a impressão digital gravada
+    ou se o arquivo estiver malformado/truncado.
+    `verify=True` também confere o crc32 dos dados (lê o arquivo inteiro).
+    """
+    header = read_header(path)
+    if header["version"] != FORMAT_VERSION:
+        raise StaleIndexError(f"versão do índice {header['version']} != {FORMAT_VERSION}")
+    for name, src in (sources or {}).items():
+        saved = header["sources"].get(name) if isinstance(header["sources"], dict) else None
+        if saved is None or (os.path.exists(src) and not matches_fingerprint(saved, src)):
+            raise StaleIndexError(f"índice desatualizado em relação a {src}")
+
+    arrays = _map_arrays(path, header)
+    _check_shapes(path, header, arrays)
+
+    if verify:
+        crc = 0
+        for arr in arrays.values():
+            crc = zlib.crc32(arr.tobytes(), crc)
+        if crc != header["crc32"]:
+            raise StaleIndexError(f"checksum inválido em {path}")
+
+    name_bytes = arrays["area_name_bytes"].tobytes()
+    offsets = arrays["area_name_offsets"].tolist()
+    present = arrays["area_name_present"].tolist()
+    try:
+        names = [name_bytes[a:b].decode("utf-8") if has else None
+                 for a, b, has in zip(offsets[:-1], offsets[1:], present)]
+    except UnicodeDecodeError as e:
+        raise StaleIndexError(f"nomes das áreas inválidos em {path}: {e}") from None
+    areas = AreaTable(arrays["area_codes"], names, arrays["area_lat"], arrays["area_lon"])
+    index = FlowIndex(
+        (arrays["incoming_indptr"], arrays["incoming_order"]),
+        (arrays["outgoing_indptr"], arrays["outgoing_order"]),
+    )
+    return FlowTable(areas, arrays["origin_ids"], arrays["dest_ids"], arrays["counts"], index=index)
@@ -0,0 +1,228 @@
+"""
+Instrumentação das requisições da API: tempo por etapa, histogramas de
+latência no formato do Prometheus e profiling opcional por requisição.
+
+Cada requisição ganha um RequestTimer (em flask.g) com cronômetros por etapa
+(lookup, generalize, serialize, compress, ...), número de linhas e tamanho da
+resposta. Ao final tudo vai para a Metrics do processo, exposta em
+/api/metrics no formato texto do Prometheus. Com FLOWS_METRICS=0 o timer é
+um objeto nulo: nenhuma chamada de relógio, lock ou IO por requisição.
+
+Com FLOWS_PROFILING=1, ?profile=1 roda a requisição sob o pyinstrument (se
+instalado) ou o cProfile e a resposta vira o resumo do profiling em texto.
+Desligado por padrão (o resumo expõe detalhes internos e ignora o cache); um
+profiling por processo de cada vez (o cProfile não roda em duas threads),
+os pedidos concorrentes recebem 409.
+
+Os rótulos são de um conjunto fechado (a direção fora de incoming/outgoing/
+both vira "-") e escapados como pede o formato de exposição: um cliente não
+consegue criar séries novas nem injetar linhas em /api/metrics.
+
+As métricas são por processo: com vários workers do gunicorn, cada scrape
+cai num worker (use um rótulo de instância/pid para distinguir).
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - dependência opcional
+    Profiler = None
+
+METRICS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+DIRECTIONS = ("incoming", "outgoing", "both")
+
+
+class Histogram:
+    """Histograma cumulativo (buckets fixos) de uma série de rótulos."""
+
+    __slots__ = ("buckets", "counts", "total", "n")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.n += 1
+
+    def render(self, name, labels):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.n}')
+        lines.append(f"{name}_sum{{{labels.rstrip(',')}}} {self.total:.6f}")
+        lines.append(f"{name}_count{{{labels.rstrip(',')}}} {self.n}")
+        return lines
+
+
+def _escape(value):
+    """Valor de rótulo escapado (\\, \" e \n), como no formato de exposição do Prometheus."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "".join(f'{k}="{_escape(v)}",' for k, v in labels.items())
+
+
+def direction_label(direction):
+    """Direção pedida no conjunto fechado de rótulos (valores desconhecidos viram "-")."""
+    return direction if direction in DIRECTIONS else "-"
+
+
+class Metrics:
+    """Contadores e histogramas do processo, seguros entre threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.stages = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.requests = defaultdict(int)
+        self.rows = defaultdict(int)
+        self.started = time.time()
+
+    def observe(self, timer, endpoint, direction, status, nbytes):
+        seconds = time.perf_counter() - timer.start
+        with self._lock:
+            self.latency[(endpoint, direction)].observe(seconds)
+            self.requests[(endpoint, status)] += 1
+            self.sizes[endpoint].observe(nbytes)
+            self.rows[endpoint] += timer.rows
+            for stage, elapsed in timer.stages.items():
+                self.stages[(endpoint, stage)].observe(elapsed)
+
+    def render(self, extra=None):
+        """Texto no formato de exposição do Prometheus.
+
+        `extra`: nome -> valor (gauge) ou (valor, tipo), ex.: (hits, "counter")
+        para totais acumulados, que o rate() do Prometheus trata como contador.
+        """
+        out = []
+        with self._lock:
+            out += ["# HELP flows_request_duration_seconds Latência das requisições.",
+                    "# TYPE flows_request_duration_seconds histogram"]
+            for (endpoint, direction), hist in sorted(self.latency.items()):
+                out += hist.render("flows_request_duration_seconds", _labels(endpoint=endpoint, direction=direction))
+            out += ["# HELP flows_stage_duration_seconds Tempo de cada etapa dentro da requisição.",
+                    "# TYPE flows_stage_duration_seconds histogram"]
+            for (endpoint, stage), hist in sorted(self.stages.items()):
+                out += hist.render("flows_stage_duration_seconds", _labels(endpoint=endpoint, stage=stage))
+            out += ["# HELP flows_response_bytes Tamanho do corpo das respostas.",
+                    "# TYPE flows_response_bytes histogram"]
+            for endpoint, hist in sorted(self.sizes.items()):
+                out += hist.render("flows_response_bytes", _labels(endpoint=endpoint))
+            out += ["# HELP flows_requests_total Requisições por endpoint e status.",
+                    "# TYPE flows_requests_total counter"]
+            for (endpoint, status), n in sorted(self.requests.items()):
+                out.append(f"flows_requests_total{{{_labels(endpoint=endpoint, status=status).rstrip(',')}}} {n}")
+            out += ["# HELP flows_rows_total Linhas de fluxo devolvidas.", "# TYPE flows_rows_total counter"]
+            for endpoint, n in sorted(self.rows.items()):
+                out.append(f"flows_rows_total{{{_labels(endpoint=endpoint).rstrip(',')}}} {n}")
+        out += ["# TYPE flows_process_start_time_seconds gauge",
+                f"flows_process_start_time_seconds {self.started:.3f}"]
+        for name, value in (extra or {}).items():
+            value, kind = value if isinstance(value, tuple) else (value, "gauge")
+            out += [f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(out) + "\n"
+
+
+class RequestTimer:
+    """Cronômetros por etapa de uma requisição."""
+
+    enabled = True
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.rows = 0
+        self.profiler = None
+        self._stopped = False
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def server_timing(self):
+        """Cabeçalho Server-Timing (visível no DevTools do navegador)."""
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items())
+
+    def start_profile(self):
+        """Liga o profiler; False se outra requisição já está sendo perfilada."""
+        if not PROFILE_LOCK.acquire(blocking=False):
+            return False
+        self.profiler = Profiler() if Profiler is not None else cProfile.Profile()
+        if Profiler is not None:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+        return True
+
+    def stop_profile(self):
+        """Para o profiler e libera a vez (idempotente; chamado também no teardown)."""
+        if self.profiler is None or self._stopped:
+            return
+        self._stopped = True
+        try:
+            if Profiler is not None and isinstance(self.profiler, Profiler):
+                self.profiler.stop()
+            else:
+                self.profiler.disable()
+        finally:
+            PROFILE_LOCK.release()
+
+    def profile_report(self, limit=40):
+        """Para o profiler e retorna o resumo em texto."""
+        self.stop_profile()
+        if Profiler is not None and isinstance(self.profiler, Profiler):
+            return self.profiler.output_text(unicode=True, color=False)
+        buf = io.StringIO()
+        pstats.Stats(self.profiler, stream=buf).sort_stats("cumulative").print_stats(limit)
+        return buf.getvalue()
+
+
+class NullTimer:
+    """Timer desligado: etapas sem custo (sem relógio nem dicionário)."""
+
+    enabled = False
+    profiler = None
+    _null = nullcontext()
+
+    @property
+    def rows(self):
+        return 0
+
+    @rows.setter
+    def rows(self, value):
+        """Sem efeito: o objeto é compartilhado entre as threads."""
+
+    def stage(self, name):
+        return self._null
+
+    def stop_profile(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+METRICS_ENABLED = os.environ.get("FLOWS_METRICS", "1") != "0"
+PROFILING_ALLOWED = os.environ.get("FLOWS_PROFILING", "0") == "1"
+PROFILE_LOCK = threading.Lock()
@@ -0,0 +1,51 @@
+"""
+Agregação dos fluxos MSOA para LTLA (distritos).
+
+O mapeamento MSOA→LTLA vem do ltla_lookup.csv e os centróides do
+ltla_centroids.csv. A soma por par (origem, destino) é um groupby vetorizado:
+cada par vira uma chave o * n + d e o np.bincount acumula as contagens.
+O resultado é uma FlowTable (matriz OD compacta + índice CSR) com a mesma
+interface das MSOAs.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from areas import AreaTable
+from flow_index import FlowTable
+
+
+def msoa_to_ltla_ids(lookup_path, areas):
+    """(códigos MSOA ordenados, id LTLA correspondente na AreaTable ou -1)."""
+    lut = pd.read_csv(lookup_path, usecols=["msoa21cd", "ltla22cd"], dtype="string")
+    lut = lut.dropna().drop_duplicates(subset=["msoa21cd"]).sort_values("msoa21cd")
+    return lut["msoa21cd"].to_numpy().astype(str), areas.ids_of(lut["ltla22cd"].to_numpy())
+
+
+def _ltla_ids_for(codes_column, msoa_codes, msoa_ltla):
+    """Converte uma coluna dicionarizada de códigos MSOA em ids LTLA por linha."""
+    codes = codes_column.combine_chunks()
+    dictionary = codes.dictionary.to_numpy(zero_copy_only=False).astype(str)
+    pos = np.minimum(np.searchsorted(msoa_codes, dictionary), len(msoa_codes) - 1)
+    dict_ltla = np.where(msoa_codes[pos] == dictionary, msoa_ltla[pos], -1)
+    return dict_ltla[codes.indices.to_numpy()]
+
+
+def aggregate_msoa_flows(parquet_path, lookup_path, centroids_path):
+    """Lê os fluxos MSOA do parquet e retorna a FlowTable LTLA agregada."""
+    areas = AreaTable.from_csv(centroids_path)
+    msoa_codes, msoa_ltla = msoa_to_ltla_ids(lookup_path, areas)
+    table = pq.read_table(parquet_path, columns=["origin_code", "dest_code", "count"],
+                          read_dictionary=["origin_code", "dest_code"])
+
+    origin = _ltla_ids_for(table.column("origin_code"), msoa_codes, msoa_ltla)
+    dest = _ltla_ids_for(table.column("dest_code"), msoa_codes, msoa_ltla)
+    counts = table.column("count").to_numpy()
+    keep = (origin >= 0) & (dest >= 0)
+
+    n = len(areas)
+    keys = origin[keep].astype(np.int64) * n + dest[keep]
+    totals = np.bincount(keys, weights=counts[keep], minlength=n * n)
+    pairs = np.flatnonzero(totals)
+    flows = FlowTable(areas, pairs // n, pairs % n, totals[pairs].astype(np.int64))
+    return flows.sorted_by_destination()
@@ -0,0 +1,185 @@
+"""
+Vários conjuntos OD lado a lado (ex.: censo 2011 × 2021, tabelas por modo de
+transporte) e a variação entre eles.
+
+O manifesto data/interim/datasets.json (gravado pelo 01_csv_to_parquet.py a
+cada conversão) lista os conjuntos: parquet, índice mmap, rótulo, número de
+linhas e impressão digital do CSV de origem. Todos usam o mesmo lookup de
+centróides, então os ids da AreaTable valem para todos (se um índice antigo
+tiver outra tabela de áreas, os ids são remapeados pelo código).
+
+A variação entre dois conjuntos é um merge ordenado das chaves codificadas
+origem*n + destino (int64), sem comparar strings. O resultado é uma
+DeltaTable: uma FlowTable cujas contagens são a variação (com sinal) e cujo
+índice CSR ordena por |variação|. As rotas de fluxos a servem pelo mesmo
+caminho (slice do índice + cache de respostas) dos fluxos normais.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from flow_index import FlowIndex, FlowTable, top_n_order
+from index_file import StaleIndexError, fingerprint, load_index
+
+MANIFEST_VERSION = 1
+
+
+def read_manifest(path):
+    """Manifesto dos conjuntos ({"default", "datasets"}); None se não existir."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_manifest(path, name, entry, default=None):
+    """Acrescenta/atualiza um conjunto no manifesto (gravação atômica)."""
+    manifest = read_manifest(path) or {"version": MANIFEST_VERSION, "default": default or name, "datasets": {}}
+    if default is not None:
+        manifest["default"] = default
+    manifest["datasets"][name] = {**entry, "updated": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def source_entry(csv_path, parquet_path, index_path, label, rows):
+    return {"label": label, "raw_csv": csv_path, "parquet": parquet_path, "flow_index": index_path,
+            "rows": int(rows), "source": fingerprint(csv_path)}
+
+
+def aligned_ids(base, other):
+    """(origin_ids, dest_ids, counts) de `other` nos ids da AreaTable de `base`."""
+    if len(base.areas) == len(other.areas) and np.array_equal(base.areas.codes, other.areas.codes):
+        return other.origin_ids, other.dest_ids, other.counts
+    mapping = base.areas.ids_of(other.areas.codes)
+    origin, dest = mapping[other.origin_ids], mapping[other.dest_ids]
+    keep = (origin >= 0) & (dest >= 0)
+    return origin[keep], dest[keep], other.counts[keep]
+
+
+def merge_counts(keys_a, counts_a, keys_b, counts_b):
+    """Merge ordenado das chaves: (união das chaves, contagem em a, contagem em b)."""
+    keys = np.union1d(keys_a, keys_b)
+    a = np.bincount(np.searchsorted(keys, keys_a), weights=counts_a, minlength=len(keys)).astype(np.int64)
+    b = np.bincount(np.searchsorted(keys, keys_b), weights=counts_b, minlength=len(keys)).astype(np.int64)
+    return keys, a, b
+
+
+class DeltaTable(FlowTable):
+    """Variação por par (atual − base) com o índice ordenado por |variação|."""
+
+    def __init__(self, areas, origin_ids, dest_ids, delta, current_counts, baseline_counts, area_totals):
+        delta = np.asarray(delta, dtype=np.int32)
+        index = FlowIndex.build(origin_ids, dest_ids, np.abs(delta), len(areas))
+        super().__init__(areas, origin_ids, dest_ids, delta, index=index)
+        self.current_counts = np.asarray(current_counts, dtype=np.int32)
+        self.baseline_counts = np.asarray(baseline_counts, dtype=np.int32)
+        self.area_totals = area_totals
+
+    @classmethod
+    def between(cls, current, baseline):
+        """Compara dois FlowTables; pares sem variação ficam de fora (mas contam nos totais por área)."""
+        n = len(current.areas)
+        b_origin, b_dest, b_counts = aligned_ids(current, baseline)
+        keys, now, before = merge_counts(
+            current.origin_ids.astype(np.int64) * n + current.dest_ids, current.counts,
+            b_origin.astype(np.int64) * n + b_dest, b_counts,
+        )
+        origin, dest = (keys // n).astype(np.int32), (keys % n).astype(np.int32)
+        area_totals = {
+            "inflow_current": np.bincount(dest, weights=now, minlength=n).astype(np.int64),
+            "inflow_baseline": np.bincount(dest, weights=before, minlength=n).astype(np.int64),
+            "outflow_current": np.bincount(origin, weights=now, minlength=n).astype(np.int64),
+            "outflow_baseline": np.bincount(origin, weights=before, minlength=n).astype(np.int64),
+            # Pares origem → área que surgiram/sumiram entre os conjuntos
+            "new_origins": np.bincount(dest[before == 0], minlength=n),
+            "lost_origins": np.bincount(dest[now == 0], minlength=n),
+        }
+        changed = now != before
+        return cls(current.areas, origin[changed], dest[changed], (now - before)[changed],
+                   now[changed], before[changed], area_totals)
+
+    def top_rows(self, rows, limit=None):
+        """Top-N das linhas por |variação|."""
+        return rows[top_n_order(np.abs(self.counts[rows]), limit)]
+
+    def area_delta(self, area_id):
+        t = self.area_totals
+        item = {}
+        for side in ("inflow", "outflow"):
+            now, before = int(t[f"{side}_current"][area_id]), int(t[f"{side}_baseline"][area_id])
+            item[side] = {"current": now, "baseline": before, "change": now - before,
+                          "change_pct": round(100 * (now - before) / before, 2) if before else None}
+        item["new_origins"] = int(t["new_origins"][area_id])
+        item["lost_origins"] = int(t["lost_origins"][area_id])
+        return item
+
+    def top_area_changes(self, side="inflow", limit=50):
+        """Ids das áreas com maior |variação| de chegadas (inflow) ou saídas (outflow)."""
+        change = self.area_totals[f"{side}_current"] - self.area_totals[f"{side}_baseline"]
+        return top_n_order(np.abs(change), limit)
+
+
+def load_dataset(entry, root, lookup_path):
+    """FlowTable de um conjunto do manifesto: índice mmap se estiver em dia, senão o parquet."""
+    parquet_path = os.path.join(root, entry["parquet"])
+    index_path = os.path.join(root, entry["flow_index"]) if entry.get("flow_index") else None
+    if index_path is not None:
+        try:
+            return load_index(index_path, {"parquet": parquet_path, "lookup_areas": lookup_path}), "mmap"
+        except (FileNotFoundError, StaleIndexError):
+            pass
+    return FlowTable.from_parquet(parquet_path, lookup_path), "parquet"
+
+
+class DatasetRegistry:
+    """Conjuntos do manifesto (carregados sob demanda) e variações entre eles (em cache)."""
+
+    def __init__(self, manifest, root, lookup_path, default_table, default_name="default"):
+        # Sem manifesto, o conjunto carregado leva o nome de `datasets.default` do
+        # config.yaml: ?dataset= não muda de nome depois do 01_csv_to_parquet.py
+        self.manifest = manifest or {"default": default_name, "datasets": {}}
+        self.default = self.manifest["default"]
+        self.root = root
+        self.lookup_path = lookup_path
+        self.tables = {self.default: default_table}
+        self.sources = {self.default: "default"}
+        self.deltas = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return sorted(set(self.manifest["datasets"]) | {self.default})
+
+    def describe(self):
+        return [{"name": name, "default": name == self.default, "loaded_from": self.sources.get(name),
+                 **{k: v for k, v in self.manifest["datasets"].get(name, {}).items() if k != "source"}}
+                for name in self.names()]
+
+    def table(self, name):
+        if name in self.tables:
+            return self.tables[name]
+        if name not in self.manifest["datasets"]:
+            raise ValueError(f"conjunto desconhecido: {name} (disponíveis: {', '.join(self.names())})")
+        with self._lock:
+            if name not in self.tables:
+                self.tables[name], self.sources[name] = load_dataset(
+                    self.manifest["datasets"][name], self.root, self.lookup_path)
+            return self.tables[name]
+
+    def delta(self, name, compare):
+        """DeltaTable `name` − `compare` (calculada uma vez por par)."""
+        if name == compare:
+            raise ValueError("dataset e compare devem ser conjuntos diferentes")
+        key = (name, compare)
+        if key not in self.deltas:
+            current, baseline = self.table(name), self.table(compare)
+            with self._lock:
+                if key not in self.deltas:
+                    self.deltas[key] = DeltaTable.between(current, baseline)
+        return self.deltas[key]
@@ -0,0 +1,280 @@
+"""
+Grafo origem-destino como matriz esparsa (scipy.sparse CSR) para análises de
+rede: PageRank, hubs/autoridades, comunidades e bacias de deslocamento.
+
+A matriz W é n×n (n = áreas da AreaTable, mesmos ids da FlowTable):
+W[i, j] = pessoas que moram em i e trabalham em j. Todas as análises são
+produtos matriz-vetor ou operações por linha sobre os arrays do CSR, então
+uma rodada nacional (~7k MSOAs, ~1,8M pares) leva segundos.
+
+- pagerank: passeio aleatório seguindo os trabalhadores (morada → trabalho);
+  áreas com nota alta atraem gente de áreas que também atraem muita gente.
+- hits: hubs (áreas que mandam trabalhadores para as grandes autoridades) e
+  autoridades (polos de emprego), pelos vetores singulares principais de W.
+- communities: propagação de rótulos com ganho de modularidade (LPAm) sobre
+  o grafo simetrizado, em passos semi-síncronos vetorizados.
+- catchment/catchments: menor conjunto de origens (ou destinos) que cobre uma
+  fração dos fluxos de cada área: a bacia de emprego/moradia da área.
+
+Os resultados sem parâmetros de requisição ficam em cache (thread-safe), o
+que serve para a API calcular uma vez e reaproveitar.
+"""
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import svds
+from scipy.spatial import ConvexHull, QhullError
+
+from flow_index import FlowTable
+
+DIRECTIONS = ("incoming", "outgoing")
+METRICS = ("pagerank", "hub", "authority")
+
+
+def _row_argmax(matrix):
+    """Coluna do maior valor armazenado de cada linha (-1 se a linha é vazia); empate → menor coluna."""
+    matrix = matrix.tocsr()
+    matrix.sort_indices()
+    n = matrix.shape[0]
+    lengths = np.diff(matrix.indptr)
+    best = np.full(n, -1, dtype=np.int64)
+    if matrix.nnz == 0:
+        return best
+    rows = np.flatnonzero(lengths)
+    row_max = np.maximum.reduceat(matrix.data, matrix.indptr[rows])
+    row_of = np.repeat(np.arange(n), lengths)
+    full_max = np.full(n, -np.inf)
+    full_max[rows] = row_max
+    hits = np.flatnonzero(matrix.data == full_max[row_of])
+    # Primeiro empate de cada linha (índices ordenados: menor coluna)
+    _, first = np.unique(row_of[hits], return_index=True)
+    best[row_of[hits[first]]] = matrix.indices[hits[first]]
+    return best
+
+
+def _sheds(indptr, indices, data, coverage):
+    """Para cada grupo de um CSR/CSC: maiores parceiros até cobrir `coverage` do total.
+
+    Retorna (indptr, membros, contagens) no mesmo formato, cada grupo ordenado
+    por contagem decrescente. O parceiro que cruza o limite entra no conjunto.
+    """
+    n = len(indptr) - 1
+    lengths = np.diff(indptr)
+    group = np.repeat(np.arange(n), lengths)
+    order = np.lexsort((-data, group))
+    members, counts = indices[order], data[order]
+    # Soma acumulada com 0 na frente: total do grupo g = cum[indptr[g+1]] - cum[indptr[g]]
+    cum = np.concatenate([[0.0], np.cumsum(counts)])
+    group_start = cum[indptr[:-1]]
+    group_total = cum[indptr[1:]] - group_start
+    before = cum[:-1] - group_start[group]  # soma do grupo antes deste parceiro
+    keep = before < coverage * group_total[group]
+    out_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(group[keep], minlength=n), out=out_indptr[1:])
+    return out_indptr, members[keep], counts[keep]
+
+
+def ranks_of(values):
+    """Posição (1 = maior) de cada valor."""
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[np.argsort(-values, kind="stable")] = np.arange(1, len(values) + 1)
+    return ranks
+
+
+def convex_hull(lon, lat):
+    """Anel [[lon, lat], ...] fechado do fecho convexo dos pontos (None com menos de 3 pontos)."""
+    points = np.column_stack([lon, lat]).astype(np.float64)
+    if len(np.unique(points, axis=0)) < 3:
+        return None
+    try:
+        hull = ConvexHull(points)
+    except QhullError:  # pontos colineares
+        return None
+    ring = points[hull.vertices]
+    return np.round(np.vstack([ring, ring[:1]]), 6).tolist()
+
+
+class ODGraph:
+    """Matriz OD esparsa (linha = origem, coluna = destino) e análises de rede."""
+
+    def __init__(self, areas, matrix):
+        self.areas = areas
+        self.matrix = sp.csr_matrix(matrix, dtype=np.float64)
+        self.matrix.sum_duplicates()
+        # Cópia por coluna (destino): chegadas de uma área viram um slice contíguo
+        self.by_dest = self.matrix.tocsc()
+        self._cache = {}
+        self._lock = threading.RLock()  # cálculos em cache chamam outros cálculos em cache
+
+    @classmethod
+    def from_flows(cls, flows):
+        """Monta a matriz a partir de uma FlowTable (mmap ou parquet) sem copiar as áreas."""
+        n = len(flows.areas)
+        matrix = sp.csr_matrix((np.asarray(flows.counts, dtype=np.float64),
+                                (np.asarray(flows.origin_ids), np.asarray(flows.dest_ids))), shape=(n, n))
+        return cls(flows.areas, matrix)
+
+    @classmethod
+    def from_parquet(cls, parquet_path, lookup_path):
+        return cls.from_flows(FlowTable.from_parquet(parquet_path, lookup_path))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in (self.matrix, self.by_dest))
+
+    @property
+    def external(self):
+        """W sem a diagonal (quem trabalha na própria área não cria aresta)."""
+        return self._cached("external", lambda: (self.matrix - sp.diags(self.matrix.diagonal())).tocsr())
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    # ---- centralidade ----
+
+    def pagerank(self, alpha=0.85, tol=1e-10, max_iter=200):
+        """PageRank ponderado pelas contagens (soma 1); áreas sem saídas redistribuem uniformemente."""
+        return self._cached(("pagerank", alpha), lambda: self._pagerank(alpha, tol, max_iter))
+
+    def _pagerank(self, alpha, tol, max_iter):
+        W = self.external
+        n = W.shape[0]
+        out = np.asarray(W.sum(axis=1)).ravel()
+        inv = np.divide(1.0, out, out=np.zeros_like(out), where=out > 0)
+        transition_t = (sp.diags(inv) @ W).T.tocsr()
+        dangling = out == 0
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            new = alpha * (transition_t @ rank + rank[dangling].sum() / n) + (1 - alpha) / n
+            done = np.abs(new - rank).sum() < tol
+            rank = new
+            if done:
+                break
+        return rank / rank.sum()
+
+    def hits(self):
+        """(hubs, autoridades), cada um somando 1: vetores singulares principais de W."""
+        return self._cached("hits", self._hits)
+
+    def _hits(self):
+        W = self.external
+        if W.nnz == 0:
+            n = W.shape[0]
+            return np.full(n, 1.0 / n), np.full(n, 1.0 / n)
+        u, _, vt = svds(W, k=1, v0=np.ones(min(W.shape)))
+        hubs, authorities = np.abs(u[:, 0]), np.abs(vt[0])
+        return hubs / hubs.sum(), authorities / authorities.sum()
+
+    def metric(self, name):
+        if name == "pagerank":
+            return self.pagerank()
+        if name in ("hub", "authority"):
+            return self.hits()[0 if name == "hub" else 1]
+        raise ValueError(f"métrica desconhecida: {name} (use {', '.join(METRICS)})")
+
+    def ranks(self, name):
+        """Posição (1 = maior) de cada área na métrica."""
+        return self._cached(("ranks", name), lambda: ranks_of(self.metric(name)))
+
+    # ---- comunidades ----
+
+    def communities(self, resolution=1.0, max_iter=100, seed=0):
+        """Rótulo de comunidade por área (0 = comunidade de maior volume) e modularidade."""
+        return self._cached(("communities", resolution, seed),
+                            lambda: self._communities(resolution, max_iter, seed))
+
+    def _communities(self, resolution, max_iter, seed):
+        A = (self.external + self.external.T).tocsr()
+        n = A.shape[0]
+        degree = np.asarray(A.sum(axis=1)).ravel()
+        two_m = degree.sum()
+        if two_m == 0:
+            return np.arange(n), 0.0
+        rng = np.random.default_rng(seed)
+        labels = np.arange(n)
+        rows = np.arange(n)
+        for _ in range(max_iter):
+            onehot = sp.csr_matrix((np.ones(n), (rows, labels)), shape=(n, n))
+            # Peso de cada área para cada rótulo vizinho menos o esperado ao acaso (modularidade);
+            # o termo ínfimo garante que o próprio rótulo (ficar) também seja comparado
+            scores = (A @ onehot + onehot * 1e-9).tocsr()
+            volume = np.bincount(labels, weights=degree, minlength=n)
+            row_of = np.repeat(rows, np.diff(scores.indptr))
+            cols = scores.indices
+            expected = degree[row_of] * (volume[cols] - degree[row_of] * (cols == labels[row_of])) / two_m
+            scores.data = scores.data - resolution * expected
+            best = _row_argmax(scores)
+            best = np.where(best < 0, labels, best)
+            if np.array_equal(best, labels):
+                break
+            # Semi-síncrono: metade das áreas por passo evita oscilar entre dois rótulos
+            move = rng.random(n) < 0.5
+            labels = np.where(move, best, labels)
+
+        # Renumera por volume decrescente
+        uniq, labels = np.unique(labels, return_inverse=True)
+        volume = np.bincount(labels, weights=degree)
+        rank = np.empty(len(uniq), dtype=np.int64)
+        rank[np.argsort(-volume, kind="stable")] = np.arange(len(uniq))
+        labels = rank[labels]
+        return labels, self.modularity(A, labels, resolution)
+
+    @staticmethod
+    def modularity(A, labels, resolution=1.0):
+        coo = A.tocoo()
+        two_m = coo.data.sum()
+        internal = coo.data[labels[coo.row] == labels[coo.col]].sum()
+        volume = np.bincount(labels, weights=np.asarray(A.sum(axis=1)).ravel())
+        return float(internal / two_m - resolution * ((volume / two_m) ** 2).sum())
+
+    def community_stats(self, resolution=1.0, seed=0):
+        """Resumo (em cache) das comunidades de communities() com os mesmos parâmetros."""
+        return self._cached(("community_stats", resolution, seed),
+                            lambda: self.community_summary(self.communities(resolution, seed=seed)[0]))
+
+    def community_summary(self, labels):
+        """Por comunidade: áreas, fluxo interno (inclui quem trabalha na própria área) e autocontenção."""
+        coo = self.matrix.tocoo()
+        k = int(labels.max()) + 1 if len(labels) else 0
+        same = labels[coo.row] == labels[coo.col]
+        internal = np.bincount(labels[coo.row[same]], weights=coo.data[same], minlength=k)
+        outflow = np.bincount(labels[coo.row], weights=coo.data, minlength=k)
+        inflow = np.bincount(labels[coo.col], weights=coo.data, minlength=k)
+        sizes = np.bincount(labels, minlength=k)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            containment = np.where(outflow > 0, internal / outflow, 0.0)
+        return [{"id": c, "areas": int(sizes[c]), "internal": int(internal[c]), "inflow": int(inflow[c]),
+                 "outflow": int(outflow[c]), "self_containment": round(float(containment[c]), 4)}
+                for c in range(k)]
+
+    # ---- bacias de deslocamento ----
+
+    def _axis(self, direction):
+        """(indptr, parceiros, contagens) por área: chegadas (por destino) ou saídas (por origem)."""
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction deve ser {' ou '.join(DIRECTIONS)}")
+        m = self.by_dest if direction == "incoming" else self.matrix
+        return m.indptr, m.indices, m.data
+
+    def catchment(self, area_id, direction="incoming", coverage=0.8):
+        """(ids, contagens, total) da bacia de uma área: maiores origens (incoming) ou destinos
+        (outgoing) que somam `coverage` dos fluxos, incluindo a própria área."""
+        indptr, indices, data = self._axis(direction)
+        a, b = indptr[area_id], indptr[area_id + 1]
+        _, members, counts = _sheds(np.array([0, b - a]), indices[a:b], data[a:b], coverage)
+        return members, counts, float(data[a:b].sum())
+
+    def catchments(self, direction="incoming", coverage=0.8):
+        """Bacias de todas as áreas de uma vez, no formato CSR (indptr, membros, contagens)."""
+        return _sheds(*self._axis(direction), coverage)
+
+    def hull(self, area_ids):
+        """Contorno (fecho convexo dos centróides) de um conjunto de áreas."""
+        return convex_hull(self.areas.lon[area_ids], self.areas.lat[area_ids])
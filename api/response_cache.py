@@ -0,0 +1,96 @@
+"""
+Cache LRU em memória das respostas já codificadas (bytes) da API.
+
+O tráfego se concentra em poucas centenas de áreas, então guardar o corpo
+pronto evita refazer slice + serialização. Cada entrada tem um ETag forte
+(hash do corpo + versão dos dados) para responder 304 a GETs condicionais.
+As versões comprimidas (gzip/brotli) são guardadas na própria entrada.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+from compression import compress
+
+# `encoded`: codificação -> corpo comprimido; `key`: chave no cache (None se fora dele)
+CachedResponse = namedtuple("CachedResponse", ["body", "mimetype", "etag", "encoded", "key"])
+
+
+def _entry_size(entry):
+    return len(entry.body) + sum(len(b) for b in entry.encoded.values())
+
+
+class ResponseCache:
+    """LRU limitado por número de entradas, seguro para uso entre threads."""
+
+    def __init__(self, maxsize, version):
+        self.maxsize = maxsize
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+
+    def get(self, key):
+        key = (self.version,) + tuple(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        """Guarda o corpo e retorna a entrada (com ETag calculado)."""
+        etag = hashlib.blake2b(self.version.encode() + body, digest_size=16).hexdigest()
+        if self.maxsize <= 0:
+            return CachedResponse(body, mimetype, etag, {}, None)
+        key = (self.version,) + tuple(key)
+        entry = CachedResponse(body, mimetype, etag, {}, key)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= _entry_size(old)
+            self._entries[key] = entry
+            self.nbytes += len(body)
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= _entry_size(evicted)
+                self.evictions += 1
+        return entry
+
+    def encoded(self, entry, encoding):
+        """Corpo da entrada comprimido em `encoding`, comprimido só na primeira vez."""
+        body = entry.encoded.get(encoding)
+        if body is not None:
+            return body
+        body = compress(entry.body, encoding)
+        with self._lock:
+            if encoding not in entry.encoded:
+                entry.encoded[encoding] = body
+                if entry.key is not None and self._entries.get(entry.key) is entry:
+                    self.nbytes += len(body)
+        return entry.encoded[encoding]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "version": self.version,
+            }
@@ -0,0 +1,87 @@
+"""
+Serialização vetorizada de fluxos para GeoJSON.
+
+Em vez de montar um dict por linha (iterrows) e passar tudo pelo jsonify,
+montamos os bytes da FeatureCollection direto dos arrays de ids. Códigos,
+nomes e coordenadas já estão pré-codificados na AreaTable, então cada feature
+é só uma concatenação de trechos. A estrutura é a mesma do jsonify compacto
+(chaves ordenadas, ASCII escapado) que o dataService.ts já consome.
+
+Também há um formato binário colunar (Arrow IPC stream) para clientes que
+preferem decodificar direto em typed arrays: códigos e nomes vão
+dicionarizados, contagem em int32 e coordenadas em float32.
+"""
+import json
+
+import numpy as np
+import pyarrow as pa
+
+from areas import format_coords
+
+JSON_MIMETYPE = "application/json"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+# Mesma ordem de chaves que o jsonify (sort_keys=True) produz
+_FEATURE = (
+    '{{"geometry":{{"coordinates":[{},{}],"type":"LineString"}},'
+    '"properties":{{"count":{},"dest_code":{},"dest_name":{},'
+    '"origin_code":{},"origin_name":{}}},"type":"Feature"}}'
+)
+
+
+def encode_feature_collection(areas, origin_ids, dest_ids, counts, precision=None, members=None,
+                              paths=None):
+    """Monta os bytes de uma FeatureCollection de LineStrings origem→destino.
+
+    `origin_ids`/`dest_ids` são ids da AreaTable; `precision` limita o número
+    de casas decimais das coordenadas (None = precisão do float32). `members`
+    são membros extras do objeto raiz (ex.: resumo da seleção no batch).
+    `paths` (opcional) troca a linha reta de cada fluxo por uma polilinha
+    [lon, lat] (ex.: edge bundling); None numa posição mantém a linha reta.
+    """
+    coords = areas.coord_json(precision)
+    codes, names = areas.code_json, areas.name_json
+    origin_ids, dest_ids = np.asarray(origin_ids).tolist(), np.asarray(dest_ids).tolist()
+    if paths is None:
+        features = ",".join([
+            _FEATURE.format(coords[o], coords[d], c, codes[d], names[d], codes[o], names[o])
+            for o, d, c in zip(origin_ids, dest_ids, np.asarray(counts).tolist())
+        ])
+    else:
+        features = ",".join([
+            _FEATURE.format(coords[o], coords[d], c, codes[d], names[d], codes[o], names[o]) if path is None
+            else _FEATURE.format(",".join(format_coords(path[:-1, 0], path[:-1, 1], precision)), coords[d],
+                                 c, codes[d], names[d], codes[o], names[o])
+            for o, d, c, path in zip(origin_ids, dest_ids, np.asarray(counts).tolist(), paths)
+        ])
+    extra = "".join(f",{json.dumps(k)}:{json.dumps(v, sort_keys=True, separators=(',', ':'))}"
+                    for k, v in sorted((members or {}).items()))
+    return ('{"features":[' + features + "]" + extra + ',"type":"FeatureCollection"}').encode()
+
+
+def _dict_column(ids, values):
+    """Coluna dicionarizada só com as áreas presentes na resposta."""
+    uniq, inverse = np.unique(ids, return_inverse=True)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(inverse.astype(np.int32)), pa.array(values[uniq].tolist(), type=pa.string()))
+
+
+def encode_arrow(areas, origin_ids, dest_ids, counts):
+    """Serializa os fluxos como Arrow IPC stream (bytes)."""
+    origin_ids = np.asarray(origin_ids)
+    dest_ids = np.asarray(dest_ids)
+    table = pa.table({
+        "origin_code": _dict_column(origin_ids, areas.codes),
+        "origin_name": _dict_column(origin_ids, areas.names),
+        "dest_code": _dict_column(dest_ids, areas.codes),
+        "dest_name": _dict_column(dest_ids, areas.names),
+        "count": pa.array(np.asarray(counts, dtype=np.int32)),
+        "o_lon": pa.array(areas.lon[origin_ids]),
+        "o_lat": pa.array(areas.lat[origin_ids]),
+        "d_lon": pa.array(areas.lon[dest_ids]),
+        "d_lat": pa.array(areas.lat[dest_ids]),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,166 @@
+"""
+Busca de áreas com padrão de deslocamento parecido ("similar areas").
+
+Cada área vira dois vetores esparsos normalizados (norma L2) a partir da
+matriz OD do ODGraph: o perfil de saída (para onde vão os moradores, linha
+de W) e o de chegada (de onde vêm os trabalhadores, coluna de W). A
+similaridade é o cosseno entre perfis; com by="both" é a média dos dois.
+
+Consultas de uma área são um produto esparso × vetor denso (O(pares)). A
+tabela com os k vizinhos de todas as áreas é calculada em blocos: para cada
+bloco de B áreas, P @ P[bloco].T é um produto esparso × denso de n×B, e B é
+escolhido para o bloco caber em `chunk_bytes`. A memória fica limitada
+mesmo para centenas de milhares de áreas. A tabela é gravada em Arrow IPC
+(scripts/build_similar_areas.py) e a API só a lê.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pyarrow as pa
+import scipy.sparse as sp
+
+from index_file import StaleIndexError, fingerprint, matches_fingerprint
+
+FORMAT_VERSION = 1
+KINDS = ("outgoing", "incoming", "both")
+TOP_K = 20
+CHUNK_BYTES = 64 * 2**20
+
+
+def normalize_rows(matrix):
+    """Linhas com norma L2 = 1 (linhas vazias continuam vazias), em float32."""
+    matrix = sp.csr_matrix(matrix, dtype=np.float64)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sp.diags(inv) @ matrix).tocsr().astype(np.float32)
+
+
+def top_k(scores, k):
+    """(ids, valores) dos k maiores de cada linha de uma matriz densa, em ordem decrescente."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class SimilarityIndex:
+    """Perfis de deslocamento por área e tabela (opcional) de vizinhos pré-calculados."""
+
+    def __init__(self, codes, names, profiles=None, table=None):
+        self.codes = np.asarray(codes).astype(str)
+        self.names = np.asarray(names, dtype=object)
+        self.profiles = profiles or {}  # "outgoing"/"incoming" -> CSR n×n normalizado
+        self.table = table or {}  # kind -> (ids int32 n×k, similaridade float32 n×k)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Perfis a partir do ODGraph (linha = origem, coluna = destino)."""
+        profiles = {"outgoing": normalize_rows(graph.matrix), "incoming": normalize_rows(graph.by_dest.T)}
+        return cls(graph.areas.codes, graph.areas.names, profiles)
+
+    @property
+    def nbytes(self):
+        arrays = [a for p in self.profiles.values() for a in (p.data, p.indices, p.indptr)]
+        arrays += [a for pair in self.table.values() for a in pair]
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def table_k(self):
+        return min((ids.shape[1] for ids, _ in self.table.values()), default=0)
+
+    def lookup(self, code):
+        i = int(np.searchsorted(self.codes, code))
+        if i < len(self.codes) and self.codes[i] == code:
+            return i
+        return None
+
+    def scores(self, area_ids, kind):
+        """Similaridade (len(area_ids) × n, densa) das áreas pedidas com todas as outras."""
+        parts = ("outgoing", "incoming") if kind == "both" else (kind,)
+        total = None
+        for part in parts:
+            P = self.profiles[part]
+            block = P[area_ids].toarray().T  # n×B denso
+            product = P @ block  # esparso × denso → n×B
+            total = product if total is None else total + product
+        return (total / len(parts)).T
+
+    def similar(self, area_id, kind="both", k=10):
+        """(ids, similaridades) das k áreas mais parecidas (sem a própria, só similaridade > 0)."""
+        if kind not in KINDS:
+            raise ValueError(f"by deve ser {', '.join(KINDS)}")
+        if kind in self.table and k <= self.table[kind][0].shape[1]:
+            ids, values = self.table[kind][0][area_id, :k], self.table[kind][1][area_id, :k]
+        elif self.profiles:
+            scores = self.scores(np.array([area_id]), kind)
+            scores[0, area_id] = -np.inf
+            ids, values = (a[0] for a in top_k(scores, k))
+        else:
+            raise LookupError(f"tabela pré-calculada tem só {self.table_k} vizinhos por área")
+        keep = (ids >= 0) & (values > 0)
+        return ids[keep], values[keep]
+
+    def build_table(self, k=TOP_K, kinds=KINDS, chunk_bytes=CHUNK_BYTES, progress=None):
+        """Calcula os k vizinhos de todas as áreas, bloco a bloco (memória ~chunk_bytes por bloco)."""
+        n = len(self)
+        k = min(k, max(n - 1, 1))
+        # Até três blocos densos n×B float32 ao mesmo tempo (dois perfis com by="both" + a soma)
+        rows_per_chunk = max(1, chunk_bytes // (n * 4 * 3))
+        for kind in kinds:
+            ids = np.full((n, k), -1, dtype=np.int32)
+            values = np.zeros((n, k), dtype=np.float32)
+            for start in range(0, n, rows_per_chunk):
+                rows = np.arange(start, min(start + rows_per_chunk, n))
+                scores = self.scores(rows, kind)
+                scores[np.arange(len(rows)), rows] = -np.inf
+                top_ids, top_values = top_k(scores, k)
+                ids[rows], values[rows] = top_ids, top_values
+                if progress is not None:
+                    progress(kind, rows[-1] + 1, n)
+            with self._lock:
+                self.table[kind] = (ids, values)
+        return self.table
+
+    def write(self, path, sources):
+        """Grava a tabela de vizinhos em Arrow IPC; `sources` (nome -> caminho) detecta dados desatualizados."""
+        columns = {"code": pa.array(self.codes.tolist(), type=pa.string()),
+                   "name": pa.array([n if isinstance(n, str) else None for n in self.names], type=pa.string())}
+        for kind, (ids, values) in self.table.items():
+            k = ids.shape[1]
+            columns[f"{kind}_ids"] = pa.FixedSizeListArray.from_arrays(pa.array(ids.reshape(-1)), k)
+            columns[f"{kind}_similarity"] = pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), k)
+        meta = {"version": str(FORMAT_VERSION), "kinds": ",".join(self.table),
+                "sources": json.dumps({name: fingerprint(p) for name, p in sources.items()})}
+        table = pa.table(columns).replace_schema_metadata(meta)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, sources=None, profiles=None):
+        """Abre a tabela via memory-map; StaleIndexError se versão/origem não baterem."""
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        meta = {k.decode(): v.decode() for k, v in table.schema.metadata.items()}
+        if int(meta["version"]) != FORMAT_VERSION:
+            raise StaleIndexError(f"versão da tabela de similares {meta['version']} != {FORMAT_VERSION}")
+        saved = json.loads(meta["sources"])
+        for name, src in (sources or {}).items():
+            if name not in saved or (os.path.exists(src) and not matches_fingerprint(saved[name], src)):
+                raise StaleIndexError(f"tabela de similares desatualizada em relação a {src}")
+
+        def matrix(name):
+            column = table.column(name).combine_chunks()
+            return column.flatten().to_numpy().reshape(len(column), column.type.list_size)
+
+        neighbors = {kind: (matrix(f"{kind}_ids"), matrix(f"{kind}_similarity"))
+                     for kind in meta["kinds"].split(",") if kind}
+        return cls(table.column("code").to_numpy(zero_copy_only=False),
+                   table.column("name").to_numpy(zero_copy_only=False), profiles, neighbors)
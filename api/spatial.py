@@ -0,0 +1,164 @@
+"""
+Seleção espacial de áreas pelos centróides (bbox, polígono, raio e vizinhos).
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def parse_bbox(value):
+    """"minLon,minLat,maxLon,maxLat" (ou lista) -> tupla de floats."""
+    if isinstance(value, str):
+        value = value.split(",")
+    bbox = tuple(float(v) for v in value)
+    if len(bbox) != 4:
+        raise ValueError("bbox precisa de 4 valores: minLon,minLat,maxLon,maxLat")
+    return bbox
+
+
+def points_in_bbox(lon, lat, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+
+
+def points_in_polygon(lon, lat, polygon):
+    """Ray casting vetorizado: um laço por aresta, todos os pontos de uma vez.
+
+    `polygon` é uma lista de [lon, lat] (anel externo; fechado ou não).
+    """
+    ring = np.asarray(polygon, dtype=np.float64)
+    if ring.ndim != 2 or ring.shape[1] != 2 or len(ring) < 3:
+        raise ValueError("polygon precisa de pelo menos 3 pares [lon, lat]")
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    # Pré-filtro pelo bbox do anel
+    inside = np.zeros(len(lon), dtype=bool)
+    candidates = np.flatnonzero(points_in_bbox(lon, lat, (*ring.min(axis=0), *ring.max(axis=0))))
+    x, y = lon[candidates], lat[candidates]
+    hit = np.zeros(len(candidates), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+        crosses = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        hit ^= crosses & (x < x_cross)
+    inside[candidates] = hit
+    return inside
+
+
+def parse_circle(value):
+    """"lon,lat,raio_km" (ou lista) -> tupla de floats."""
+    if isinstance(value, str):
+        value = value.split(",")
+    circle = tuple(float(v) for v in value)
+    if len(circle) != 3 or not np.all(np.isfinite(circle)) or circle[2] < 0:
+        raise ValueError("radius precisa de 3 valores: lon,lat,raio_km (raio >= 0)")
+    return circle
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def unit_vectors(lon, lat):
+    """Pontos lon/lat (graus) como vetores (x, y, z) na esfera unitária."""
+    lon, lat = np.radians(np.asarray(lon, dtype=np.float64)), np.radians(np.asarray(lat, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+class PointIndex:
+    """Consultas espaciais sobre os centróides em lon/lat.
+
+    Bbox e polígono são varreduras vetorizadas nos arrays (para ~7k pontos,
+    mais rápidas que descer uma árvore). Raio e vizinhos mais próximos usam um
+    scipy cKDTree sobre os pontos na esfera unitária (x, y, z): a distância
+    em linha reta cresce junto com a distância sobre a esfera, então a busca
+    da árvore é exata e as distâncias devolvidas são haversine. Bbox, polígono
+    e raio retornam ids (posições em lon/lat) em ordem crescente.
+    """
+
+    def __init__(self, lon, lat):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.n = len(self.lon)
+        self.tree = cKDTree(unit_vectors(self.lon, self.lat)) if self.n else None
+
+    def __len__(self):
+        return self.n
+
+    def in_bbox(self, bbox):
+        """Ids dos pontos dentro da bbox (minLon, minLat, maxLon, maxLat)."""
+        return np.flatnonzero(points_in_bbox(self.lon, self.lat, bbox))
+
+    def in_polygon(self, polygon):
+        """Ids dos pontos dentro do polígono (pré-filtro pela bbox do anel + ray casting)."""
+        return np.flatnonzero(points_in_polygon(self.lon, self.lat, polygon))
+
+    def within_radius(self, lon, lat, radius_km):
+        """(ids, distâncias em km) dos pontos a até `radius_km` do ponto."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        angle = min(radius_km / EARTH_RADIUS_KM, np.pi)
+        chord = 2 * np.sin(angle / 2) * (1 + 1e-9)  # folga numérica; o corte exato é pelo haversine
+        ids = np.sort(np.asarray(self.tree.query_ball_point(unit_vectors(lon, lat), chord), dtype=np.int64))
+        dist = haversine_km(lon, lat, self.lon[ids], self.lat[ids])
+        keep = dist <= radius_km
+        return ids[keep], dist[keep]
+
+    def nearest(self, lon, lat, k=1):
+        """(ids, distâncias em km) dos k pontos mais próximos, do mais perto ao mais longe."""
+        k = min(int(k), self.n)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        _, ids = self.tree.query(unit_vectors(lon, lat), k=k)
+        ids = np.atleast_1d(ids).astype(np.int64)
+        dist = haversine_km(lon, lat, self.lon[ids], self.lat[ids])
+        order = np.lexsort((ids, dist))
+        return ids[order], dist[order]
+
+
+class BoundaryIndex:
+    """Polígonos (ex.: limites LTLA) com as bboxes em arrays para achar quem contém um ponto."""
+
+    def __init__(self, features):
+        self.properties = []
+        self.polygons = []
+        boxes = []
+        for feature in features:
+            geometry = feature["geometry"]
+            polygons = geometry["coordinates"]
+            if geometry["type"] == "Polygon":
+                polygons = [polygons]
+            rings = [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon] for polygon in polygons]
+            points = np.concatenate([polygon[0] for polygon in rings])
+            self.properties.append(feature.get("properties") or {})
+            self.polygons.append(rings)
+            boxes.append((*points.min(axis=0), *points.max(axis=0)))
+        self._box = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def containing(self, lon, lat):
+        """Propriedades do primeiro polígono que contém o ponto (buracos respeitados) ou None."""
+        box = self._box
+        candidates = np.flatnonzero((box[:, 0] <= lon) & (box[:, 2] >= lon) & (box[:, 1] <= lat) & (box[:, 3] >= lat))
+        for i in candidates.tolist():
+            for polygon in self.polygons[i]:
+                if _point_in_ring(lon, lat, polygon[0]) and not any(
+                        _point_in_ring(lon, lat, hole) for hole in polygon[1:]):
+                    return self.properties[i]
+        return None
+
+
+def _point_in_ring(lon, lat, ring):
+    """Ray casting de um ponto só, vetorizado nas arestas (anéis com milhares de vértices)."""
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > lat) != (y2 > lat)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+    return bool(np.count_nonzero(crosses & (lon < x_cross)) % 2)
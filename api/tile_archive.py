@@ -0,0 +1,87 @@
+"""
+Arquivo único de vector tiles no formato MBTiles (SQLite).
+
+Escrita no pipeline (scripts/08_build_vector_tiles.py) e leitura na API.
+Os tiles ficam gzipados, como no MBTiles padrão; a linha do tile segue o
+esquema TMS (y invertido) da especificação.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+
+def write_mbtiles(path, tiles, metadata):
+    """Grava `tiles` [(z, x, y, bytes gzipados)] de forma atômica (tmp + rename)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.executescript("""
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        """)
+        con.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                        ((z, x, (1 << z) - 1 - y, sqlite3.Binary(data)) for z, x, y, data in tiles))
+        con.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        con.executemany("INSERT INTO metadata VALUES (?, ?)",
+                        ((k, v if isinstance(v, str) else json.dumps(v)) for k, v in metadata.items()))
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, path)
+
+
+class TileArchive:
+    """MBTiles somente-leitura; uma conexão SQLite por thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        rows = self._connection().execute("SELECT name, value FROM metadata").fetchall()
+        self.metadata = dict(rows)
+        self.minzoom = int(self.metadata["minzoom"])
+        self.maxzoom = int(self.metadata["maxzoom"])
+
+    def _connection(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.con = con
+        return con
+
+    def tile(self, z, x, y):
+        """Bytes gzipados do tile (esquema XYZ) ou None se não existir.
+
+        z fora de minzoom..maxzoom (ou x/y fora da grade) nem chega ao SQLite:
+        `1 << z` estouraria o inteiro de 64 bits do binding.
+        """
+        if not self.minzoom <= z <= self.maxzoom or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            return None
+        row = self._connection().execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def tilejson(self, tiles_url):
+        """TileJSON 3.0 para o MapLibre (`source: {type: 'vector', url: ...}`)."""
+        meta = self.metadata
+        tilejson = {
+            "tilejson": "3.0.0",
+            "name": meta.get("name"),
+            "tiles": [tiles_url],
+            "minzoom": self.minzoom,
+            "maxzoom": self.maxzoom,
+            "bounds": [float(v) for v in meta["bounds"].split(",")],
+            "center": [float(v) for v in meta["center"].split(",")],
+        }
+        tilejson.update(json.loads(meta.get("json", "{}")))
+        return tilejson
+
+    def stats(self):
+        rows = self._connection().execute(
+            "SELECT zoom_level, COUNT(*), SUM(LENGTH(tile_data)) FROM tiles GROUP BY zoom_level"
+        ).fetchall()
+        return {str(z): {"tiles": n, "bytes": size} for z, n, size in rows}
@@ -0,0 +1,383 @@
+"""
+Vector tiles (Mapbox Vector Tile 2.1) das linhas de fluxo e dos limites LTLA.
+
+Só numpy: o protobuf do MVT é codificado à mão (varints + comandos de
+geometria). As linhas de fluxo são recortadas por tile de forma vetorizada
+(Liang–Barsky em Web Mercator) e cada tile guarda só os N maiores fluxos que
+passam por ele; linhas que viram um ponto no grid do tile somem sozinhas
+nos zooms baixos. Os polígonos são simplificados (Douglas–Peucker) com
+tolerância de ~1 pixel do zoom e recortados (Sutherland–Hodgman) no tile,
+com uma margem para não aparecerem emendas.
+"""
+import struct
+
+import numpy as np
+
+EXTENT = 4096
+BUFFER = 64  # margem em unidades do tile (1/64 do tile)
+SIMPLIFY_TOLERANCE = 8  # unidades do tile (~1 px num tile de 512 px)
+
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+
+def lonlat_to_world(lon, lat):
+    """Web Mercator normalizado: x, y em [0, 1], y crescendo para o sul."""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878))
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return x, y
+
+
+def world_to_lonlat(x, y):
+    """Inverso de lonlat_to_world."""
+    lon = np.asarray(x, dtype=np.float64) * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * np.asarray(y, dtype=np.float64)))))
+    return lon, lat
+
+
+# --- Protobuf / MVT ---------------------------------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(field, payload):
+    """Campo length-delimited (wire type 2)."""
+    return _varint((field << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _field(field, b"".join(map(_varint, values)))
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 31)
+
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return _field(1, value.encode("utf-8"))
+    if isinstance(value, bool):
+        return _varint((7 << 3) | 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _varint((6 << 3) | 0) + _varint(((int(value) << 1) ^ (int(value) >> 63)) & (2**64 - 1))
+    return _varint((3 << 3) | 1) + struct.pack("<d", float(value))
+
+
+def encode_geometry(parts, closed):
+    """Comandos MoveTo/LineTo(/ClosePath) com deltas zigzag; `parts` em inteiros do tile."""
+    out = []
+    cx = cy = 0
+    for part in parts:
+        x, y = part[0]
+        out += [9, _zigzag(x - cx), _zigzag(y - cy)]  # MoveTo(1)
+        cx, cy = x, y
+        out.append(2 | ((len(part) - 1) << 3))  # LineTo(n - 1)
+        for x, y in part[1:]:
+            out += [_zigzag(x - cx), _zigzag(y - cy)]
+            cx, cy = x, y
+        if closed:
+            out.append(15)  # ClosePath(1)
+    return out
+
+
+class LayerBuilder:
+    """Acumula as features de uma camada de um tile (chaves/valores deduplicados)."""
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.keys = {}
+        self.values = {}
+        self.features = []
+
+    def __len__(self):
+        return len(self.features)
+
+    def add(self, geom_type, parts, properties):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        geometry = encode_geometry(parts, closed=geom_type == GEOM_POLYGON)
+        self.features.append(
+            _packed(2, tags) + _varint((3 << 3) | 0) + _varint(geom_type) + _packed(4, geometry)
+        )
+
+    def encode(self):
+        body = [_varint((15 << 3) | 0) + _varint(2), _field(1, self.name.encode("utf-8"))]
+        body += [_field(2, feature) for feature in self.features]
+        body += [_field(3, key.encode("utf-8")) for key in self.keys]
+        body += [_field(4, _encode_value(value)) for _, value in self.values]
+        body.append(_varint((5 << 3) | 0) + _varint(self.extent))
+        return b"".join(body)
+
+
+def encode_tile(layers):
+    """Tile MVT com as camadas não vazias."""
+    return b"".join(_field(3, layer.encode()) for layer in layers if len(layer))
+
+
+# --- Linhas de fluxo ----------------------------------------------------------
+
+def clip_segments(x0, y0, x1, y1, lo, hi):
+    """Liang–Barsky vetorizado contra o quadrado [lo, hi]²: (t0, t1); t0 > t1 = fora."""
+    dx, dy = x1 - x0, y1 - y0
+    t0 = np.zeros(len(x0))
+    t1 = np.ones(len(x0))
+    for p, q in ((-dx, x0 - lo), (dx, hi - x0), (-dy, y0 - lo), (dy, hi - y0)):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = q / p
+        t0 = np.where(p < 0, np.maximum(t0, r), t0)
+        t1 = np.where(p > 0, np.minimum(t1, r), t1)
+        t1 = np.where((p == 0) & (q < 0), -1.0, t1)
+    return t0, t1
+
+
+def _expand(counts):
+    """(grupo de cada item, posição dentro do grupo) para grupos de tamanho `counts`."""
+    group = np.repeat(np.arange(len(counts)), counts)
+    offset = np.arange(len(group)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return group, offset
+
+
+def _top_per_group(keys, ranks, limit):
+    """Posições dos `limit` menores ranks de cada chave, ordenadas por (chave, rank)."""
+    order = np.lexsort((ranks, keys))
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    position = np.arange(len(order)) - np.repeat(starts, sizes)
+    return order[position < limit]
+
+
+def _flow_tiles_chunk(ax, ay, bx, by, scale, margin, extent):
+    """Todos os pares (fluxo, tile) que um bloco de segmentos atravessa, já recortados."""
+    # 1) colunas de tiles cobertas por cada segmento
+    col0 = np.clip(np.floor(np.minimum(ax, bx) - margin), 0, scale - 1).astype(np.int64)
+    col1 = np.clip(np.floor(np.maximum(ax, bx) + margin), 0, scale - 1).astype(np.int64)
+    seg, k = _expand(col1 - col0 + 1)
+    tx = col0[seg] + k
+    # 2) em cada coluna, só as linhas de tiles que o trecho do segmento cruza
+    sx0, sx1 = np.minimum(ax, bx)[seg], np.maximum(ax, bx)[seg]
+    cx0 = np.maximum(tx - margin, sx0)
+    cx1 = np.minimum(tx + 1 + margin, sx1)
+    slope = np.divide(by - ay, bx - ax, out=np.zeros(len(ax)), where=bx != ax)[seg]
+    vertical = (bx == ax)[seg]
+    ya = np.where(vertical, ay[seg], ay[seg] + (cx0 - ax[seg]) * slope)
+    yb = np.where(vertical, by[seg], ay[seg] + (cx1 - ax[seg]) * slope)
+    row0 = np.clip(np.floor(np.minimum(ya, yb) - margin), 0, scale - 1).astype(np.int64)
+    row1 = np.clip(np.floor(np.maximum(ya, yb) + margin), 0, scale - 1).astype(np.int64)
+    pair, k = _expand(row1 - row0 + 1)
+    flow, tx, ty = seg[pair], tx[pair], row0[pair] + k
+
+    # 3) recorte exato no tile com margem e quantização no grid do tile
+    fx0, fy0 = ax[flow] - tx, ay[flow] - ty
+    fx1, fy1 = bx[flow] - tx, by[flow] - ty
+    t0, t1 = clip_segments(fx0, fy0, fx1, fy1, -margin, 1 + margin)
+    hit = t0 <= t1
+    flow, tx, ty, t0, t1 = flow[hit], tx[hit], ty[hit], t0[hit], t1[hit]
+    fx0, fy0, dx, dy = fx0[hit], fy0[hit], (fx1 - fx0)[hit], (fy1 - fy0)[hit]
+    qx0 = np.rint((fx0 + t0 * dx) * extent).astype(np.int32)
+    qy0 = np.rint((fy0 + t0 * dy) * extent).astype(np.int32)
+    qx1 = np.rint((fx0 + t1 * dx) * extent).astype(np.int32)
+    qy1 = np.rint((fy0 + t1 * dy) * extent).astype(np.int32)
+    visible = (qx0 != qx1) | (qy0 != qy1)  # menor que uma unidade do tile neste zoom
+    return (flow[visible], tx[visible], ty[visible],
+            qx0[visible], qy0[visible], qx1[visible], qy1[visible])
+
+
+def tile_flow_segments(wx0, wy0, wx1, wy1, zoom, max_per_tile,
+                       extent=EXTENT, buffer=BUFFER, chunk_size=100_000):
+    """Pares (fluxo, tile) de um zoom, com no máximo `max_per_tile` fluxos por tile.
+
+    Os segmentos devem vir em ordem de prioridade (contagem decrescente): o
+    índice do fluxo é o rank. Retorna (flow, tx, ty, qx0, qy0, qx1, qy1)
+    ordenados por tile e rank; as coordenadas já estão no grid do tile.
+    """
+    scale = 2 ** zoom
+    margin = buffer / extent
+    parts = []
+    for start in range(0, len(wx0), chunk_size):
+        sl = slice(start, start + chunk_size)
+        chunk = _flow_tiles_chunk(wx0[sl] * scale, wy0[sl] * scale, wx1[sl] * scale, wy1[sl] * scale,
+                                  scale, margin, extent)
+        flow = chunk[0] + start
+        # top-N de cada tile dentro do bloco: superconjunto do top-N final
+        keep = _top_per_group(chunk[1] * scale + chunk[2], flow, max_per_tile)
+        parts.append([flow[keep]] + [column[keep] for column in chunk[1:]])
+    if not parts:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(7))
+    columns = [np.concatenate(column) for column in zip(*parts)]
+    keep = _top_per_group(columns[1] * scale + columns[2], columns[0], max_per_tile)
+    return tuple(column[keep] for column in columns)
+
+
+def flow_layers(flows, zoom, max_per_tile, name="flows"):
+    """{(x, y): LayerBuilder} com os maiores fluxos de `flows` (FlowTable) em cada tile."""
+    areas = flows.areas
+    rank = np.argsort(-flows.counts.astype(np.int64), kind="stable")
+    origin, dest, counts = flows.origin_ids[rank], flows.dest_ids[rank], flows.counts[rank]
+    wx, wy = lonlat_to_world(areas.lon, areas.lat)
+    flow, tx, ty, qx0, qy0, qx1, qy1 = tile_flow_segments(
+        wx[origin], wy[origin], wx[dest], wy[dest], zoom, max_per_tile)
+
+    codes = areas.codes.tolist()
+    names = [n if isinstance(n, str) else None for n in areas.names.tolist()]
+    layers = {}
+    for f, x, y, x0, y0, x1, y1 in zip(flow.tolist(), tx.tolist(), ty.tolist(),
+                                       qx0.tolist(), qy0.tolist(), qx1.tolist(), qy1.tolist()):
+        layer = layers.get((x, y))
+        if layer is None:
+            layer = layers[(x, y)] = LayerBuilder(name)
+        o, d = int(origin[f]), int(dest[f])
+        layer.add(GEOM_LINESTRING, [[(x0, y0), (x1, y1)]], {
+            "origin_code": codes[o], "origin_name": names[o],
+            "dest_code": codes[d], "dest_name": names[d], "count": int(counts[f]),
+        })
+    return layers
+
+
+# --- Polígonos ----------------------------------------------------------------
+
+def simplify_line(points, tolerance):
+    """Douglas–Peucker (iterativo) de uma sequência Nx2."""
+    n = len(points)
+    if n <= 4 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        seg = points[j] - points[i]
+        rel = points[i + 1:j] - points[i]
+        norm = np.hypot(seg[0], seg[1])
+        if norm > 0:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / norm
+        else:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+    return points[keep]
+
+
+def clip_ring(ring, lo, hi):
+    """Sutherland–Hodgman de um anel aberto (Nx2) contra o quadrado [lo, hi]²."""
+    for axis, bound, keep_above in ((0, lo, True), (0, hi, False), (1, lo, True), (1, hi, False)):
+        values = ring[:, axis]
+        inside = values >= bound if keep_above else values <= bound
+        if inside.all():
+            continue
+        if not inside.any():
+            return ring[:0]
+        prev = np.roll(ring, 1, axis=0)
+        cross = inside != np.roll(inside, 1)
+        pv = prev[cross, axis]
+        t = (bound - pv) / (values[cross] - pv)
+        crossing = prev[cross] + t[:, None] * (ring[cross] - prev[cross])
+        crossing[:, axis] = bound
+        # cada vértice emite [interseção se cruzou] + [ele mesmo se está dentro]
+        emitted = cross.astype(np.int64) + inside
+        pos = np.cumsum(emitted) - emitted
+        out = np.empty((int(emitted.sum()), 2))
+        out[pos[cross]] = crossing
+        out[(pos + cross)[inside]] = ring[inside]
+        ring = out
+    return ring
+
+
+def _ring_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def _quantize_ring(ring, exterior):
+    """Anel no grid do tile, sem pontos repetidos e com a orientação do MVT."""
+    q = np.rint(ring).astype(np.int64)
+    if len(q) > 1:
+        q = q[np.r_[True, np.any(q[1:] != q[:-1], axis=1)]]
+    if len(q) > 1 and (q[0] == q[-1]).all():
+        q = q[:-1]
+    if len(q) < 3:
+        return None
+    area = _ring_area(q)
+    if area == 0:
+        return None
+    # MVT: anel externo com área positiva (fórmula do agrimensor, y para baixo)
+    if (area > 0) != exterior:
+        q = q[::-1]
+    return [tuple(p) for p in q.tolist()]
+
+
+def project_polygons(features):
+    """Features GeoJSON (Polygon/MultiPolygon) → [(propriedades, [[anel Nx2 em world]])]."""
+    projected = []
+    for feature in features:
+        geometry = feature["geometry"]
+        polygons = geometry["coordinates"]
+        if geometry["type"] == "Polygon":
+            polygons = [polygons]
+        rings = []
+        for polygon in polygons:
+            projected_polygon = []
+            for ring in polygon:
+                lon, lat = np.asarray(ring, dtype=np.float64)[:, :2].T
+                projected_polygon.append(np.column_stack(lonlat_to_world(lon, lat)))
+            rings.append(projected_polygon)
+        projected.append((feature.get("properties") or {}, rings))
+    return projected
+
+
+def polygon_layers(polygons, zoom, name="boundaries", extent=EXTENT, buffer=BUFFER,
+                   tolerance=SIMPLIFY_TOLERANCE):
+    """{(x, y): LayerBuilder} dos polígonos (saída de project_polygons) num zoom."""
+    scale = 2 ** zoom
+    margin = buffer / extent
+    layers = {}
+    for properties, multipolygon in polygons:
+        # simplificação com ~1 px de tolerância, em coordenadas de tile do zoom
+        simplified = []
+        for polygon in multipolygon:
+            rings = [simplify_line(ring * scale, tolerance / extent) for ring in polygon]
+            if len(rings[0]) >= 4:
+                simplified.append([ring[:-1] if (ring[0] == ring[-1]).all() else ring
+                                   for ring in rings if len(ring) >= 4])
+        if not simplified:
+            continue
+        points = np.concatenate([ring for polygon in simplified for ring in polygon])
+        x0, y0 = np.clip(np.floor(points.min(axis=0) - margin), 0, scale - 1).astype(int)
+        x1, y1 = np.clip(np.floor(points.max(axis=0) + margin), 0, scale - 1).astype(int)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                parts = []
+                for polygon in simplified:
+                    exterior = clip_ring(polygon[0] - (x, y), -margin, 1 + margin)
+                    shell = _quantize_ring(exterior * extent, exterior=True) if len(exterior) else None
+                    if shell is None:
+                        continue
+                    parts.append(shell)
+                    for hole in polygon[1:]:
+                        clipped = clip_ring(hole - (x, y), -margin, 1 + margin)
+                        ring = _quantize_ring(clipped * extent, exterior=False) if len(clipped) else None
+                        if ring is not None:
+                            parts.append(ring)
+                if parts:
+                    layer = layers.get((x, y))
+                    if layer is None:
+                        layer = layers[(x, y)] = LayerBuilder(name, extent)
+                    layer.add(GEOM_POLYGON, parts, properties)
+    return layers
@@ -0,0 +1,66 @@
+"""
+Benchmark: tamanho do payload e tempo de encode de GeoJSON vs Arrow IPC
+para as respostas de /api/flows/<area_code>.
+
+Uso:
+    python benchmarks/bench_response_formats.py [--areas 20] [--repeat 5]
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(script_dir), "api"))
+
+import flows_api  # noqa: E402  (carrega o parquet e monta o índice)
+from serializers import encode_arrow, encode_feature_collection  # noqa: E402
+
+ENCODERS = {
+    "geojson": lambda areas, *cols: encode_feature_collection(areas, *cols),
+    "geojson-p5": lambda areas, *cols: encode_feature_collection(areas, *cols, precision=5),
+    "arrow": encode_arrow,
+}
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--areas", type=int, default=20, help="número de áreas mais conectadas")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    flows = flows_api.flows
+    degrees = flows.index.degrees("incoming")
+    areas = flows.areas.codes[degrees.argsort()[::-1][:args.areas]]
+
+    print("=" * 70)
+    print(f"📦 GeoJSON vs Arrow IPC ({len(areas)} áreas, melhor de {args.repeat})")
+    print("=" * 70)
+    print(f"{'limit':>6} {'formato':<11} {'linhas':>8} {'bytes':>11} {'gzip':>10} {'encode ms':>10}")
+
+    for limit in args.limits:
+        slices = []
+        for code in areas:
+            rows = flows.rows(code, "incoming", limit)
+            slices.append((flows.origin_ids[rows], flows.dest_ids[rows], flows.counts[rows]))
+        rows = sum(len(cols[2]) for cols in slices)
+        for name, encode in ENCODERS.items():
+            elapsed, payloads = best_time(lambda: [encode(flows.areas, *cols) for cols in slices], args.repeat)
+            size = sum(len(p) for p in payloads)
+            gz = sum(len(gzip.compress(p, 6)) for p in payloads)
+            print(f"{limit:>6} {name:<11} {rows:>8,} {size:>11,} {gz:>10,} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
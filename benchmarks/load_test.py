@@ -0,0 +1,165 @@
+"""
+Teste de carga da API de fluxos: latência p50/p99 e requisições/s por número
+de workers do gunicorn.
+
+Para cada valor de --workers sobe `gunicorn -c api/gunicorn.conf.py`, espera
+o /api/health ficar pronto e dispara --concurrency clientes (keep-alive) por
+--duration segundos contra /api/flows/<area> com áreas sorteadas do lookup.
+Com --url, mede um servidor já rodando em vez de subir o gunicorn.
+
+Uso:
+    python benchmarks/load_test.py [--workers 1 2 4] [--concurrency 16] [--duration 10]
+                                   [--no-cache] [--output load_test.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+api_dir = os.path.join(project_root, "api")
+
+
+def wait_ready(base_url, timeout):
+    """Espera o /api/health responder 200 (índices montados)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/health", timeout=2) as r:
+                if r.status == 200:
+                    return json.load(r)
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{base_url} não ficou pronto em {timeout}s")
+
+
+def client(base_url, paths, headers, stop, latencies, errors, seed):
+    """Um cliente keep-alive: requisições em sequência até `stop`."""
+    rng = random.Random(seed)
+    url = urllib.parse.urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    while not stop.is_set():
+        path = rng.choice(paths)
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append("conn")
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def run_load(base_url, paths, args):
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client, args=(base_url, paths, headers, stop, latencies, errors, i))
+               for i in range(args.concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat_ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 2) if len(lat_ms) else None,
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 2) if len(lat_ms) else None,
+        "max_ms": round(float(lat_ms.max()), 2) if len(lat_ms) else None,
+    }
+
+
+def start_server(workers, port, args):
+    env = dict(os.environ, FLOWS_WORKERS=str(workers), FLOWS_THREADS=str(args.threads),
+               FLOWS_BIND=f"127.0.0.1:{port}")
+    if args.no_cache:
+        env["FLOWS_CACHE_SIZE"] = "0"
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "flows_api:app"],
+        cwd=api_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4, help="threads por worker (gthread)")
+    parser.add_argument("--concurrency", type=int, default=16, help="clientes simultâneos")
+    parser.add_argument("--duration", type=float, default=10, help="segundos de carga por rodada")
+    parser.add_argument("--areas", type=int, default=500, help="áreas sorteadas do lookup")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--accept-encoding", default="gzip", help='"" para respostas sem compressão')
+    parser.add_argument("--no-cache", action="store_true", help="desliga o cache LRU (FLOWS_CACHE_SIZE=0)")
+    parser.add_argument("--url", default=None, help="mede um servidor já rodando (ignora --workers)")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", default=None, help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    lookup = pd.read_csv(os.path.join(project_root, "data/lookup/areas_centroids.csv"), dtype={"code": "string"})
+    codes = lookup["code"].dropna().sample(min(args.areas, len(lookup)), random_state=0).tolist()
+    paths = [f"/api/flows/{code}?direction={direction}&limit={args.limit}"
+             for code in codes for direction in ("incoming", "outgoing")]
+
+    print("=" * 70)
+    print(f"🏋️  TESTE DE CARGA ({args.concurrency} clientes, {args.duration:.0f}s por rodada, "
+          f"{len(paths)} URLs, cache {'desligado' if args.no_cache else 'ligado'})")
+    print("=" * 70)
+    print(f"{'workers':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'erros':>6} {'startup s':>10}")
+
+    results = []
+    rounds = [None] if args.url else args.workers
+    for workers in rounds:
+        server = None
+        base_url = args.url or f"http://127.0.0.1:{args.port}"
+        t0 = time.perf_counter()
+        if args.url is None:
+            server = start_server(workers, args.port, args)
+        try:
+            health = wait_ready(base_url, args.startup_timeout)
+            startup = time.perf_counter() - t0
+            stats = run_load(base_url, paths, args)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=60)
+        row = {"workers": workers, "threads": args.threads, "concurrency": args.concurrency,
+               "startup_s": round(startup, 2), "source": health.get("source"), **stats}
+        results.append(row)
+        label = workers if workers is not None else "ext"
+        print(f"{label:>8} {stats['rps']:>9,.1f} {str(stats['p50_ms']):>8} {str(stats['p99_ms']):>8} "
+              f"{str(stats['max_ms']):>8} {stats['errors']:>6} {startup:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=1)
+        print(f"\n💾 Resultados: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
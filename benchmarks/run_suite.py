@@ -0,0 +1,254 @@
+"""
+Suíte de benchmarks do pipeline e da API sobre dados sintéticos reprodutíveis.
+
+Para cada escala, monta um projeto temporário (data/ e public/ sintéticos,
+config.yaml próprio e links para scripts/ e api/), roda cada etapa do
+pipeline como subprocesso (tempo e pico de RSS por etapa, via wait4) e depois
+mede os endpoints da API (p50/p99 com o cache de respostas desligado, tempo
+de carga e pico de RSS do processo da API).
+
+Os resultados vão para um JSON (com commit, versões e máquina) que pode ser
+comparado com uma rodada anterior: --compare sai com código 1 se alguma
+medida piorar mais que --fail-ratio (útil no CI).
+
+Uso:
+    python benchmarks/run_suite.py [--scales 1 10] [--output bench.json]
+    python benchmarks/run_suite.py --scales 0.05 --compare baseline.json   # CI
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.insert(0, script_dir)
+
+from synthetic_data import generate  # noqa: E402
+
+# (nome, comando relativo ao projeto temporário); rodam nesta ordem
+STAGES = [
+    ("csv_to_parquet", ["scripts/01_csv_to_parquet.py"]),
+    ("flow_index", ["scripts/build_flow_index.py"]),
+    ("flows_geojson", ["scripts/03_make_flows_geojson.py", "--jobs", "1"]),
+    ("ltla_aggregation", ["scripts/06_aggregate_flows_by_ltla.py"]),
+    ("area_stats", ["scripts/build_area_stats.py"]),
+    ("network", ["scripts/09_network_analytics.py"]),
+    ("similar_areas", ["scripts/build_similar_areas.py"]),
+]
+
+# Métricas comparadas entre rodadas (maior = pior)
+COMPARED = ("seconds", "peak_rss_mb", "p50_ms", "p99_ms")
+
+
+def run_measured(cmd, cwd, env=None):
+    """Roda um subprocesso e retorna (código, segundos, pico de RSS em MB, saída)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, *cmd], cwd=cwd, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - t0
+    peak = usage.ru_maxrss / 2**20 if platform.system() == "Darwin" else usage.ru_maxrss / 1024
+    return proc.returncode, elapsed, peak, output.decode(errors="replace")
+
+
+def make_project(root, scale, seed):
+    """Projeto temporário com dados sintéticos, links para o código e config.yaml próprio."""
+    for name in ("scripts", "api"):
+        os.symlink(os.path.join(project_root, name), os.path.join(root, name))
+    rows = generate(root, scale, seed)
+    cfg = yaml.safe_load(open(os.path.join(project_root, "config.yaml")))
+    first_code = "E02000000"
+    cfg["export"]["scenarios"] = [
+        {"name": "top1000-geral", "filter": {}, "top_n": 1000},
+        {"name": "dest-one-area", "filter": {"dest_code": first_code}, "top_n": 500},
+        {"name": "top100k", "filter": {}, "top_n": 100_000},
+    ]
+    with open(os.path.join(root, "config.yaml"), "w") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False, allow_unicode=True)
+    return rows
+
+
+def api_benchmark(repeat, limit):
+    """Roda dentro do projeto temporário: importa a API e mede cada endpoint."""
+    import numpy as np
+
+    sys.path.insert(0, os.path.join(os.getcwd(), "api"))
+    t0 = time.perf_counter()
+    import flows_api
+    load_seconds = time.perf_counter() - t0
+
+    client = flows_api.app.test_client()
+    areas = flows_api.flows.areas
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, len(areas), repeat)
+    codes = areas.codes[ids].tolist()
+    # Seleções espaciais em volta do centróide de uma área (sempre pegam ao menos ela)
+    points = [(float(areas.lon[i]), float(areas.lat[i])) for i in ids]
+    ltla_codes = flows_api.ltla_flows.areas.codes.tolist() if flows_api.ltla_flows is not None else []
+    endpoints = {
+        "flows_incoming": lambda i: f"/api/flows/{codes[i]}?direction=incoming&limit={limit}",
+        "flows_outgoing": lambda i: f"/api/flows/{codes[i]}?direction=outgoing&limit={limit}",
+        "flows_arrow": lambda i: f"/api/flows/{codes[i]}?limit={limit}&format=arrow",
+        "flows_zoom6": lambda i: f"/api/flows/{codes[i]}?limit={limit}&zoom=6",
+        "batch_radius": lambda i: "/api/flows/batch?radius={},{},{}&limit={}".format(*points[i], 5 + i % 20, limit),
+        "batch_aggregate": lambda i: "/api/flows/batch?radius={},{},{}&aggregate=1".format(*points[i], 5 + i % 20),
+        "areas_nearest": lambda i: "/api/areas/nearest?lon={}&lat={}&k=10".format(*points[i]),
+        "area_stats": lambda i: f"/api/areas/{codes[i]}/stats",
+        "area_catchment": lambda i: f"/api/areas/{codes[i]}/catchment?coverage=0.8",
+        "similar_areas": lambda i: f"/api/areas/{codes[i]}/similar?k=10",
+    }
+    if ltla_codes:
+        endpoints["ltla_flows"] = lambda i: f"/api/ltla/flows/{ltla_codes[i % len(ltla_codes)]}?limit={limit}"
+
+    results = []
+    for name, url in endpoints.items():
+        times = []
+        for i in range(repeat):
+            t0 = time.perf_counter()
+            response = client.get(url(i))
+            times.append(time.perf_counter() - t0)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url(i)} → {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        ms = np.asarray(times) * 1000
+        results.append({"kind": "endpoint", "name": name, "n": repeat,
+                        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                        "p99_ms": round(float(np.percentile(ms, 99)), 3)})
+    results.append({"kind": "api_startup", "name": "load", "seconds": round(load_seconds, 3),
+                    "source": flows_api.flows_source})
+    print(json.dumps(results))
+
+
+def run_scale(scale, args):
+    root = tempfile.mkdtemp(prefix=f"bench-x{scale:g}-", dir=args.work_dir)
+    results = []
+    try:
+        t0 = time.perf_counter()
+        rows = make_project(root, scale, args.seed)
+        print(f"\n🧪 Escala {scale:g}: {rows:,} fluxos sintéticos ({time.perf_counter() - t0:.1f}s) em {root}")
+        for name, cmd in STAGES:
+            code, seconds, peak, output = run_measured(cmd, root)
+            if code != 0:
+                raise RuntimeError(f"etapa {name} falhou (código {code}):\n{output[-2000:]}")
+            results.append({"kind": "stage", "name": name, "seconds": round(seconds, 3),
+                            "peak_rss_mb": round(peak, 1)})
+            print(f"   ⏱️  {name:<18} {seconds:>8.2f}s  pico {peak:>8.1f} MB")
+
+        env = dict(os.environ, FLOWS_CACHE_SIZE="0")  # mede o caminho quente, não o cache
+        cmd = [os.path.abspath(__file__), "--api-worker", "--repeat", str(args.repeat), "--limit", str(args.limit)]
+        code, seconds, peak, output = run_measured(cmd, root, env)
+        if code != 0:
+            raise RuntimeError(f"benchmark da API falhou (código {code}):\n{output[-2000:]}")
+        api_results = json.loads(output.strip().splitlines()[-1])
+        for r in api_results:
+            if r["kind"] == "api_startup":
+                r["peak_rss_mb"] = round(peak, 1)
+                print(f"   ⏱️  api load ({r['source']})   {r['seconds']:>8.2f}s  pico {peak:>8.1f} MB")
+            else:
+                print(f"   🌐 {r['name']:<18} p50 {r['p50_ms']:>8.2f} ms  p99 {r['p99_ms']:>8.2f} ms")
+        results.extend(api_results)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    for r in results:
+        r["scale"] = scale
+        r["rows"] = rows
+    return results
+
+
+def metadata():
+    def git(*cmd):
+        try:
+            return subprocess.check_output(["git", *cmd], cwd=project_root, text=True,
+                                           stderr=subprocess.DEVNULL).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    import numpy
+    import pandas
+    import pyarrow
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "pyarrow": pyarrow.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "system": platform.platform(),
+    }
+
+
+def compare(results, baseline_path, fail_ratio):
+    """Imprime a razão atual/baseline de cada medida; retorna as regressões."""
+    baseline = json.load(open(baseline_path))["results"]
+    index = {(r["scale"], r["kind"], r["name"]): r for r in baseline}
+    regressions = []
+    print(f"\n📊 Comparação com {baseline_path} (razão atual/baseline, limite {fail_ratio:g}x)")
+    for r in results:
+        old = index.get((r["scale"], r["kind"], r["name"]))
+        if old is None:
+            continue
+        for metric in COMPARED:
+            if metric in r and old.get(metric):
+                ratio = r[metric] / old[metric]
+                flag = "❌" if ratio > fail_ratio else "  "
+                print(f"   {flag} x{r['scale']:<6g} {r['name']:<18} {metric:<12} {ratio:>6.2f}x")
+                if ratio > fail_ratio:
+                    regressions.append((r["scale"], r["name"], metric, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline e da API com dados sintéticos")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0],
+                        help="escalas dos dados sintéticos (1 ≈ censo real; 0.05 para CI)")
+    parser.add_argument("--repeat", type=int, default=50, help="requisições por endpoint")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="onde criar os projetos temporários")
+    parser.add_argument("--keep", action="store_true", help="não apaga os projetos temporários")
+    parser.add_argument("--output", default=None, help="JSON com os resultados desta rodada")
+    parser.add_argument("--compare", default=None, help="JSON de uma rodada anterior")
+    parser.add_argument("--fail-ratio", type=float, default=1.3)
+    parser.add_argument("--api-worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.api_worker:
+        api_benchmark(args.repeat, args.limit)
+        return
+
+    print("=" * 70)
+    print(f"🏁 SUÍTE DE BENCHMARKS (escalas {', '.join(f'{s:g}' for s in args.scales)})")
+    print("=" * 70)
+    results = []
+    for scale in args.scales:
+        results.extend(run_scale(scale, args))
+
+    run = {"meta": metadata(), "params": {k: v for k, v in vars(args).items() if k != "api_worker"},
+           "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=1)
+        print(f"\n💾 Resultados: {args.output}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.fail_ratio)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressão(ões) acima de {args.fail_ratio:g}x")
+            sys.exit(1)
+        print("\n✅ Sem regressões")
+
+
+if __name__ == "__main__":
+    main()
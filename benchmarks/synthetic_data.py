@@ -0,0 +1,127 @@
+"""
+Gerador de dados sintéticos no formato do ODWP01EW para benchmarks e CI.
+
+Escala 1 ≈ o censo real: ~7.300 MSOAs agrupadas em ~330 LTLAs e ~1,8M pares
+origem-destino (~250 destinos por origem, a maioria perto da origem, contagens
+com cauda longa). Escala 10/100 multiplica o número de áreas (e de linhas);
+escalas fracionárias (ex.: 0.05) servem para rodar rápido no CI.
+
+Gera, dentro de `root`, os mesmos caminhos relativos do config.yaml:
+- data/raw/ODWP01EW_MSOA.csv (mesmos cabeçalhos do arquivo do censo)
+- data/lookup/areas_centroids.csv (code, name, lat, lon)
+- public/data/lookup/ltla_lookup.csv e ltla_centroids.csv
+
+Uso:
+    python benchmarks/synthetic_data.py <pasta> [--scale 1] [--seed 0]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+AREAS_PER_SCALE = 7264
+MSOAS_PER_LTLA = 22
+DESTS_PER_ORIGIN = 250
+CHUNK_ORIGINS = 20_000
+
+CSV_COLUMNS = [
+    "Middle layer Super Output Areas code",
+    "Middle layer Super Output Areas label",
+    "MSOA of workplace code",
+    "MSOA of workplace label",
+    "Count",
+]
+
+# Caixa aproximada da Inglaterra e País de Gales
+LON_RANGE = (-5.5, 1.7)
+LAT_RANGE = (50.0, 55.8)
+
+
+def area_tables(scale, rng):
+    """MSOAs e LTLAs sintéticos: MSOAs de um LTLA têm ids contíguos e ficam juntas no mapa."""
+    n_areas = max(MSOAS_PER_LTLA * 2, int(AREAS_PER_SCALE * scale))
+    n_ltla = -(-n_areas // MSOAS_PER_LTLA)
+    ltla_lon = rng.uniform(*LON_RANGE, n_ltla)
+    ltla_lat = rng.uniform(*LAT_RANGE, n_ltla)
+    ltla_codes = np.array([f"E06{i:06d}" for i in range(n_ltla)])
+    ltla_names = np.array([f"District {i}" for i in range(n_ltla)])
+
+    ltla_of = np.arange(n_areas) // MSOAS_PER_LTLA
+    width = len(str(n_areas))
+    codes = np.array([f"E02{i:0{max(6, width)}d}" for i in range(n_areas)])
+    # Nome no padrão do censo: "<distrito> 001"
+    names = np.array([f"{ltla_names[l]} {i % MSOAS_PER_LTLA + 1:03d}" for i, l in enumerate(ltla_of)])
+    areas = pd.DataFrame({
+        "code": codes,
+        "name": names,
+        "lat": ltla_lat[ltla_of] + rng.normal(0, 0.05, n_areas),
+        "lon": ltla_lon[ltla_of] + rng.normal(0, 0.08, n_areas),
+    })
+    lookup = pd.DataFrame({"msoa21cd": codes, "msoa21nm": names,
+                           "ltla22cd": ltla_codes[ltla_of], "ltla22nm": ltla_names[ltla_of]})
+    centroids = areas.assign(ltla=ltla_of).groupby("ltla")[["lat", "lon"]].mean()
+    ltlas = pd.DataFrame({"code": ltla_codes, "name": ltla_names,
+                          "lat": centroids["lat"].to_numpy(), "lon": centroids["lon"].to_numpy()})
+    return areas, lookup, ltlas
+
+
+def flow_chunks(n_areas, rng):
+    """Blocos de (origem, destino, contagem) sem pares repetidos."""
+    for start in range(0, n_areas, CHUNK_ORIGINS):
+        origins = np.arange(start, min(start + CHUNK_ORIGINS, n_areas))
+        degree = rng.poisson(DESTS_PER_ORIGIN, len(origins)).clip(1, n_areas)
+        origin = np.repeat(origins, degree)
+        # 85% dos destinos perto da origem (ids vizinhos = mesmo LTLA/vizinhos), resto em qualquer lugar
+        local = rng.random(len(origin)) < 0.85
+        offset = np.rint(rng.laplace(0, MSOAS_PER_LTLA * 3, len(origin))).astype(np.int64)
+        dest = np.where(local, (origin + offset) % n_areas, rng.integers(0, n_areas, len(origin)))
+        keys = np.unique(origin.astype(np.int64) * n_areas + dest)
+        origin, dest = keys // n_areas, keys % n_areas
+        # Cauda longa: muitos pares com 1-5 pessoas, poucos com milhares
+        count = np.minimum(rng.zipf(1.8, len(keys)), 20_000)
+        count[origin == dest] *= 20  # quem mora e trabalha na mesma área
+        yield origin, dest, count.astype(np.int64)
+
+
+def generate(root, scale=1.0, seed=0):
+    """Grava os arquivos sintéticos em `root` e retorna o número de linhas de fluxo."""
+    rng = np.random.default_rng(seed)
+    areas, lookup, ltlas = area_tables(scale, rng)
+    paths = {
+        "raw_csv": os.path.join(root, "data/raw/ODWP01EW_MSOA.csv"),
+        "lookup_areas": os.path.join(root, "data/lookup/areas_centroids.csv"),
+        "ltla_lookup": os.path.join(root, "public/data/lookup/ltla_lookup.csv"),
+        "ltla_centroids": os.path.join(root, "public/data/lookup/ltla_centroids.csv"),
+    }
+    for path in paths.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    areas.to_csv(paths["lookup_areas"], index=False)
+    lookup.to_csv(paths["ltla_lookup"], index=False)
+    ltlas.to_csv(paths["ltla_centroids"], index=False)
+
+    codes, names = areas["code"].to_numpy(), areas["name"].to_numpy()
+    rows = 0
+    with open(paths["raw_csv"], "w", newline="") as f:
+        f.write(",".join(CSV_COLUMNS) + "\n")
+        for origin, dest, count in flow_chunks(len(areas), rng):
+            chunk = pd.DataFrame({CSV_COLUMNS[0]: codes[origin], CSV_COLUMNS[1]: names[origin],
+                                  CSV_COLUMNS[2]: codes[dest], CSV_COLUMNS[3]: names[dest],
+                                  CSV_COLUMNS[4]: count})
+            chunk.to_csv(f, header=False, index=False)
+            rows += len(chunk)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados OD sintéticos no formato do ODWP01EW")
+    parser.add_argument("root", help="pasta raiz (mesma estrutura de data/ e public/ do projeto)")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = generate(args.root, args.scale, args.seed)
+    print(f"✅ {rows:,} fluxos sintéticos (escala {args.scale:g}) em {args.root}")
+
+
+if __name__ == "__main__":
+    main()
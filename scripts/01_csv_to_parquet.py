@@ -1,50 +1,195 @@
-import pandas as pd
-import pyarrow as pa, pyarrow.parquet as pq
-import yaml, os
+"""
+Script: converte o CSV ODWP01EW do censo para Parquet em streaming
+
+- Lê o CSV em blocos com o leitor multi-thread do PyArrow (memória limitada)
+- Espalha os blocos em "buckets" temporários pelo prefixo do dest_code
+- Ordena cada bucket (dest_code, count desc) e grava em sequência: o arquivo
+  final fica ordenado e os row groups agrupados por dest_code, permitindo
+  predicate pushdown (filtros por destino leem só os row groups certos)
+- Colunas de código/nome com dictionary encoding e compressão zstd
+- Contagens não numéricas viram 0, como no pd.to_numeric(errors="coerce")
+  antigo (o total de células corrigidas é informado no fim)
+- Opcional (--partition-by-origin-region): cópia particionada pela região de
+  origem no nível LTLA (o lookup MSOA → LTLA é o único com cobertura
+  completa; não há coluna de região inglesa/país nele)
+- Vários conjuntos (--dataset, seção `datasets` do config.yaml): cada um tem
+  seu CSV, parquet e mapeamento de colunas; o conjunto convertido é registrado
+  no manifesto (paths.datasets_manifest) usado pela API para ?dataset=/compare=
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
 
 # Obter o diretório do script e ir para a raiz do projeto
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from od_datasets import source_entry, update_manifest  # noqa: E402
+
+parser = argparse.ArgumentParser(description="CSV ODWP01EW → Parquet (streaming)")
+parser.add_argument("--block-size-mb", type=int, default=32, help="tamanho de cada bloco lido do CSV")
+parser.add_argument("--bucket-prefix", type=int, default=7,
+                    help="caracteres do dest_code usados para separar os buckets (mais = buckets menores)")
+parser.add_argument("--row-group-size", type=int, default=128 * 1024)
+parser.add_argument("--partition-by-origin-region", action="store_true",
+                    help="também grava uma cópia particionada pela região (LTLA) de origem")
+parser.add_argument("--dataset", default=None,
+                    help="conjunto da seção `datasets` do config.yaml (padrão: datasets.default)")
+args = parser.parse_args()
 
 # O config.yaml está na raiz do projeto
 cfg = yaml.safe_load(open("config.yaml"))
 
-csv_path = cfg["paths"]["raw_csv"]
-parquet_path = cfg["paths"]["parquet"]
+# Colunas reais do arquivo CSV do ODWP01EW (censo 2021) -> nomes simples
+ODWP01EW_COLUMNS = {
+    "origin_code": "Middle layer Super Output Areas code",
+    "origin_name": "Middle layer Super Output Areas label",
+    "dest_code": "MSOA of workplace code",
+    "dest_name": "MSOA of workplace label",
+    "count": "Count",
+}
+
+datasets_cfg = cfg.get("datasets", {})
+dataset_name = args.dataset or datasets_cfg.get("default", "odwp01ew")
+dataset = datasets_cfg.get("releases", {}).get(dataset_name)
+if dataset is None and args.dataset is not None:
+    raise SystemExit(f"❌ Conjunto desconhecido: {args.dataset} (veja `datasets.releases` no config.yaml)")
+dataset = dataset or {}
+csv_path = dataset.get("raw_csv", cfg["paths"]["raw_csv"])
+parquet_path = dataset.get("parquet", cfg["paths"]["parquet"])
+index_path = dataset.get("flow_index", cfg["paths"]["flow_index"])
 os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+print(f"🗃️  Conjunto: {dataset_name} ({dataset.get('label', csv_path)})")
+
+# nome simples -> coluna do CSV; conjuntos sem rótulos (ex.: WU03EW de 2011) repetem o código
+csv_columns = dict(dataset.get("columns") or ODWP01EW_COLUMNS)
+for side in ("origin", "dest"):
+    csv_columns.setdefault(f"{side}_name", None)
+text_cols = ["origin_code", "origin_name", "dest_code", "dest_name"]
+schema = pa.schema([(c, pa.string()) for c in text_cols] + [("count", pa.int32())],
+                   metadata={"dataset": dataset_name})
+source_cols = list(dict.fromkeys(c for c in csv_columns.values() if c))
+
+read_options = pv.ReadOptions(block_size=args.block_size_mb * 1024 * 1024, use_threads=True)
+convert_options = pv.ConvertOptions(
+    include_columns=source_cols,
+    # count como texto: uma célula inválida não pode abortar a conversão (ver to_count)
+    column_types={c: pa.string() for c in source_cols},
+    null_values=[""],
+    strings_can_be_null=False,
+)
+write_options = dict(compression="zstd", use_dictionary=text_cols, write_statistics=True)
+
+
+NUMBER = r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$"
+invalid_counts = 0
+
+
+def to_count(values):
+    """Texto -> int32; vazios e não numéricos viram 0 (como o baseline em pandas)."""
+    global invalid_counts
+    values = pc.utf8_trim_whitespace(values)
+    valid = pc.match_substring_regex(values, NUMBER)
+    invalid_counts += pc.sum(pc.invert(valid)).as_py() or 0
+    numbers = pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), pa.float64())
+    return pc.cast(pc.trunc(pc.fill_null(numbers, 0)), pa.int32())
 
-# Colunas reais do arquivo CSV
-usecols = [
-    "Middle layer Super Output Areas code",
-    "Middle layer Super Output Areas label",
-    "MSOA of workplace code",
-    "MSOA of workplace label",
-    "Count"
-]
-
-df = pd.read_csv(csv_path, usecols=usecols)
-print("Primeiras 5 linhas do CSV:")
-print(df.head())
-print(f"\nTotal de linhas: {len(df)}")
-
-# Renomear colunas para nomes mais simples
-df = df.rename(columns={
-    "Middle layer Super Output Areas code": "origin_code",
-    "Middle layer Super Output Areas label": "origin_name",
-    "MSOA of workplace code": "dest_code",
-    "MSOA of workplace label": "dest_name",
-    "Count": "count"
-})
-
-# Tipos
-df["count"] = pd.to_numeric(df["count"], errors="coerce").fillna(0).astype("int32")
-for c in ["origin_code","origin_name","dest_code","dest_name"]:
-    df[c] = df[c].astype("string")
-
-# Salvar em Parquet
-table = pa.Table.from_pandas(df)
-pq.write_table(table, parquet_path)
+
+def normalize(batch):
+    """Renomeia as colunas e converte a contagem para int32 (inválidos viram 0)."""
+    arrays = []
+    for name in text_cols:
+        src = csv_columns[name] or csv_columns[name.replace("_name", "_code")]
+        arrays.append(batch.column(src))
+    arrays.append(to_count(batch.column(csv_columns["count"])))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# 1) Streaming do CSV para buckets temporários pelo prefixo do dest_code.
+#    Prefixos de mesmo tamanho preservam a ordem lexicográfica dos códigos.
+print(f"📥 Lendo CSV em blocos de {args.block_size_mb} MB: {csv_path}")
+tmp_dir = tempfile.mkdtemp(prefix="odwp01ew_", dir=os.path.dirname(parquet_path))
+writers, bucket_paths = {}, {}
+total_rows = 0
+try:
+    reader = pv.open_csv(csv_path, read_options=read_options, convert_options=convert_options)
+    for i, raw in enumerate(reader):
+        batch = normalize(raw)
+        if i == 0:
+            print("Primeiras 5 linhas do CSV:")
+            print(batch.slice(0, 5).to_pandas())
+        total_rows += batch.num_rows
+        prefixes = pc.utf8_slice_codeunits(batch.column("dest_code"), 0, args.bucket_prefix)
+        for prefix in pc.unique(prefixes).to_pylist():
+            part = batch.filter(pc.equal(prefixes, prefix))
+            if prefix not in writers:
+                bucket_paths[prefix] = os.path.join(tmp_dir, f"bucket-{len(writers):05d}.parquet")
+                writers[prefix] = pq.ParquetWriter(bucket_paths[prefix], schema, compression="lz4")
+            writers[prefix].write_batch(part)
+    for writer in writers.values():
+        writer.close()
+    print(f"\nTotal de linhas: {total_rows:,} em {len(writers)} buckets")
+    if invalid_counts:
+        print(f"⚠️  {invalid_counts:,} contagens vazias ou não numéricas convertidas para 0")
+
+    # 2) Ordenar bucket a bucket (só um bucket em memória por vez) e gravar
+    #    em sequência: o arquivo final fica ordenado por dest_code.
+    print("🔃 Ordenando por dest_code e gravando row groups agrupados...")
+    with pq.ParquetWriter(parquet_path, schema, **write_options) as out:
+        for prefix in sorted(bucket_paths):
+            bucket = pq.read_table(bucket_paths[prefix])
+            bucket = bucket.sort_by([("dest_code", "ascending"), ("count", "descending")])
+            out.write_table(bucket, row_group_size=args.row_group_size)
+finally:
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+meta = pq.ParquetFile(parquet_path).metadata
 print(f"\n✅ Parquet salvo em: {parquet_path}")
-print(f"📊 Total de linhas: {len(df)}")
+print(f"📊 Total de linhas: {meta.num_rows:,} ({meta.num_row_groups} row groups)")
 print(f"💾 Tamanho do arquivo: {os.path.getsize(parquet_path) / (1024*1024):.2f} MB")
+
+manifest_path = cfg["paths"].get("datasets_manifest")
+if manifest_path:
+    entry = source_entry(csv_path, parquet_path, index_path, dataset.get("label", dataset_name), meta.num_rows)
+    manifest = update_manifest(manifest_path, dataset_name, entry, default=datasets_cfg.get("default"))
+    print(f"🗂️  Manifesto: {manifest_path} ({', '.join(sorted(manifest['datasets']))})")
+
+# 3) Cópia particionada pela região (LTLA) de origem, também em streaming
+if args.partition_by_origin_region:
+    lookup = pv.read_csv(cfg["paths"]["ltla_lookup"],
+                         convert_options=pv.ConvertOptions(include_columns=["msoa21cd", "ltla22cd"]))
+    msoa_codes = lookup.column("msoa21cd").combine_chunks()
+    ltla_codes = lookup.column("ltla22cd").combine_chunks()
+
+    region_schema = schema.append(pa.field("origin_ltla", pa.string()))
+
+    def with_region(batches):
+        for batch in batches:
+            region = pc.take(ltla_codes, pc.index_in(batch.column("origin_code"), value_set=msoa_codes))
+            region = pc.fill_null(region.cast(pa.string()), "unknown")
+            yield pa.RecordBatch.from_arrays(batch.columns + [region], schema=region_schema)
+
+    partitioned_dir = os.path.splitext(parquet_path)[0] + "_by_origin"
+    shutil.rmtree(partitioned_dir, ignore_errors=True)
+    source = ds.dataset(parquet_path).to_batches(batch_size=args.row_group_size)
+    ds.write_dataset(
+        with_region(source),
+        partitioned_dir,
+        schema=region_schema,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("origin_ltla", pa.string())]), flavor="hive"),
+        file_options=ds.ParquetFileFormat().make_write_options(**write_options),
+        max_partitions=4096,
+    )
+    print(f"🗂️  Cópia particionada pela região (LTLA) de origem: {partitioned_dir}")
@@ -1,13 +1,27 @@
-import pandas as pd
-import geopandas as gpd
-from shapely.geometry import LineString
-import yaml, os
+import argparse
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from flow_base import BaseFlows
 
 # Obter o diretório do script e ir para a raiz do projeto
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 os.chdir(project_root)
 
+parser = argparse.ArgumentParser(description="Gera um GeoJSON por cenário do config.yaml")
+parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="processos para gravar os cenários em paralelo (1 = sequencial)")
+parser.add_argument("--only", default=None,
+                    help="nomes de cenários separados por vírgula (padrão: todos)")
+parser.add_argument("--cache-dir", default=None,
+                    help="cache Arrow da tabela base compartilhado entre scripts (ex.: data/interim/cache)")
+args = parser.parse_args()
+
 cfg = yaml.safe_load(open("config.yaml"))
 parquet_path   = cfg["paths"]["parquet"]
 lookup_path    = cfg["paths"]["lookup_areas"]
@@ -15,87 +29,76 @@ processed_dir  = cfg["paths"]["processed_dir"]
 cols           = cfg["columns"]
 scenarios      = cfg["export"]["scenarios"]
 
+if args.only:
+    wanted = set(args.only.split(","))
+    unknown = wanted - {sc["name"] for sc in scenarios}
+    if unknown:
+        raise SystemExit(f"❌ Cenários desconhecidos: {', '.join(sorted(unknown))}")
+    scenarios = [sc for sc in scenarios if sc["name"] in wanted]
+
 os.makedirs(processed_dir, exist_ok=True)
 
 print("=" * 70)
 print("🗺️  GERADOR DE GEOJSON DE FLUXOS DE MOBILIDADE")
 print("=" * 70)
 
+# Tabela base única: centróides por id, pares inválidos removidos e uma só
+# ordenação por contagem; cada cenário é uma máscara + prefixo (top-N)
 print(f"\n📥 Lendo arquivo Parquet: {parquet_path}")
-df = pd.read_parquet(parquet_path)
-print(f"✅ Total de registros: {len(df):,}")
-
-# Junta centróides de origem e destino
-print(f"\n📍 Carregando centróides: {lookup_path}")
-lut = pd.read_csv(lookup_path, dtype={"code":"string"})
-lut = lut.rename(columns={"code":"code_area", "name":"area_name"})
-print(f"✅ Total de áreas com centróides: {len(lut):,}")
-
-df = df.merge(lut.add_prefix("o_"), left_on=cols["origin_code"], right_on="o_code_area", how="left")
-df = df.merge(lut.add_prefix("d_"), left_on=cols["dest_code"],   right_on="d_code_area", how="left")
-
-# Remove pares sem centróide
-before_drop = len(df)
-df = df.dropna(subset=["o_lat","o_lon","d_lat","d_lon"])
-dropped = before_drop - len(df)
-print(f"\n⚙️  Registros sem centróides removidos: {dropped:,}")
-
-# ✨ NOVO: Remove fluxos onde origem = destino (não aparecem no mapa)
-before_same = len(df)
-df = df[(df["o_lat"] != df["d_lat"]) | (df["o_lon"] != df["d_lon"])]
-same_location = before_same - len(df)
-print(f"⚙️  Fluxos origem=destino removidos: {same_location:,}")
-print(f"✅ Registros válidos para visualização: {len(df):,}")
-
-def make_geojson(sub, out_path):
-    # cria LineString entre centróide origem e destino
-    geom = [LineString([(lon1, lat1), (lon2, lat2)]) 
-            for lon1, lat1, lon2, lat2 in zip(sub["o_lon"], sub["o_lat"], sub["d_lon"], sub["d_lat"])]
-    gdf = gpd.GeoDataFrame(sub[[
-        cols["origin_code"], cols["origin_name"], 
-        cols["dest_code"], cols["dest_name"], 
-        cols["count"]]], geometry=geom, crs=4326)
-    # Opcional: arredondar contagem para "bins" (ajuda na privacidade/desempenho)
-    gdf["count_bin"] = pd.cut(gdf[cols["count"]], bins=[0,10,50,100,500,1000,5000,100000], include_lowest=True)
-    gdf.to_file(out_path, driver="GeoJSON")
-    return len(gdf)
+print(f"📍 Centróides: {lookup_path}")
+base = BaseFlows.load(parquet_path, lookup_path, cols, cache_dir=args.cache_dir)
+print(f"✅ Total de registros: {base.total_rows:,}")
+print(f"✅ Total de áreas com centróides: {base.n_areas:,}")
+print(f"\n⚙️  Registros sem centróides removidos: {base.dropped_no_centroid:,}")
+print(f"⚙️  Fluxos origem=destino removidos: {base.dropped_same_location:,}")
+print(f"✅ Registros válidos para visualização: {len(base):,}")
 
-print("\n" + "=" * 70)
-print("📊 GERANDO CENÁRIOS DE VISUALIZAÇÃO")
-print("=" * 70)
 
-results = []
-for sc in scenarios:
+def export_scenario(sc):
+    """Seleciona o top-N do cenário na tabela base e grava o GeoJSON"""
     name   = sc["name"]
     flt    = sc.get("filter", {})
     top_n  = int(sc.get("top_n", 1000))
-    
-    print(f"\n🔍 Cenário: {name}")
-    print(f"   Filtros: {flt if flt else 'Nenhum'}")
-    print(f"   Top N: {top_n}")
-    
-    sub = df.copy()
-    for k, v in flt.items():
-        before = len(sub)
-        sub = sub[sub[k] == v]
-        print(f"   Aplicando filtro {k}={v}: {before:,} → {len(sub):,} registros")
-    
-    sub = sub.sort_values(cols["count"], ascending=False).head(top_n)
+    t0 = time.perf_counter()
+
+    mask = base.mask(flt)
+    rows = base.top_rows(top_n=top_n, mask=mask)
     out = os.path.join(processed_dir, f"{name}.geojson")
-    
-    num_lines = make_geojson(sub, out)
-    file_size = os.path.getsize(out) / (1024*1024)
-    
-    print(f"   ✅ Gerado: {out}")
-    print(f"   📊 Linhas: {num_lines:,}")
-    print(f"   💾 Tamanho: {file_size:.2f} MB")
-    
-    results.append({
+    num_lines = base.write_geojson(rows, out, name)
+
+    return {
         'name': name,
+        'filter': flt,
+        'top_n': top_n,
+        'matched': int(mask.sum()),
         'lines': num_lines,
-        'size_mb': file_size,
-        'file': out
-    })
+        'size_mb': os.path.getsize(out) / (1024*1024),
+        'file': out,
+        'seconds': time.perf_counter() - t0,
+    }
+
+
+print("\n" + "=" * 70)
+print("📊 GERANDO CENÁRIOS DE VISUALIZAÇÃO")
+print("=" * 70)
+
+# Com fork, os processos herdam a tabela base sem copiar nem serializar
+jobs = min(args.jobs, len(scenarios))
+if jobs > 1 and "fork" in mp.get_all_start_methods():
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("fork")) as pool:
+        results = list(pool.map(export_scenario, scenarios))
+else:
+    results = [export_scenario(sc) for sc in scenarios]
+
+for r in results:
+    print(f"\n🔍 Cenário: {r['name']}")
+    print(f"   Filtros: {r['filter'] if r['filter'] else 'Nenhum'}")
+    print(f"   Top N: {r['top_n']}")
+    if r['filter']:
+        print(f"   Aplicando filtros: {len(base):,} → {r['matched']:,} registros")
+    print(f"   ✅ Gerado: {r['file']}")
+    print(f"   📊 Linhas: {r['lines']:,}")
+    print(f"   💾 Tamanho: {r['size_mb']:.2f} MB ({r['seconds']:.2f}s)")
 
 print("\n" + "=" * 70)
 print("✅ RESUMO FINAL")
@@ -113,4 +116,3 @@ print("\n✅ Todos os arquivos GeoJSON foram gerados com sucesso!")
 print(f"📁 Localização: {os.path.abspath(processed_dir)}")
 print("\n🗺️  Agora você pode usar esses arquivos no seu projeto React!")
 print("   Importe-os como fontes de dados no mapa MapLibre GL.")
-
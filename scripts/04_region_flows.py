@@ -0,0 +1,148 @@
+"""
+Script: fluxos de chegada e saída de todas as regiões numa passada
+
+Substitui o 04_london_inflows.py (só Londres, top 5000, um arquivo). Cada
+LTLA vira uma região (MSOAs atribuídas por point-in-polygon em
+scripts/assign_msoa_ltla.py), além das regiões nomeadas de `regions` no
+config.yaml (london, london-center, ...).
+
+Sobre a tabela base compartilhada (flow_base.BaseFlows, já ordenada por
+contagem), as LTLAs são particionadas com uma única ordenação estável pelo
+LTLA do destino (chegadas) e outra pelo da origem (saídas): o top-N de cada
+região é o começo do seu trecho. As regiões nomeadas se sobrepõem às LTLAs
+e viram máscaras. Os GeoJSON são gravados em paralelo e um index.json lista
+todos os arquivos gerados. `region_flows.legacy_files` regrava arquivos no
+caminho antigo (ex.: data/processed/london-inflows-top5000.geojson, o
+"london-center" de chegadas que o 04_london_inflows.py gerava).
+
+Uso:
+    python scripts/04_region_flows.py [--jobs 8] [--top-n 5000] [--cache-dir data/interim/cache]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from flow_base import BaseFlows
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
+cols = cfg["columns"]
+region_cfg = cfg.get("region_flows", {})
+
+parser = argparse.ArgumentParser(description="Gera GeoJSON de chegadas/saídas para todas as regiões")
+parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="processos para gravar os arquivos em paralelo (1 = sequencial)")
+parser.add_argument("--top-n", type=int, default=int(region_cfg.get("top_n", 5000)),
+                    help="maiores fluxos por região e direção")
+parser.add_argument("--cache-dir", default=None,
+                    help="cache Arrow da tabela base compartilhado entre scripts (ex.: data/interim/cache)")
+args = parser.parse_args()
+
+out_dir = region_cfg.get("out_dir", os.path.join(paths["processed_dir"], "regions"))
+directions = region_cfg.get("directions", ["inflows", "outflows"])
+os.makedirs(out_dir, exist_ok=True)
+
+print("=" * 70)
+print("🏙️  GERADOR DE FLUXOS POR REGIÃO (LTLAs + regiões do config.yaml)")
+print("=" * 70)
+
+t_start = time.perf_counter()
+print(f"\n📥 Lendo arquivo Parquet: {paths['parquet']}")
+base = BaseFlows.load(paths["parquet"], paths["lookup_areas"], cols, cache_dir=args.cache_dir)
+print(f"✅ Fluxos válidos para visualização: {len(base):,} de {base.total_rows:,}")
+
+# LTLA de cada área da tabela base (-1 = sem LTLA atribuído)
+print(f"\n📐 MSOA → LTLA: {paths['msoa_ltla']}")
+assigned = pd.read_csv(paths["msoa_ltla"], dtype="string").drop_duplicates(subset=["msoa21cd"])
+ltlas = assigned.dropna(subset=["ltla22cd"]).drop_duplicates(subset=["ltla22cd"]).sort_values("ltla22cd")
+ltla_codes = ltlas["ltla22cd"].to_numpy().astype(str)
+ltla_names = dict(zip(ltlas["ltla22cd"], ltlas["ltla22nm"].fillna("")))
+area_ltla = assigned.set_index("msoa21cd")["ltla22cd"].reindex(base.area_codes)
+area_group = pd.Index(ltla_codes).get_indexer(area_ltla.astype(object))
+print(f"✅ {len(ltla_codes)} LTLAs | {int((area_group < 0).sum()):,} áreas sem LTLA")
+
+regions = json.load(open(paths["regions"])) if os.path.exists(paths["regions"]) else {}
+print(f"🏷️  Regiões nomeadas: {', '.join(regions) or 'nenhuma'}")
+
+def region_member(region, by):
+    """Máscara das linhas da tabela base cuja origem/destino está na região (nomeada ou LTLA)."""
+    area_ids = base.dest_ids if by == "dest" else base.origin_ids
+    if region in regions:
+        return np.isin(base.area_codes, regions[region]["msoa"])[area_ids]
+    group = int(np.searchsorted(ltla_codes, region))
+    if group >= len(ltla_codes) or ltla_codes[group] != region:
+        raise SystemExit(f"❌ Região desconhecida em region_flows.legacy_files: {region}")
+    return (area_group == group)[area_ids]
+
+
+# Tarefas de gravação: (região, nome, direção, linhas, fluxos que batem, volume total)
+tasks = []
+for direction in directions:
+    by = "dest" if direction == "inflows" else "origin"
+    rows, matched, volume = base.grouped_top_rows(area_group, len(ltla_codes), args.top_n, by=by)
+    for code, r, m, v in zip(ltla_codes, rows, matched.tolist(), volume.tolist()):
+        tasks.append((code, ltla_names[code], direction, r, m, v))
+    for name in regions:
+        member = region_member(name, by)
+        r = base.top_rows(top_n=args.top_n, mask=member)
+        tasks.append((name, name, direction, r, int(member.sum()), float(base.counts[member].sum())))
+print(f"\n⚙️  Seleção do top {args.top_n:,} de {len(tasks):,} arquivos em {time.perf_counter() - t_start:.1f}s")
+
+
+def write_task(i):
+    region, _, direction, rows, _, _ = tasks[i]
+    stem = f"{region}-{direction}-top{args.top_n}"
+    out = os.path.join(out_dir, f"{stem}.geojson")
+    return base.write_geojson(rows, out, stem), out
+
+
+# Com fork, os processos herdam a tabela base e as tarefas sem serializar
+jobs = min(args.jobs, len(tasks))
+if jobs > 1 and "fork" in mp.get_all_start_methods():
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("fork")) as pool:
+        written = list(pool.map(write_task, range(len(tasks)), chunksize=16))
+else:
+    written = [write_task(i) for i in range(len(tasks))]
+
+index = [
+    {"region": region, "name": name, "direction": direction, "file": os.path.basename(out),
+     "lines": lines, "matched": matched, "volume": int(volume)}
+    for (region, name, direction, _, matched, volume), (lines, out) in zip(tasks, written)
+]
+for legacy in region_cfg.get("legacy_files", []):
+    member = region_member(legacy["region"], "dest" if legacy["direction"] == "inflows" else "origin")
+    rows = base.top_rows(top_n=int(legacy["top_n"]), mask=member)
+    stem = os.path.splitext(os.path.basename(legacy["file"]))[0]
+    lines = base.write_geojson(rows, legacy["file"], stem)
+    print(f"📁 Caminho antigo: {legacy['file']} ({lines:,} linhas)")
+
+index_path = os.path.join(out_dir, "index.json")
+with open(index_path, "w") as f:
+    json.dump({"top_n": args.top_n, "files": index}, f, indent=1, ensure_ascii=False)
+
+total_mb = sum(os.path.getsize(out) for _, out in written) / (1024 * 1024)
+print(f"\n✅ {len(written):,} arquivos em {out_dir} ({total_mb:.1f} MB)")
+print(f"💾 Índice: {index_path}")
+
+# Estatísticas: LTLAs que mais recebem trabalhadores
+print("\n📈 LTLAs COM MAIS CHEGADAS:")
+inflows = sorted((e for e in index if e["direction"] == "inflows" and e["region"] not in regions),
+                 key=lambda e: e["volume"], reverse=True)
+for i, e in enumerate(inflows[:10], 1):
+    print(f"   {i}. {e['name']} ({e['region']}): {e['volume']:,} pessoas")
+
+print("\n" + "=" * 70)
+print(f"🎉 PIPELINE COMPLETO em {time.perf_counter() - t_start:.1f}s!")
+print("=" * 70)
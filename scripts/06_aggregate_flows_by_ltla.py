@@ -0,0 +1,73 @@
+"""
+Script: agrega os fluxos MSOA por LTLA (distritos)
+
+Gera, a partir do parquet de fluxos MSOA:
+- a matriz OD LTLA compacta em Parquet (códigos dicionarizados, count int32)
+- o índice mmap LTLA servido em /api/ltla/flows/<ltla_code>
+- o public/ltla_flows_complete.geojson usado pelo LTLAHeatmap/LTLAIncomingFlows
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from index_file import write_index  # noqa: E402
+from ltla import aggregate_msoa_flows  # noqa: E402
+from serializers import encode_feature_collection  # noqa: E402
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
+
+print("=" * 70)
+print("🏛️  AGREGANDO FLUXOS MSOA → LTLA")
+print("=" * 70)
+
+t0 = time.perf_counter()
+print(f"\n📥 Lendo {paths['parquet']}")
+print(f"📍 Lookup: {paths['ltla_lookup']} | Centróides: {paths['ltla_centroids']}")
+flows = aggregate_msoa_flows(paths["parquet"], paths["ltla_lookup"], paths["ltla_centroids"])
+areas = flows.areas
+print(f"✅ {len(flows):,} pares LTLA entre {len(areas):,} distritos "
+      f"({int(flows.counts.sum()):,} pessoas, {time.perf_counter() - t0:.1f}s)")
+
+# Matriz OD compacta
+os.makedirs(os.path.dirname(paths["ltla_od"]), exist_ok=True)
+table = pa.table({
+    "origin_code": pa.DictionaryArray.from_arrays(pa.array(flows.origin_ids), pa.array(areas.codes.tolist())),
+    "dest_code": pa.DictionaryArray.from_arrays(pa.array(flows.dest_ids), pa.array(areas.codes.tolist())),
+    "count": pa.array(flows.counts),
+})
+pq.write_table(table, paths["ltla_od"], compression="zstd")
+print(f"\n💾 Matriz OD: {paths['ltla_od']} ({os.path.getsize(paths['ltla_od']) / 1024:.0f} KB)")
+
+# Índice mmap para a API
+sources = {"parquet": paths["parquet"], "ltla_lookup": paths["ltla_lookup"],
+           "ltla_centroids": paths["ltla_centroids"]}
+write_index(paths["ltla_index"], flows, sources)
+print(f"💾 Índice LTLA: {paths['ltla_index']} ({os.path.getsize(paths['ltla_index']) / 1024:.0f} KB)")
+
+# GeoJSON completo para o frontend
+with open(paths["ltla_geojson"], "wb") as f:
+    f.write(encode_feature_collection(areas, flows.origin_ids, flows.dest_ids, flows.counts))
+print(f"💾 GeoJSON: {paths['ltla_geojson']} ({os.path.getsize(paths['ltla_geojson']) / (1024 * 1024):.1f} MB)")
+
+# Top destinos (sem contar quem trabalha no próprio distrito)
+print("\n📈 TOP 5 DESTINOS:")
+external = flows.origin_ids != flows.dest_ids
+totals = np.bincount(flows.dest_ids[external], weights=flows.counts[external], minlength=len(areas))
+for i, area_id in enumerate(np.argsort(-totals)[:5], 1):
+    print(f"   {i}. {areas.names[area_id]}: {int(totals[area_id]):,} pessoas")
+
+print("\n" + "=" * 70)
+print("🎉 AGREGAÇÃO LTLA COMPLETA!")
+print("=" * 70)
@@ -0,0 +1,85 @@
+"""
+Script: gera os vector tiles (MBTiles) dos fluxos MSOA e dos limites LTLA
+
+Em vez de o frontend baixar e parsear GeoJSONs inteiros, a API serve só os
+tiles visíveis (/api/tiles/{z}/{x}/{y}.pbf). Cada tile tem duas camadas:
+- flows: os N maiores fluxos que cruzam o tile (config tiles.max_flows_per_tile)
+- boundaries: limites LTLA simplificados para o zoom
+"""
+import gzip
+import json
+import os
+import sys
+import time
+
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from flow_index import FlowTable  # noqa: E402
+from tile_archive import write_mbtiles  # noqa: E402
+from vector_tiles import encode_tile, flow_layers, polygon_layers, project_polygons  # noqa: E402
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths, tiles_cfg = cfg["paths"], cfg["tiles"]
+minzoom, maxzoom = tiles_cfg["minzoom"], tiles_cfg["maxzoom"]
+max_per_tile = tiles_cfg["max_flows_per_tile"]
+os.makedirs(os.path.dirname(paths["tiles"]), exist_ok=True)
+
+print("=" * 70)
+print("🧱 GERANDO VECTOR TILES (MBTiles)")
+print("=" * 70)
+
+t0 = time.perf_counter()
+print(f"\n📥 Lendo {paths['parquet']} + {paths['lookup_areas']}")
+flows = FlowTable.from_parquet(paths["parquet"], paths["lookup_areas"])
+print(f"✅ {len(flows):,} fluxos ({time.perf_counter() - t0:.1f}s)")
+
+print(f"📍 Limites: {paths['ltla_boundaries']}")
+with open(paths["ltla_boundaries"]) as f:
+    boundaries = project_polygons(json.load(f)["features"])
+print(f"✅ {len(boundaries):,} distritos")
+
+tiles = []
+for zoom in range(minzoom, maxzoom + 1):
+    tz = time.perf_counter()
+    flow_tiles = flow_layers(flows, zoom, max_per_tile)
+    boundary_tiles = polygon_layers(boundaries, zoom)
+    size = 0
+    for x, y in sorted(set(flow_tiles) | set(boundary_tiles)):
+        data = gzip.compress(encode_tile([flow_tiles.get((x, y), ()), boundary_tiles.get((x, y), ())]), 6)
+        tiles.append((zoom, x, y, data))
+        size += len(data)
+    n_tiles = len(set(flow_tiles) | set(boundary_tiles))
+    print(f"   z{zoom:>2}: {n_tiles:>6,} tiles, {size / 1024:>8.0f} KB, "
+          f"{sum(map(len, flow_tiles.values())):>9,} linhas ({time.perf_counter() - tz:.1f}s)")
+
+lon, lat = flows.areas.lon, flows.areas.lat
+bounds = [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())]
+flow_fields = {"origin_code": "String", "origin_name": "String", "dest_code": "String",
+               "dest_name": "String", "count": "Number"}
+metadata = {
+    "name": "flows",
+    "format": "pbf",
+    "type": "overlay",
+    "minzoom": str(minzoom),
+    "maxzoom": str(maxzoom),
+    "bounds": ",".join(f"{v:.6f}" for v in bounds),
+    "center": f"{(bounds[0] + bounds[2]) / 2:.6f},{(bounds[1] + bounds[3]) / 2:.6f},{minzoom + 2}",
+    "json": {"vector_layers": [
+        {"id": "flows", "fields": flow_fields, "minzoom": minzoom, "maxzoom": maxzoom},
+        {"id": "boundaries", "fields": {"ltla_code": "String", "ltla_name": "String"},
+         "minzoom": minzoom, "maxzoom": maxzoom},
+    ]},
+}
+write_mbtiles(paths["tiles"], tiles, metadata)
+print(f"\n💾 MBTiles: {paths['tiles']} ({os.path.getsize(paths['tiles']) / (1024 * 1024):.1f} MB, "
+      f"{len(tiles):,} tiles, {time.perf_counter() - t0:.1f}s)")
+
+print("\n" + "=" * 70)
+print("🎉 VECTOR TILES PRONTOS!")
+print("=" * 70)
@@ -0,0 +1,156 @@
+"""
+Script: análises de rede sobre o grafo OD (PageRank, hubs, comunidades e bacias)
+
+Carrega os fluxos MSOA numa matriz esparsa (api/od_graph.py, mesmos ids da
+AreaTable) e grava, em `network.out_dir`:
+- areas.geojson: um ponto por MSOA com PageRank, hub, autoridade, posições e comunidade
+- communities.geojson: contorno (fecho convexo dos centróides) e totais de cada comunidade
+- catchments.geojson: bacia de cada MSOA (origens que somam `catchment_coverage`
+  das chegadas), um polígono por área com nº de membros e fluxo coberto
+- summary.json: parâmetros, modularidade e tempos de cada análise
+
+Uso:
+    python scripts/09_network_analytics.py [--coverage 0.8] [--resolution 1.0]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from flow_index import FlowTable  # noqa: E402
+from index_file import StaleIndexError, load_index  # noqa: E402
+from od_graph import ODGraph, ranks_of  # noqa: E402
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
+net_cfg = cfg.get("network", {})
+
+parser = argparse.ArgumentParser(description="Análises de rede sobre os fluxos MSOA")
+parser.add_argument("--coverage", type=float, default=float(net_cfg.get("catchment_coverage", 0.8)),
+                    help="fração das chegadas coberta pela bacia de cada área")
+parser.add_argument("--resolution", type=float, default=float(net_cfg.get("resolution", 1.0)),
+                    help="resolução da modularidade (maior = comunidades menores)")
+parser.add_argument("--damping", type=float, default=float(net_cfg.get("damping", 0.85)))
+parser.add_argument("--seed", type=int, default=int(net_cfg.get("seed", 0)))
+args = parser.parse_args()
+
+out_dir = net_cfg.get("out_dir", os.path.join(paths["processed_dir"], "network"))
+os.makedirs(out_dir, exist_ok=True)
+
+print("=" * 70)
+print("🕸️  ANÁLISES DE REDE DO GRAFO OD (MSOA)")
+print("=" * 70)
+
+timings = {}
+t0 = time.perf_counter()
+sources = {"parquet": paths["parquet"], "lookup_areas": paths["lookup_areas"]}
+try:
+    flows = load_index(paths["flow_index"], sources)
+except (FileNotFoundError, StaleIndexError) as e:
+    print(f"⚠️  Sem índice utilizável ({e}); lendo o parquet")
+    flows = FlowTable.from_parquet(paths["parquet"], paths["lookup_areas"])
+graph = ODGraph.from_flows(flows)
+areas = graph.areas
+timings["load"] = time.perf_counter() - t0
+print(f"\n📥 Matriz {len(graph):,}×{len(graph):,} com {graph.matrix.nnz:,} pares "
+      f"({graph.nbytes / 2**20:.1f} MB, {timings['load']:.1f}s)")
+
+
+def timed(name, fn):
+    t = time.perf_counter()
+    result = fn()
+    timings[name] = time.perf_counter() - t
+    print(f"⏱️  {name:<12} {timings[name]:>7.2f}s")
+    return result
+
+
+pagerank = timed("pagerank", lambda: graph.pagerank(args.damping))
+hubs, authorities = timed("hits", graph.hits)
+labels, modularity = timed("communities", lambda: graph.communities(args.resolution, seed=args.seed))
+shed_indptr, shed_members, shed_counts = timed("catchments", lambda: graph.catchments("incoming", args.coverage))
+n_communities = int(labels.max()) + 1
+print(f"🏘️  {n_communities:,} comunidades (modularidade {modularity:.3f})")
+
+print("\n📊 Top 10 por PageRank (polos de emprego):")
+for i in np.argsort(-pagerank, kind="stable")[:10].tolist():
+    print(f"   {areas.codes[i]} - {areas.names[i]}: {pagerank[i]:.5f} (comunidade {labels[i]})")
+
+
+def write_geojson(name, features):
+    path = os.path.join(out_dir, name)
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"💾 {path} ({len(features):,} features, {os.path.getsize(path) / 2**20:.1f} MB)")
+    return path
+
+
+def area_name(i):
+    name = areas.names[i]
+    return name if isinstance(name, str) else None
+
+
+print()
+ranks = {metric: ranks_of(values) for metric, values in
+         (("pagerank", pagerank), ("hub", hubs), ("authority", authorities))}
+write_geojson("areas.geojson", [{
+    "type": "Feature",
+    "geometry": {"type": "Point", "coordinates": [round(float(areas.lon[i]), 6), round(float(areas.lat[i]), 6)]},
+    "properties": {"code": str(areas.codes[i]), "name": area_name(i),
+                   "pagerank": round(float(pagerank[i]), 8), "hub": round(float(hubs[i]), 8),
+                   "authority": round(float(authorities[i]), 8), "pagerank_rank": int(ranks["pagerank"][i]),
+                   "hub_rank": int(ranks["hub"][i]), "authority_rank": int(ranks["authority"][i]),
+                   "community": int(labels[i])},
+} for i in range(len(graph))])
+
+summaries = graph.community_summary(labels)
+order = np.argsort(labels, kind="stable")
+bounds = np.searchsorted(labels[order], np.arange(n_communities + 1))
+community_features = []
+for c, summary in enumerate(summaries):
+    members = order[bounds[c]:bounds[c + 1]]
+    ring = graph.hull(members)
+    if ring is None:
+        continue
+    top = members[np.argmax(pagerank[members])]
+    community_features.append({
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": {**summary, "hub_code": str(areas.codes[top]), "hub_name": area_name(top)},
+    })
+write_geojson("communities.geojson", community_features)
+
+catchment_features = []
+for i in range(len(graph)):
+    members = shed_members[shed_indptr[i]:shed_indptr[i + 1]]
+    ring = graph.hull(members)
+    if ring is None:
+        continue
+    catchment_features.append({
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": {"code": str(areas.codes[i]), "name": area_name(i), "members": len(members),
+                       "covered": int(shed_counts[shed_indptr[i]:shed_indptr[i + 1]].sum())},
+    })
+write_geojson("catchments.geojson", catchment_features)
+
+summary_path = os.path.join(out_dir, "summary.json")
+with open(summary_path, "w") as f:
+    json.dump({
+        "areas": len(graph), "pairs": int(graph.matrix.nnz),
+        "params": {"damping": args.damping, "resolution": args.resolution, "seed": args.seed,
+                   "catchment_coverage": args.coverage},
+        "communities": n_communities, "modularity": round(modularity, 4),
+        "timings_s": {k: round(v, 3) for k, v in timings.items()},
+    }, f, indent=1)
+print(f"💾 {summary_path}")
+print(f"\n✅ Concluído em {sum(timings.values()):.1f}s")
@@ -1,38 +1,61 @@
 """
 Script para verificar códigos mais usados e sugerir filtros interessantes
+
+Lê as estatísticas pré-calculadas por área (scripts/build_area_stats.py) em
+vez de agrupar a tabela OD inteira; sem o arquivo, calcula na hora a partir
+do parquet. Os totais contam todas as linhas do parquet, inclusive áreas sem
+centróide, como o groupby da versão em pandas.
 """
-import pandas as pd
 import os
+import sys
+
+import yaml
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from area_stats import AreaStats, od_totals  # noqa: E402
+from flow_index import FlowTable  # noqa: E402
+from index_file import StaleIndexError  # noqa: E402
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
 
 print("🔍 Analisando dados para sugerir filtros interessantes...\n")
 
-df = pd.read_parquet("data/interim/odwp01ew.parquet")
+sources = {"parquet": paths["parquet"], "lookup_areas": paths["lookup_areas"]}
+try:
+    stats = AreaStats.load(paths["area_stats"], sources)
+except (FileNotFoundError, StaleIndexError) as e:
+    print(f"⚠️  Estatísticas indisponíveis ({e}); calculando a partir do parquet")
+    stats = AreaStats.build(FlowTable.from_parquet(paths["parquet"], paths["lookup_areas"]), "msoa",
+                            totals=od_totals(paths["parquet"]))
+
+
+def print_top(title, column):
+    print(title)
+    ids = stats.top(column, 10)
+    for i in ids.tolist():
+        print(f"   {stats.codes[i]} - {stats.names[i]}: {int(stats.columns[column][i]):,} pessoas")
+    return ids
 
-# Top origens por volume total
-print("📊 Top 10 ORIGENS com mais deslocamentos:")
-top_origins = df.groupby(['origin_code', 'origin_name'])['count'].sum().sort_values(ascending=False).head(10)
-for (code, name), count in top_origins.items():
-    print(f"   {code} - {name}: {count:,} pessoas")
 
-print("\n📊 Top 10 DESTINOS com mais deslocamentos:")
-top_dests = df.groupby(['dest_code', 'dest_name'])['count'].sum().sort_values(ascending=False).head(10)
-for (code, name), count in top_dests.items():
-    print(f"   {code} - {name}: {count:,} pessoas")
+# Top origens (moradores que saem) e destinos (postos de trabalho) por volume total
+top_origins = print_top("📊 Top 10 ORIGENS com mais deslocamentos:", "outflow")
+top_dests = print_top("\n📊 Top 10 DESTINOS com mais deslocamentos:", "inflow")
 
 print("\n💡 Sugestões de cenários para o config.yaml:")
 print("\n" + "="*70)
 
 # Pegar o código da área com mais origem
-top_origin_code = top_origins.index[0][0]
-top_origin_name = top_origins.index[0][1]
+top_origin_code = stats.codes[top_origins[0]]
+top_origin_name = str(stats.names[top_origins[0]])
 
 # Pegar o código da área com mais destino
-top_dest_code = top_dests.index[0][0]
-top_dest_name = top_dests.index[0][1]
+top_dest_code = stats.codes[top_dests[0]]
+top_dest_name = str(stats.names[top_dests[0]])
 
 print(f"""
   scenarios:
@@ -0,0 +1,204 @@
+"""
+Download paginado e retomável de camadas ArcGIS FeatureServer (limites do ONS).
+
+O FeatureServer limita os registros por resposta (maxRecordCount, 2000 nas
+camadas do ONS): uma query única devolve só o começo da camada, marcado com
+exceededTransferLimit. Aqui a camada é lida em páginas com
+resultOffset/resultRecordCount, ordenadas pelo ObjectID para a paginação ser
+estável, em paralelo (ThreadPoolExecutor). Cada thread tem sua
+requests.Session (keep-alive, retentativas com backoff em 429/5xx). Se o
+servidor devolver menos registros que o pedido (exceededTransferLimit, limite
+real menor que o anunciado), o resto da página é pedido a partir de onde
+parou; uma página curta sem essa marca é erro (PageError com o offset).
+
+Cada página vai para um cache em disco (uma pasta por camada + consulta),
+com o sha256 do conteúdo num arquivo ao lado gravado depois da página: numa
+nova execução, páginas íntegras são reaproveitadas e só as que faltam (ou
+não batem com o checksum) são baixadas de novo. As páginas são lidas de
+volta uma por vez, em ordem, para a conversão em streaming.
+
+`base_url` é a URL da camada (…/FeatureServer/0): qualquer servidor HTTP
+local que responda `?f=json` e `/query` pode substituir o ONS.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TIMEOUT = (10, 120)  # (conexão, leitura) em segundos
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class PageError(RuntimeError):
+    """Falha ao baixar uma página; `offset` diz qual (as anteriores ficam no cache)."""
+
+    def __init__(self, offset, message):
+        super().__init__(f"página com offset {offset}: {message}")
+        self.offset = offset
+
+
+def sha256_of(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class LayerPager:
+    """Páginas de uma camada FeatureServer, baixadas em paralelo e guardadas em cache."""
+
+    def __init__(self, base_url, cache_dir, workers=4, page_size=None, params=None,
+                 refresh=False, timeout=TIMEOUT, retries=5):
+        self.base_url = base_url.rstrip("/")
+        self.params = {"where": "1=1", "outFields": "*", "outSR": "4326", "f": "geojson", **(params or {})}
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+        key = hashlib.sha1(json.dumps([self.base_url, self.params, page_size], sort_keys=True).encode())
+        self.cache_dir = os.path.join(cache_dir, key.hexdigest()[:16])
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.layer = self._layer(page_size, refresh)
+        self.count, self.page_size = self.layer["count"], self.layer["page_size"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def session(self):
+        """Session da thread atual (conexões reaproveitadas entre as páginas)."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=self.retries, backoff_factor=0.5, status_forcelist=RETRY_STATUS,
+                          allowed_methods=("GET",), respect_retry_after_header=True)
+            adapter = HTTPAdapter(max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def _get(self, url, params):
+        """Corpo (bytes) da resposta; erros do ArcGIS chegam com HTTP 200 e viram RuntimeError."""
+        response = self.session().get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.content
+        data = json.loads(body)
+        if isinstance(data, dict) and "error" in data:
+            error = data["error"]
+            raise RuntimeError(f"ArcGIS {error.get('code')}: {error.get('message')} ({response.url})")
+        return body, data
+
+    def _layer(self, page_size, refresh):
+        """Metadados da camada (total de registros, tamanho da página, campo de ObjectID), em cache."""
+        path = os.path.join(self.cache_dir, "layer.json")
+        if not refresh and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        _, info = self._get(self.base_url, {"f": "json"})
+        _, count = self._get(f"{self.base_url}/query", {"where": self.params["where"],
+                                                         "returnCountOnly": "true", "f": "json"})
+        max_records = int(info.get("maxRecordCount") or 1000)
+        id_field = info.get("objectIdField") or next(
+            (f["name"] for f in info.get("fields") or [] if f.get("type") == "esriFieldTypeOID"), None)
+        layer = {"name": info.get("name"), "count": int(count["count"]), "max_record_count": max_records,
+                 "page_size": min(page_size or max_records, max_records), "id_field": id_field}
+        # Metadados novos invalidam as páginas antigas (a camada pode ter mudado)
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("page-"):
+                os.remove(os.path.join(self.cache_dir, name))
+        write_atomic(path, json.dumps(layer, indent=1).encode())
+        return layer
+
+    @property
+    def offsets(self):
+        return list(range(0, self.count, self.page_size))
+
+    def page_path(self, offset):
+        return os.path.join(self.cache_dir, f"page-{offset:09d}.geojson")
+
+    def cached(self, offset):
+        """Página presente e íntegra (sha256 igual ao registrado quando foi gravada)."""
+        path = self.page_path(offset)
+        if not (os.path.exists(path) and os.path.exists(path + ".sha256")):
+            return False
+        with open(path + ".sha256") as f:
+            return f.read().strip() == sha256_of(path)
+
+    def _query(self, offset, count):
+        params = {**self.params, "resultOffset": offset, "resultRecordCount": count}
+        if self.layer["id_field"]:
+            params["orderByFields"] = self.layer["id_field"]
+        return self._get(f"{self.base_url}/query", params)
+
+    def fetch_page(self, offset):
+        """Baixa e grava uma página; completa com novas consultas se o servidor cortar a resposta."""
+        expected = min(self.page_size, self.count - offset)
+        body, first = self._query(offset, expected)
+        features, data = list(first.get("features") or []), first
+        while len(features) < expected and data.get("exceededTransferLimit"):
+            _, data = self._query(offset + len(features), expected - len(features))
+            if not data.get("features"):
+                break
+            features += data["features"]
+        if len(features) != expected:
+            raise PageError(offset, f"{len(features)} registros, esperados {expected} "
+                                    f"(camada mudou? use --refresh)")
+        if data is not first:
+            # Página montada com várias respostas: grava a junção
+            body = json.dumps({**first, "features": features, "exceededTransferLimit": False}).encode()
+        path = self.page_path(offset)
+        write_atomic(path, body)
+        write_atomic(path + ".sha256", hashlib.sha256(body).hexdigest().encode())
+        return len(features)
+
+    def download(self, progress=None):
+        """Baixa as páginas que faltam no cache; retorna (páginas baixadas, páginas do cache)."""
+        missing = [offset for offset in self.offsets if not self.cached(offset)]
+        cached = len(self.offsets) - len(missing)
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(self.fetch_page, offset): offset for offset in missing}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    future.result()
+                except PageError:
+                    pool.shutdown(cancel_futures=True)
+                    raise
+                except Exception as e:
+                    pool.shutdown(cancel_futures=True)
+                    raise PageError(futures[future], f"{type(e).__name__}: {e}") from e
+                if progress is not None:
+                    progress(cached + done, len(self.offsets))
+        return len(missing), cached
+
+    def pages(self):
+        """Features de cada página, em ordem (uma página em memória por vez)."""
+        for offset in self.offsets:
+            with open(self.page_path(offset)) as f:
+                yield json.load(f)["features"]
@@ -0,0 +1,111 @@
+"""
+Script: atribui cada MSOA ao LTLA que contém seu centróide (point-in-polygon)
+
+Em vez de confiar no ltla_lookup.csv (que tem msoa21nm em branco) ou em
+palavras-chave nos nomes, cruza os centróides com os polígonos de
+ltla_boundaries.geojson de uma vez só: STRtree sobre geometrias preparadas e
+consulta vetorizada com todos os pontos (shapely 2).
+
+Centróides que não caem em nenhum polígono (LTLA sem limite no GeoJSON,
+centróide no mar/estuário) usam o LTLA do lookup; sem lookup, o polígono
+mais próximo. Gera:
+- o lookup validado (msoa → ltla, método, concordância com o lookup original)
+- os conjuntos de MSOAs por região (config.yaml: regions), usados no 04
+"""
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
+
+print("=" * 70)
+print("📐 ATRIBUINDO MSOA → LTLA POR POINT-IN-POLYGON")
+print("=" * 70)
+
+areas = pd.read_csv(paths["lookup_areas"], dtype={"code": "string"})
+areas = areas.dropna(subset=["lat", "lon"]).drop_duplicates(subset=["code"]).reset_index(drop=True)
+boundaries = gpd.read_file(paths["ltla_boundaries"]).to_crs(4326)
+lookup = pd.read_csv(paths["ltla_lookup"], dtype="string").drop_duplicates(subset=["msoa21cd"])
+print(f"\n📍 {len(areas):,} centróides MSOA | 🗺️  {len(boundaries):,} polígonos LTLA | 📋 {len(lookup):,} linhas no lookup")
+
+# Consulta em lote: STRtree dos centróides consultada com os polígonos
+# (o shapely prepara as geometrias de consulta, então o teste de contenção
+# roda sobre cada polígono preparado uma única vez)
+polygons = boundaries.geometry.to_numpy()
+shapely.prepare(polygons)
+points = shapely.points(areas["lon"].to_numpy(), areas["lat"].to_numpy())
+poly_idx, point_idx = shapely.STRtree(points).query(polygons, predicate="intersects")
+# Ponto exatamente na divisa cai em dois polígonos: fica com o primeiro
+first = np.unique(point_idx, return_index=True)[1]
+assigned = np.full(len(areas), -1)
+assigned[point_idx[first]] = poly_idx[first]
+
+ltla_codes = boundaries["ltla_code"].to_numpy().astype(object)
+ltla_names = boundaries["ltla_name"].to_numpy().astype(object)
+lookup_ltla = lookup.set_index("msoa21cd").reindex(areas["code"])
+result = pd.DataFrame({
+    "msoa21cd": areas["code"],
+    "msoa21nm": areas["name"],
+    "ltla22cd": pd.array(np.where(assigned >= 0, ltla_codes[np.maximum(assigned, 0)], None), dtype="string"),
+    "ltla22nm": pd.array(np.where(assigned >= 0, ltla_names[np.maximum(assigned, 0)], None), dtype="string"),
+    "method": np.where(assigned >= 0, "polygon", ""),
+    "lookup_ltla22cd": lookup_ltla["ltla22cd"].to_numpy(),
+})
+
+# Fora de todos os polígonos: LTLA do lookup; sem lookup, o polígono mais próximo
+from_lookup = (assigned < 0) & result["lookup_ltla22cd"].notna().to_numpy()
+result.loc[from_lookup, "ltla22cd"] = result.loc[from_lookup, "lookup_ltla22cd"]
+result.loc[from_lookup, "ltla22nm"] = lookup_ltla["ltla22nm"].to_numpy()[from_lookup]
+result.loc[from_lookup, "method"] = "lookup"
+orphan = np.flatnonzero((assigned < 0) & ~from_lookup)
+if len(orphan):
+    nearest = shapely.STRtree(polygons).query_nearest(points[orphan], all_matches=False)[1]
+    result.loc[orphan, "ltla22cd"] = ltla_codes[nearest]
+    result.loc[orphan, "ltla22nm"] = ltla_names[nearest]
+    result.loc[orphan, "method"] = "nearest"
+result["agrees"] = (result["ltla22cd"] == result["lookup_ltla22cd"]).fillna(False)
+
+print(f"\n✅ Dentro de um polígono: {int((result['method'] == 'polygon').sum()):,}")
+print(f"   Fora dos polígonos, LTLA do lookup: {int(from_lookup.sum()):,}")
+print(f"   Fora dos polígonos e sem lookup, polígono mais próximo: {len(orphan):,}")
+polygon_rows = result[(result["method"] == "polygon") & result["lookup_ltla22cd"].notna()]
+disagree = polygon_rows[~polygon_rows["agrees"]]
+print(f"⚠️  Divergências com o ltla_lookup.csv: {len(disagree):,}")
+for row in disagree.head(10).itertuples():
+    print(f"   {row.msoa21cd} ({row.msoa21nm}): polígono {row.ltla22cd} ≠ lookup {row.lookup_ltla22cd}")
+
+os.makedirs(os.path.dirname(paths["msoa_ltla"]), exist_ok=True)
+result.to_csv(paths["msoa_ltla"], index=False)
+print(f"\n💾 Lookup validado: {paths['msoa_ltla']}")
+
+# Conjuntos de MSOAs por região (lista de LTLAs e/ou prefixo do código LTLA)
+regions = {}
+for name, spec in cfg.get("regions", {}).items():
+    ltla_set = set(spec.get("ltla", []))
+    prefix = spec.get("ltla_prefix")
+    member = result["ltla22cd"].isin(ltla_set)
+    if prefix:
+        member |= result["ltla22cd"].str.startswith(prefix).fillna(False)
+    regions[name] = {
+        "ltla": sorted(result.loc[member, "ltla22cd"].unique().tolist()),
+        "msoa": sorted(result.loc[member, "msoa21cd"].tolist()),
+    }
+    print(f"🏷️  Região {name}: {len(regions[name]['ltla'])} LTLAs, {len(regions[name]['msoa']):,} MSOAs")
+with open(paths["regions"], "w") as f:
+    json.dump(regions, f, indent=1)
+print(f"💾 Regiões: {paths['regions']}")
+
+print("\n" + "=" * 70)
+print("🎉 ATRIBUIÇÃO COMPLETA!")
+print("=" * 70)
@@ -0,0 +1,83 @@
+"""
+Script: constrói o cubo de estatísticas por área (MSOA e LTLA)
+
+Para cada área calcula, uma única vez, inflow/outflow, autocontenção, top-k
+origens e destinos e o histograma das contagens (faixas da MobilityLegend) e
+grava em Arrow IPC (ver api/area_stats.py). A API (/api/areas/<code>/stats) e
+o scripts/analyze_top_areas.py só leem esse arquivo, sem reagrupar a tabela OD.
+
+Reaproveita os índices mmap (build_flow_index.py / 06) quando estão em dia;
+senão monta as tabelas a partir do parquet. No nível MSOA os totais contam
+todas as linhas do parquet (od_totals), como o groupby antigo, inclusive
+áreas sem centróide; parceiros e top-k só os fluxos que aparecem no mapa.
+"""
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from area_stats import TOP_K, AreaStats, od_totals  # noqa: E402
+from flow_index import FlowTable  # noqa: E402
+from index_file import StaleIndexError, load_index  # noqa: E402
+from ltla import aggregate_msoa_flows  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Estatísticas pré-calculadas por área (MSOA e LTLA)")
+parser.add_argument("--top-k", type=int, default=TOP_K, help="parceiros guardados por área e direção")
+args = parser.parse_args()
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
+parquet_path = paths["parquet"]
+
+
+def open_table(index_path, sources, fallback):
+    """Índice mmap se estiver em dia; senão `fallback()` (parquet)."""
+    try:
+        return load_index(index_path, sources), "mmap"
+    except (FileNotFoundError, StaleIndexError) as e:
+        print(f"⚠️  Sem índice utilizável em {index_path} ({e}); lendo o parquet")
+    return fallback(), "parquet"
+
+
+print("=" * 70)
+print("📊 CONSTRUINDO ESTATÍSTICAS POR ÁREA")
+print("=" * 70)
+
+levels = [
+    ("msoa", paths["flow_index"], paths["area_stats"],
+     {"parquet": parquet_path, "lookup_areas": paths["lookup_areas"]},
+     lambda: FlowTable.from_parquet(parquet_path, paths["lookup_areas"]), True),
+    ("ltla", paths["ltla_index"], paths["ltla_area_stats"],
+     {"parquet": parquet_path, "ltla_lookup": paths["ltla_lookup"], "ltla_centroids": paths["ltla_centroids"]},
+     lambda: aggregate_msoa_flows(parquet_path, paths["ltla_lookup"], paths["ltla_centroids"]), False),
+]
+
+for level, index_path, out_path, sources, fallback, all_rows in levels:
+    t0 = time.perf_counter()
+    flows, source = open_table(index_path, sources, fallback)
+    print(f"\n📥 {level.upper()}: {len(flows):,} fluxos, {len(flows.areas):,} áreas ({source}, "
+          f"{time.perf_counter() - t0:.1f}s)")
+
+    t0 = time.perf_counter()
+    totals = od_totals(parquet_path) if all_rows else None
+    stats = AreaStats.build(flows, level, args.top_k, totals=totals)
+    print(f"✅ Estatísticas de {len(stats):,} áreas em {time.perf_counter() - t0:.2f}s")
+    if len(stats) > len(flows.areas):
+        print(f"   {len(stats) - len(flows.areas):,} áreas do parquet sem centróide (só com os totais)")
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    stats.write(out_path, sources)
+    size_mb = os.path.getsize(out_path) / (1024 * 1024)
+    print(f"💾 Salvo em: {out_path} ({size_mb:.1f} MB)")
+
+    # Conferir: o arquivo abre e bate com o que foi calculado
+    check = AreaStats.load(out_path, sources)
+    assert len(check) == len(stats) and int(check.columns["inflow"].sum()) == int(stats.columns["inflow"].sum())
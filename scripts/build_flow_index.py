@@ -0,0 +1,59 @@
+"""
+Script: constrói o índice de fluxos pré-computado (memory-mapped) usado pela API
+
+Lê o parquet e o lookup de centróides, codifica as áreas como ids int32,
+ordena os fluxos por destino/contagem, monta o índice CSR e grava tudo em
+um único arquivo que a API abre via mmap (ver api/index_file.py).
+
+Com --dataset NOME, indexa outro conjunto da seção `datasets` do config.yaml.
+"""
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from flow_index import FlowTable  # noqa: E402
+from index_file import load_index, write_index  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Índice mmap dos fluxos MSOA")
+parser.add_argument("--dataset", default=None, help="conjunto da seção `datasets` (padrão: paths.parquet)")
+args = parser.parse_args()
+
+cfg = yaml.safe_load(open("config.yaml"))
+dataset = {}
+if args.dataset is not None:
+    dataset = cfg.get("datasets", {}).get("releases", {}).get(args.dataset)
+    if dataset is None:
+        raise SystemExit(f"❌ Conjunto desconhecido: {args.dataset} (veja `datasets.releases` no config.yaml)")
+parquet_path = dataset.get("parquet", cfg["paths"]["parquet"])
+lookup_path = cfg["paths"]["lookup_areas"]
+index_path = dataset.get("flow_index", cfg["paths"]["flow_index"])
+os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+print("=" * 70)
+print("🗂️  CONSTRUINDO ÍNDICE DE FLUXOS (MMAP)")
+print("=" * 70)
+
+t0 = time.perf_counter()
+print(f"\n📥 Lendo {parquet_path} + {lookup_path}")
+flows = FlowTable.from_parquet(parquet_path, lookup_path).sorted_by_destination()
+print(f"✅ {len(flows):,} fluxos, {len(flows.areas):,} áreas ({time.perf_counter() - t0:.1f}s)")
+
+sources = {"parquet": parquet_path, "lookup_areas": lookup_path}
+write_index(index_path, flows, sources)
+size_mb = os.path.getsize(index_path) / (1024 * 1024)
+print(f"\n💾 Índice salvo em: {index_path} ({size_mb:.1f} MB)")
+
+# Conferir o arquivo recém-gravado (versão, origem e checksum)
+t0 = time.perf_counter()
+check = load_index(index_path, sources, verify=True)
+assert len(check) == len(flows)
+print(f"✅ Verificado: abre em {(time.perf_counter() - t0) * 1000:.0f} ms (com checksum)")
@@ -0,0 +1,71 @@
+"""
+Script: pré-calcula as áreas com padrão de deslocamento mais parecido
+
+Monta os perfis de saída/chegada de cada MSOA (vetores esparsos normalizados,
+api/similarity.py) e calcula os k vizinhos por cosseno de todas as áreas, em
+blocos que cabem em --chunk-mb. Grava a tabela em Arrow IPC; a API
+(/api/areas/<code>/similar) responde direto dela.
+
+Uso:
+    python scripts/build_similar_areas.py [--top-k 20] [--chunk-mb 64]
+"""
+import argparse
+import os
+import sys
+import time
+
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+sys.path.insert(0, os.path.join(project_root, "api"))
+
+from flow_index import FlowTable  # noqa: E402
+from index_file import StaleIndexError, load_index  # noqa: E402
+from od_graph import ODGraph  # noqa: E402
+from similarity import KINDS, TOP_K, SimilarityIndex  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Tabela de áreas similares (cosseno entre perfis de deslocamento)")
+parser.add_argument("--top-k", type=int, default=TOP_K, help="vizinhos guardados por área e perfil")
+parser.add_argument("--chunk-mb", type=float, default=64, help="memória dos blocos densos de similaridade")
+args = parser.parse_args()
+
+cfg = yaml.safe_load(open("config.yaml"))
+paths = cfg["paths"]
+out_path = paths["similar_areas"]
+os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+print("=" * 70)
+print("🧭 ÁREAS SIMILARES (PERFIS DE DESLOCAMENTO)")
+print("=" * 70)
+
+t0 = time.perf_counter()
+sources = {"parquet": paths["parquet"], "lookup_areas": paths["lookup_areas"]}
+try:
+    flows = load_index(paths["flow_index"], sources)
+except (FileNotFoundError, StaleIndexError) as e:
+    print(f"⚠️  Sem índice utilizável ({e}); lendo o parquet")
+    flows = FlowTable.from_parquet(paths["parquet"], paths["lookup_areas"])
+index = SimilarityIndex.from_graph(ODGraph.from_flows(flows))
+print(f"\n📥 Perfis de {len(index):,} áreas ({index.nbytes / 2**20:.1f} MB, {time.perf_counter() - t0:.1f}s)")
+
+
+def progress(kind, done, total):
+    print(f"   {kind:<9} {done:>8,}/{total:,}", end="\r" if done < total else "\n")
+
+
+for kind in KINDS:
+    t0 = time.perf_counter()
+    index.build_table(args.top_k, (kind,), int(args.chunk_mb * 2**20), progress)
+    print(f"✅ {kind}: {args.top_k} vizinhos por área em {time.perf_counter() - t0:.1f}s")
+
+index.write(out_path, sources)
+print(f"\n💾 Salvo em: {out_path} ({os.path.getsize(out_path) / 2**20:.1f} MB)")
+
+# Exemplo: vizinhos da primeira área
+ids, values = index.similar(0, "both", 5)
+print(f"\n🔎 Mais parecidas com {index.codes[0]} - {index.names[0]}:")
+for i, v in zip(ids.tolist(), values.tolist()):
+    print(f"   {index.codes[i]} - {index.names[i]}: {v:.3f}")
@@ -3,118 +3,148 @@ Script para baixar boundaries das MSOAs (Middle Layer Super Output Areas) do Rei
 e calcular os centróides com coordenadas reais.
 
 Fonte: Office for National Statistics (ONS) - UK Geoportal
+
+- Download paginado (resultOffset) em paralelo, com cache de páginas em disco
+  e checksums (scripts/arcgis_pages.py): uma execução interrompida é retomada
+  de onde parou e só baixa as páginas que faltam
+- Conversão em streaming, uma página por vez: GeoParquet (geometria WKB),
+  GeoJSON dos limites e CSV de centróides
+- --base-url aponta para outra camada FeatureServer (ou um servidor local)
+
+Uso:
+    python scripts/download_boundaries.py [--workers 4] [--page-size 2000] [--refresh]
 """
 
-import geopandas as gpd
-import pandas as pd
+import argparse
+import json
 import os
 import sys
-import requests
-import json
+
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # Obter o diretório do script e ir para a raiz do projeto
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 os.chdir(project_root)
+sys.path.insert(0, script_dir)
 
-print("🌐 Baixando boundaries das MSOAs do Reino Unido...")
-print("⏳ Isso pode levar alguns minutos dependendo da sua conexão...\n")
+from arcgis_pages import LayerPager, PageError  # noqa: E402
 
 # URL do ONS - Boundaries simplificadas das MSOAs 2021
 # Fonte: ONS Open Geography Portal - versão generalizada (BGC - generalized clipped)
 # Esta versão é menor e mais rápida de baixar
-url = "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/MSOA_Dec_2021_Boundaries_Generalised_Clipped_EW_BGC_2022/FeatureServer/0/query?where=1%3D1&outFields=*&outSR=4326&f=geojson"
-
-try:
-    # Baixar e ler o GeoJSON usando requests primeiro
-    print("📥 Baixando dados do ONS Open Geography Portal...")
-    print("📊 Fonte: MSOA December 2021 Boundaries (Generalised Clipped)")
-    print("⏳ Aguarde, este arquivo pode ser grande...\n")
-    
-    response = requests.get(url, timeout=120)
-    response.raise_for_status()
-    
-    print("✅ Dados baixados com sucesso!")
-    print("📦 Processando GeoJSON...\n")
-    
-    geojson_data = response.json()
-    gdf = gpd.GeoDataFrame.from_features(geojson_data['features'], crs='EPSG:4326')
-    
-    print(f"✅ Dados baixados: {len(gdf)} áreas")
-    print(f"📊 Colunas disponíveis: {gdf.columns.tolist()}\n")
-    
-    # Verificar e ajustar nomes das colunas para MSOA 2021
-    # As colunas do ONS 2021 usam MSOA21CD e MSOA21NM
-    if "MSOA21CD" in gdf.columns:
-        gdf["code"] = gdf["MSOA21CD"]
-    elif "MSOA11CD" in gdf.columns:
-        gdf["code"] = gdf["MSOA11CD"]
-    elif "msoa21cd" in gdf.columns:
-        gdf["code"] = gdf["msoa21cd"]
-    elif "msoa11cd" in gdf.columns:
-        gdf["code"] = gdf["msoa11cd"]
-    elif "code" in gdf.columns:
-        pass  # já existe
-    else:
-        print("⚠️  Coluna de código não encontrada. Colunas disponíveis:", gdf.columns.tolist())
+ONS_LAYER_URL = ("https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/"
+                 "MSOA_Dec_2021_Boundaries_Generalised_Clipped_EW_BGC_2022/FeatureServer/0")
+
+parser = argparse.ArgumentParser(description="Boundaries e centróides das MSOAs (ONS)")
+parser.add_argument("--base-url", default=ONS_LAYER_URL, help="URL da camada FeatureServer (…/FeatureServer/0)")
+parser.add_argument("--workers", type=int, default=4, help="páginas baixadas em paralelo")
+parser.add_argument("--page-size", type=int, default=None, help="registros por página (padrão: maxRecordCount)")
+parser.add_argument("--cache-dir", default="data/interim/cache/boundaries", help="cache das páginas baixadas")
+parser.add_argument("--refresh", action="store_true", help="ignora o cache e baixa tudo de novo")
+parser.add_argument("--out-dir", default="data/lookup")
+args = parser.parse_args()
+
+boundaries_path = os.path.join(args.out_dir, "boundaries.geojson")
+parquet_path = os.path.join(args.out_dir, "boundaries.parquet")
+out_csv = os.path.join(args.out_dir, "areas_centroids.csv")
+
+# Colunas de código/nome das MSOAs, em ordem de preferência (2021 antes de 2011)
+CODE_COLUMNS = ["MSOA21CD", "MSOA11CD", "msoa21cd", "msoa11cd", "code"]
+NAME_COLUMNS = ["MSOA21NM", "MSOA11NM", "msoa21nm", "msoa11nm", "name"]
+
+# Metadados GeoParquet 1.0: sem "crs" o padrão é OGC:CRS84 (lon/lat, igual ao outSR=4326);
+# geometry_types vazio = tipos não declarados (--base-url pode apontar para outra camada)
+GEO_METADATA = {"version": "1.0.0", "primary_column": "geometry",
+                "columns": {"geometry": {"encoding": "WKB", "geometry_types": []}}}
+PARQUET_SCHEMA = pa.schema([("code", pa.string()), ("name", pa.string()), ("geometry", pa.binary())],
+                           metadata={"geo": json.dumps(GEO_METADATA)})
+
+
+def pick_columns(columns):
+    """(coluna de código, coluna de nome) da camada; o nome cai para o código se faltar."""
+    code_col = next((c for c in CODE_COLUMNS if c in columns), None)
+    if code_col is None:
+        print("⚠️  Coluna de código não encontrada. Colunas disponíveis:", list(columns))
         # Tentar usar a primeira coluna que pareça ser um código
-        for col in gdf.columns:
-            if 'cd' in col.lower() or 'code' in col.lower():
-                gdf["code"] = gdf[col]
-                break
-    
-    if "MSOA21NM" in gdf.columns:
-        gdf["name"] = gdf["MSOA21NM"]
-    elif "MSOA11NM" in gdf.columns:
-        gdf["name"] = gdf["MSOA11NM"]
-    elif "msoa21nm" in gdf.columns:
-        gdf["name"] = gdf["msoa21nm"]
-    elif "msoa11nm" in gdf.columns:
-        gdf["name"] = gdf["msoa11nm"]
-    elif "name" in gdf.columns:
-        pass  # já existe
-    else:
+        code_col = next((c for c in columns if 'cd' in c.lower() or 'code' in c.lower()), None)
+        if code_col is None:
+            raise KeyError("nenhuma coluna de código na camada")
+    name_col = next((c for c in NAME_COLUMNS if c in columns), None)
+    if name_col is None:
         print("⚠️  Coluna de nome não encontrada")
-        gdf["name"] = gdf["code"] if "code" in gdf.columns else "Unknown"
-    
-    # Garantir que está em WGS84 (EPSG:4326)
-    if gdf.crs != "EPSG:4326":
-        print("🔄 Convertendo para WGS84 (EPSG:4326)...")
-        gdf = gdf.to_crs(4326)
-    
-    # Salvar o GeoJSON completo
-    boundaries_path = "data/lookup/boundaries.geojson"
-    os.makedirs(os.path.dirname(boundaries_path), exist_ok=True)
-    
-    print("💾 Salvando boundaries...")
-    gdf[["code", "name", "geometry"]].to_file(boundaries_path, driver="GeoJSON")
-    print(f"✅ Boundaries salvos em: {boundaries_path}")
-    
-    # Calcular centróides
-    print("\n📍 Calculando centróides...")
-    cent = gdf.copy()
-    cent["lon"] = cent.geometry.centroid.x
-    cent["lat"] = cent.geometry.centroid.y
-    
-    # Salvar CSV com centróides
-    out_csv = "data/lookup/areas_centroids.csv"
-    out = cent[["code", "name", "lat", "lon"]].drop_duplicates()
-    out.to_csv(out_csv, index=False)
-    
-    print(f"✅ Centróides salvos em: {out_csv}")
-    print(f"📊 Total de áreas: {len(out)}")
-    
-    # Mostrar alguns exemplos
-    print("\n📋 Exemplos de centróides:")
-    print(out.head(10).to_string(index=False))
-    
-    print("\n✅ Processo concluído com sucesso!")
-    print("💡 Agora você pode executar o script 03_make_flows_geojson.py")
-    
-except Exception as e:
-    print(f"\n❌ Erro ao baixar/processar dados: {e}")
-    print("\n💡 Alternativas:")
-    print("   1. Verificar sua conexão com a internet")
-    print("   2. Baixar manualmente de: https://geoportal.statistics.gov.uk/")
-    print("   3. Usar arquivo de lookup existente com coordenadas")
-    sys.exit(1)
+        name_col = code_col
+    return code_col, name_col
+
+
+def progress(done, total):
+    print(f"\r   📄 {done}/{total} páginas", end="", flush=True)
+
+
+print("🌐 Baixando boundaries das MSOAs do Reino Unido...")
+print("📊 Fonte: MSOA December 2021 Boundaries (Generalised Clipped)")
+print(f"🔗 {args.base_url}\n")
+
+with LayerPager(args.base_url, args.cache_dir, workers=args.workers, page_size=args.page_size,
+                refresh=args.refresh) as pager:
+    print(f"📥 {pager.count:,} áreas em {len(pager.offsets)} páginas de até {pager.page_size} "
+          f"({args.workers} em paralelo; cache: {pager.cache_dir})")
+    try:
+        fetched, cached = pager.download(progress)
+    except PageError:
+        # O erro (com o offset da página) segue adiante; as páginas já baixadas ficam no cache
+        print("\n❌ Download interrompido; rode de novo para retomar (só as páginas que faltam)")
+        raise
+    print(f"\n✅ Download concluído: {fetched} páginas baixadas, {cached} reaproveitadas do cache\n")
+
+# Conversão em streaming: uma página por vez vira um row group do GeoParquet,
+# um trecho do GeoJSON e as linhas do CSV de centróides
+print("📦 Convertendo páginas (GeoParquet, GeoJSON e centróides)...")
+os.makedirs(args.out_dir, exist_ok=True)
+code_col = name_col = None
+seen = set()
+total = 0
+with pq.ParquetWriter(parquet_path + ".tmp", PARQUET_SCHEMA, compression="zstd") as parquet, \
+        open(boundaries_path + ".tmp", "w") as geojson, open(out_csv + ".tmp", "w") as centroids:
+    geojson.write('{\n"type": "FeatureCollection",\n'
+                  '"crs": { "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } },\n'
+                  '"features": [\n')
+    centroids.write("code,name,lat,lon\n")
+    for features in pager.pages():
+        gdf = gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
+        if code_col is None:
+            code_col, name_col = pick_columns(gdf.columns)
+            print(f"📊 Colunas: código = {code_col}, nome = {name_col}")
+        codes = gdf[code_col].astype(str)
+        names = gdf[name_col].astype(str)
+
+        parquet.write_table(pa.table({
+            "code": pa.array(codes, type=pa.string()),
+            "name": pa.array(names, type=pa.string()),
+            "geometry": pa.array(gdf.geometry.to_wkb(), type=pa.binary()),
+        }, schema=PARQUET_SCHEMA))
+
+        for code, name, feature in zip(codes, names, features):
+            geojson.write(",\n" if total else "")
+            geojson.write(json.dumps({"type": "Feature", "properties": {"code": code, "name": name},
+                                      "geometry": feature["geometry"]}, ensure_ascii=False))
+            total += 1
+
+        # Centróides (um por código, como o drop_duplicates de antes)
+        cent = gdf.geometry.centroid
+        out = gdf.assign(code=codes, name=names, lat=cent.y, lon=cent.x)[["code", "name", "lat", "lon"]]
+        out = out[~out["code"].isin(seen)].drop_duplicates("code")
+        seen.update(out["code"])
+        out.to_csv(centroids, header=False, index=False)
+    geojson.write("\n]\n}\n")
+for path in (parquet_path, boundaries_path, out_csv):
+    os.replace(path + ".tmp", path)
+
+print(f"✅ Boundaries salvos em: {boundaries_path} e {parquet_path} (GeoParquet)")
+print(f"✅ Centróides salvos em: {out_csv}")
+print(f"📊 Total de áreas: {len(seen)} ({total} geometrias)")
+
+print("\n✅ Processo concluído com sucesso!")
+print("💡 Agora você pode executar o script 03_make_flows_geojson.py")
@@ -0,0 +1,329 @@
+"""
+Tabela base de fluxos compartilhada pelos scripts de exportação de GeoJSON.
+
+Carrega o parquet uma única vez, troca o merge com os centróides por ids
+(busca binária nos códigos do lookup), remove pares sem centróide ou com
+origem = destino e ordena tudo por contagem decrescente uma única vez.
+Um cenário vira só uma máscara sobre essa ordem: o top-N é um prefixo.
+
+Diferenças em relação ao merge antigo em pandas:
+- códigos repetidos no lookup ficam só com a primeira linha (o merge
+  duplicava os fluxos dessas áreas, um por linha repetida);
+- os filtros continuam aceitando qualquer coluna: as de texto e a contagem
+  vêm da tabela base; as outras do parquet ou do lookup (o_/d_ + coluna,
+  com code/name como code_area/area_name, como no merge) são lidas sob
+  demanda, só quando algum cenário filtra por elas.
+
+O GeoJSON é escrito direto em texto, no mesmo layout do driver GeoJSON do
+GDAL (gpd.to_file): mesmas chaves, espaçamento, CRS84 e coordenadas com 15
+casas decimais sem zeros à direita. Cada coordenada/nome é formatado uma vez
+por área, não por linha.
+
+A tabela base já preparada pode ser guardada num cache Arrow IPC (chaveado
+pelo conteúdo do parquet/lookup/colunas) e reaberta via memory-map pelos
+outros scripts do pipeline, sem refazer a leitura e o "merge". Só as
+CACHE_KEEP chaves usadas mais recentemente ficam no diretório.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CACHE_KEEP = 2  # tabelas base (chaves) mantidas no cache; as mais antigas são apagadas
+COUNT_BINS = [0, 10, 50, 100, 500, 1000, 5000, 100000]
+# Rótulos idênticos aos de pd.cut(..., include_lowest=True) convertidos para texto
+COUNT_BIN_LABELS = pd.cut([], bins=COUNT_BINS, include_lowest=True).categories.astype(str).tolist()
+
+
+def format_coord(value):
+    """Formato de coordenada do GDAL: %.15f sem zeros à direita."""
+    text = f"{value:.15f}".rstrip("0")
+    return text + "0" if text.endswith(".") else text
+
+
+def json_str(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return "null"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prune_cache(cache_dir, keep=CACHE_KEEP):
+    """Apaga as tabelas base além das `keep` usadas mais recentemente.
+
+    Só toca nos arquivos base_flows-*/base_areas-*; quem ainda tiver um
+    deles mapeado em memória continua lendo (o unlink não invalida o mmap).
+    """
+    entries = {}
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith("base_flows-") and entry.name.endswith(".arrow"):
+            key = entry.name[len("base_flows-"):-len(".arrow")]
+            entries[key] = entry.stat().st_mtime
+    for key in sorted(entries, key=entries.get, reverse=True)[keep:]:
+        for prefix in ("base_flows", "base_areas"):
+            try:
+                os.remove(os.path.join(cache_dir, f"{prefix}-{key}.arrow"))
+            except FileNotFoundError:
+                pass
+
+
+class TextColumn:
+    """Coluna de texto dicionarizada: índices por linha + JSON pré-codificado."""
+
+    def __init__(self, array):
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks() if array.num_chunks != 1 else array.chunk(0)
+        self.values = array.dictionary.to_numpy(zero_copy_only=False)
+        self.indices = array.indices.to_numpy()
+        self.json = [json_str(v) for v in self.values]
+
+    def to_arrow(self):
+        return pa.DictionaryArray.from_arrays(pa.array(self.indices), pa.array(self.values, type=pa.string()))
+
+    def take(self, mask):
+        self.indices = self.indices[mask]
+
+    def equals(self, value):
+        matches = np.flatnonzero(self.values == value)
+        if len(matches) == 0:
+            return np.zeros(len(self.indices), dtype=bool)
+        return np.isin(self.indices, matches)
+
+
+class BaseFlows:
+    """Fluxos válidos para o mapa, já ordenados por contagem decrescente."""
+
+    def __init__(self, parquet_path, lookup_path, cols):
+        self.cols = cols
+        self.parquet_path, self.lookup_path = parquet_path, lookup_path
+        self._extra = {}
+        text_cols = [cols["origin_code"], cols["origin_name"], cols["dest_code"], cols["dest_name"]]
+        table = pq.read_table(parquet_path, columns=text_cols + [cols["count"]], read_dictionary=text_cols)
+        self.total_rows = table.num_rows
+        self.text = {c: TextColumn(table.column(c)) for c in text_cols}
+        self.counts = table.column(cols["count"]).to_numpy()
+        self.source_rows = np.arange(table.num_rows)  # linha do parquet (filtros por outras colunas)
+
+        # Centróides (float64, exatamente como o merge antigo via pd.read_csv)
+        lut = self._lookup_frame(lookup_path)
+        self.area_codes = lut["code"].to_numpy().astype(str)
+        self.area_lat = lut["lat"].to_numpy(dtype=np.float64)
+        self.area_lon = lut["lon"].to_numpy(dtype=np.float64)
+        self.n_areas = len(lut)
+
+        # "merge" por busca binária: id da área de origem/destino de cada linha
+        origin_ids = self._area_ids(self.text[cols["origin_code"]])
+        dest_ids = self._area_ids(self.text[cols["dest_code"]])
+        has_coords = np.isfinite(self.area_lat) & np.isfinite(self.area_lon)
+        valid = (origin_ids >= 0) & (dest_ids >= 0)
+        valid[valid] = has_coords[origin_ids[valid]] & has_coords[dest_ids[valid]]
+        self.dropped_no_centroid = int((~valid).sum())
+        self._take(valid, origin_ids, dest_ids)
+
+        # Remove fluxos onde origem = destino (não aparecem no mapa)
+        same = ((self.area_lat[self.origin_ids] == self.area_lat[self.dest_ids])
+                & (self.area_lon[self.origin_ids] == self.area_lon[self.dest_ids]))
+        self.dropped_same_location = int(same.sum())
+        self._take(~same, self.origin_ids, self.dest_ids)
+
+        # Uma única ordenação (estável) por contagem decrescente
+        order = np.argsort(-self.counts.astype(np.int64), kind="stable")
+        self._take(order, self.origin_ids, self.dest_ids)
+        self._coord_json = None
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def load(cls, parquet_path, lookup_path, cols, cache_dir=None):
+        """Como o construtor, mas reaproveita o cache Arrow em `cache_dir` se existir."""
+        if cache_dir is None:
+            return cls(parquet_path, lookup_path, cols)
+        key = hashlib.sha256(json.dumps({
+            "parquet": file_sha256(parquet_path),
+            "lookup": file_sha256(lookup_path),
+            "cols": cols,
+            "version": 2,
+        }, sort_keys=True).encode()).hexdigest()[:16]
+        flows_path = os.path.join(cache_dir, f"base_flows-{key}.arrow")
+        areas_path = os.path.join(cache_dir, f"base_areas-{key}.arrow")
+        if os.path.exists(flows_path) and os.path.exists(areas_path):
+            for path in (flows_path, areas_path):
+                os.utime(path)  # mtime = último uso (ver prune_cache)
+            base = cls._from_cache(flows_path, areas_path, cols)
+            base.parquet_path, base.lookup_path = parquet_path, lookup_path
+            return base
+        base = cls(parquet_path, lookup_path, cols)
+        os.makedirs(cache_dir, exist_ok=True)
+        base._save_cache(flows_path, areas_path)
+        prune_cache(cache_dir)
+        return base
+
+    def _save_cache(self, flows_path, areas_path):
+        meta = {"total_rows": str(self.total_rows),
+                "dropped_no_centroid": str(self.dropped_no_centroid),
+                "dropped_same_location": str(self.dropped_same_location)}
+        flows = pa.table({
+            "origin_id": self.origin_ids, "dest_id": self.dest_ids, "count": self.counts,
+            "source_row": self.source_rows,
+            **{name: column.to_arrow() for name, column in self.text.items()},
+        }).replace_schema_metadata(meta)
+        areas = pa.table({"code": self.area_codes, "lat": self.area_lat, "lon": self.area_lon})
+        for table, path in ((flows, flows_path), (areas, areas_path)):
+            tmp_path = f"{path}.{os.getpid()}.tmp"  # vários scripts podem gravar ao mesmo tempo
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def _from_cache(cls, flows_path, areas_path, cols):
+        base = cls.__new__(cls)
+        base.cols = cols
+        base._extra = {}
+        flows = pa.ipc.open_file(pa.memory_map(flows_path)).read_all()
+        areas = pa.ipc.open_file(pa.memory_map(areas_path)).read_all()
+        meta = {k.decode(): int(v) for k, v in flows.schema.metadata.items()}
+        base.total_rows = meta["total_rows"]
+        base.dropped_no_centroid = meta["dropped_no_centroid"]
+        base.dropped_same_location = meta["dropped_same_location"]
+        base.origin_ids = flows.column("origin_id").to_numpy()
+        base.dest_ids = flows.column("dest_id").to_numpy()
+        base.counts = flows.column("count").to_numpy()
+        base.source_rows = flows.column("source_row").to_numpy()
+        text_cols = [cols["origin_code"], cols["origin_name"], cols["dest_code"], cols["dest_name"]]
+        base.text = {c: TextColumn(flows.column(c)) for c in text_cols}
+        base.area_codes = areas.column("code").to_numpy().astype(str)
+        base.area_lat = areas.column("lat").to_numpy()
+        base.area_lon = areas.column("lon").to_numpy()
+        base.n_areas = len(base.area_codes)
+        base._coord_json = None
+        return base
+
+    @staticmethod
+    def _lookup_frame(lookup_path):
+        """Lookup ordenado por código; código repetido fica com a primeira linha."""
+        lut = pd.read_csv(lookup_path, dtype={"code": "string"})
+        return lut.drop_duplicates(subset=["code"]).sort_values("code")
+
+    def column(self, name):
+        """Valores de uma coluna qualquer na ordem da tabela base (lidos uma vez).
+
+        Aceita as colunas do parquet e as do lookup com o prefixo do lado
+        (o_/d_), nos nomes do merge antigo (code_area, area_name, lat, ...).
+        """
+        if name not in self._extra:
+            if name in pq.read_schema(self.parquet_path).names:
+                values = pq.read_table(self.parquet_path, columns=[name]).column(name)
+                values = values.to_numpy()[self.source_rows]
+            elif name[:2] in ("o_", "d_"):
+                lut = self._lookup_frame(self.lookup_path).rename(columns={"code": "code_area", "name": "area_name"})
+                if name[2:] not in lut.columns:
+                    raise KeyError(f"coluna de filtro desconhecida: {name}")
+                area_ids = self.origin_ids if name[:2] == "o_" else self.dest_ids
+                values = lut[name[2:]].to_numpy()[area_ids]
+            else:
+                raise KeyError(f"coluna de filtro desconhecida: {name}")
+            self._extra[name] = values
+        return self._extra[name]
+
+    def _area_ids(self, column):
+        codes = column.values.astype(str)
+        pos = np.minimum(np.searchsorted(self.area_codes, codes), len(self.area_codes) - 1)
+        dict_ids = np.where(self.area_codes[pos] == codes, pos, -1)
+        return dict_ids[column.indices]
+
+    def _take(self, selector, origin_ids, dest_ids):
+        self.origin_ids = origin_ids[selector]
+        self.dest_ids = dest_ids[selector]
+        self.counts = self.counts[selector]
+        self.source_rows = self.source_rows[selector]
+        for column in self.text.values():
+            column.take(selector)
+
+    def mask(self, flt):
+        """Máscara (na ordem por contagem) para um filtro {coluna: valor}."""
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in (flt or {}).items():
+            if key in self.text:
+                mask &= self.text[key].equals(value)
+            elif key == self.cols["count"]:
+                mask &= self.counts == value
+            else:
+                mask &= self.column(key) == value
+        return mask
+
+    def top_rows(self, flt=None, top_n=None, mask=None):
+        """Top-N do filtro: prefixo das posições que passam (já estão ordenadas)."""
+        rows = np.flatnonzero(self.mask(flt) if mask is None else mask)
+        return rows if top_n is None else rows[:top_n]
+
+    def grouped_top_rows(self, area_group, n_groups, top_n, by="dest"):
+        """Top-N de cada grupo de áreas (pela origem ou pelo destino) numa passada.
+
+        `area_group` dá o grupo de cada área (-1 = sem grupo). Uma ordenação
+        estável pelo grupo mantém a ordem por contagem dentro de cada grupo,
+        então o top-N de cada um é o começo do seu trecho. Retorna a lista de
+        linhas por grupo, o total de linhas e a soma das contagens por grupo.
+        """
+        area_ids = self.dest_ids if by == "dest" else self.origin_ids
+        groups = np.asarray(area_group)[area_ids]
+        order = np.argsort(groups, kind="stable")
+        starts = np.searchsorted(groups[order], np.arange(n_groups + 1))
+        rows = [order[a:min(b, a + top_n)] for a, b in zip(starts[:-1], starts[1:])]
+        valid = groups >= 0
+        matched = np.bincount(groups[valid], minlength=n_groups)
+        volume = np.bincount(groups[valid], weights=self.counts[valid], minlength=n_groups)
+        return rows, matched, volume
+
+    def coord_json(self):
+        """Trecho "[ lon, lat ]" de cada área, formatado uma única vez."""
+        if self._coord_json is None:
+            self._coord_json = [f"[ {format_coord(lon)}, {format_coord(lat)} ]"
+                                for lon, lat in zip(self.area_lon.tolist(), self.area_lat.tolist())]
+        return self._coord_json
+
+    def count_bins(self, counts):
+        """Equivalente vetorizado do pd.cut(..., include_lowest=True): índice do bin ou -1."""
+        idx = np.searchsorted(COUNT_BINS, counts, side="left")
+        idx = np.where(counts == COUNT_BINS[0], 1, idx) - 1
+        return np.where((counts < COUNT_BINS[0]) | (idx >= len(COUNT_BIN_LABELS)), -1, idx)
+
+    def write_geojson(self, rows, out_path, name):
+        """Grava as linhas selecionadas no layout do driver GeoJSON do GDAL."""
+        cols = self.cols
+        coords = self.coord_json()
+        oc, on = self.text[cols["origin_code"]], self.text[cols["origin_name"]]
+        dc, dn = self.text[cols["dest_code"]], self.text[cols["dest_name"]]
+        counts = self.counts[rows]
+        bins = [json_str(COUNT_BIN_LABELS[b]) if b >= 0 else "null" for b in self.count_bins(counts).tolist()]
+        features = [
+            f'{{ "type": "Feature", "properties": {{ "{cols["origin_code"]}": {oc.json[a]}, '
+            f'"{cols["origin_name"]}": {on.json[b]}, "{cols["dest_code"]}": {dc.json[c]}, '
+            f'"{cols["dest_name"]}": {dn.json[d]}, "{cols["count"]}": {n}, "count_bin": {cb} }}, '
+            f'"geometry": {{ "type": "LineString", "coordinates": [ {coords[o]}, {coords[t]} ] }} }}'
+            for a, b, c, d, n, cb, o, t in zip(
+                oc.indices[rows].tolist(), on.indices[rows].tolist(),
+                dc.indices[rows].tolist(), dn.indices[rows].tolist(),
+                counts.tolist(), bins,
+                self.origin_ids[rows].tolist(), self.dest_ids[rows].tolist(),
+            )
+        ]
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write('{\n"type": "FeatureCollection",\n')
+            f.write(f'"name": {json_str(name)},\n')
+            f.write('"crs": { "type": "name", "properties": { "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } },\n')
+            f.write('"features": [\n')
+            f.write(",\n".join(features))
+            f.write("\n]\n}\n")
+        return len(features)
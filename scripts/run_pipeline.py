@@ -0,0 +1,252 @@
+"""
+Runner incremental do pipeline de dados (scripts 01 → 06)
+
+Cada etapa declara entradas, saídas, o trecho do config.yaml que usa e os
+arquivos de código de que depende. O runner calcula um hash de conteúdo de
+tudo isso e só roda as etapas cujo hash mudou (ou cujas saídas sumiram).
+Etapas independentes rodam em paralelo. Cada cenário de
+export.scenarios é uma etapa própria: mudar um cenário no config.yaml
+regenera só o GeoJSON daquele cenário.
+
+O estado é gravado a cada etapa concluída: se a etapa N falhar, as etapas
+1..N-1 continuam registradas e não rodam de novo.
+
+A tabela base (fluxos + centróides) fica num cache Arrow compartilhado
+(data/interim/cache) usado por todas as etapas de exportação.
+
+Uso:
+    python scripts/run_pipeline.py [--dry-run] [--jobs 4] [--force etapa ...] [--only etapa ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import yaml
+
+# Obter o diretório do script e ir para a raiz do projeto
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+
+STATE_PATH = "data/interim/.pipeline_state.json"
+CACHE_DIR = "data/interim/cache"
+LOG_DIR = "data/interim/logs"
+API_CODE = ["api/areas.py", "api/flow_index.py", "api/index_file.py", "api/serializers.py", "api/ltla.py"]
+
+
+class Stage:
+    def __init__(self, name, cmd, inputs, outputs, config=None, code=()):
+        self.name = name
+        self.cmd = cmd
+        self.inputs = inputs
+        self.outputs = outputs
+        self.config = config or {}
+        self.code = [cmd[0], *code]
+        self.deps = set()
+
+
+def build_stages(cfg):
+    """Etapas do pipeline; o `config` de cada uma é tudo o que o script lê do config.yaml."""
+    paths, cols = cfg["paths"], cfg["columns"]
+    parquet, lookup = paths["parquet"], paths["lookup_areas"]
+    datasets = cfg.get("datasets", {})
+    stages = [
+        Stage("csv_to_parquet", ["scripts/01_csv_to_parquet.py"],
+              [paths["raw_csv"]], [parquet], {"paths": paths, "datasets": datasets}, ["api/od_datasets.py"]),
+        # 02 não lê o config.yaml (caminhos fixos no código, que já entra no hash)
+        Stage("centroids", ["scripts/02_build_centroids.py"],
+              ["data/lookup/msoa_centroids.geojson", parquet], [lookup],
+              {"paths": {"centroids": "data/lookup/msoa_centroids.geojson", "parquet": parquet, "lookup": lookup}}),
+        Stage("flow_index", ["scripts/build_flow_index.py"],
+              [parquet, lookup], [paths["flow_index"]], {"paths": paths}, API_CODE),
+        Stage("msoa_ltla", ["scripts/assign_msoa_ltla.py"],
+              [lookup, paths["ltla_lookup"], paths["ltla_boundaries"]], [paths["msoa_ltla"], paths["regions"]],
+              {"paths": paths, "regions": cfg.get("regions", {})}),
+        Stage("region_flows", ["scripts/04_region_flows.py", "--cache-dir", CACHE_DIR],
+              [parquet, lookup, paths["msoa_ltla"], paths["regions"]],
+              [os.path.join(cfg["region_flows"]["out_dir"], "index.json"),
+               *(legacy["file"] for legacy in cfg["region_flows"].get("legacy_files", []))],
+              {"paths": paths, "columns": cols, "regions": cfg.get("regions", {}),
+               "region_flows": cfg["region_flows"]}, ["scripts/flow_base.py"]),
+        Stage("ltla", ["scripts/06_aggregate_flows_by_ltla.py"],
+              [parquet, paths["ltla_lookup"], paths["ltla_centroids"]],
+              [paths["ltla_od"], paths["ltla_index"], paths["ltla_geojson"]], {"paths": paths}, API_CODE),
+        Stage("area_stats", ["scripts/build_area_stats.py"],
+              [parquet, lookup, paths["ltla_lookup"], paths["ltla_centroids"], paths["flow_index"],
+               paths["ltla_index"]],
+              [paths["area_stats"], paths["ltla_area_stats"]], {"paths": paths}, [*API_CODE, "api/area_stats.py"]),
+        Stage("network", ["scripts/09_network_analytics.py"],
+              [parquet, lookup, paths["flow_index"]],
+              [os.path.join(cfg["network"]["out_dir"], "summary.json")], {"paths": paths, "network": cfg["network"]},
+              [*API_CODE, "api/od_graph.py"]),
+        Stage("similar_areas", ["scripts/build_similar_areas.py"],
+              [parquet, lookup, paths["flow_index"]], [paths["similar_areas"]], {"paths": paths},
+              [*API_CODE, "api/od_graph.py", "api/similarity.py"]),
+        Stage("vector_tiles", ["scripts/08_build_vector_tiles.py"],
+              [parquet, lookup, paths["ltla_boundaries"]], [paths["tiles"]],
+              {"paths": paths, "tiles": cfg["tiles"]},
+              ["api/flow_index.py", "api/areas.py", "api/vector_tiles.py", "api/tile_archive.py"]),
+    ]
+    # Outros conjuntos OD (datasets.releases): parquet + índice, só se o CSV estiver presente
+    for name, ds in datasets.get("releases", {}).items():
+        if name == datasets.get("default") or not os.path.exists(ds["raw_csv"]):
+            continue
+        stages.append(Stage(f"csv_to_parquet:{name}", ["scripts/01_csv_to_parquet.py", "--dataset", name],
+                            [ds["raw_csv"]], [ds["parquet"]], {"paths": paths, "datasets": datasets},
+                            ["api/od_datasets.py"]))
+        stages.append(Stage(f"flow_index:{name}", ["scripts/build_flow_index.py", "--dataset", name],
+                            [ds["parquet"], lookup], [ds["flow_index"]], {"paths": paths, "dataset": ds}, API_CODE))
+    for sc in cfg["export"]["scenarios"]:
+        stages.append(Stage(
+            f"scenario:{sc['name']}",
+            ["scripts/03_make_flows_geojson.py", "--only", sc["name"], "--jobs", "1", "--cache-dir", CACHE_DIR],
+            [parquet, lookup], [os.path.join(paths["processed_dir"], f"{sc['name']}.geojson")],
+            {"paths": paths, "scenario": sc, "columns": cols}, ["scripts/flow_base.py"],
+        ))
+
+    # Dependências: quem produz alguma das minhas entradas
+    producers = {out: st.name for st in stages for out in st.outputs}
+    for st in stages:
+        st.deps = {producers[i] for i in st.inputs if i in producers and producers[i] != st.name}
+    return {st.name: st for st in stages}
+
+
+class Hasher:
+    """sha256 de arquivos, memorizado por (tamanho, mtime) no arquivo de estado."""
+
+    def __init__(self, memo):
+        self.memo = memo
+
+    def file(self, path):
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        key = f"{st.st_size}:{st.st_mtime_ns}"
+        cached = self.memo.get(path)
+        if cached and cached["key"] == key:
+            return cached["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self.memo[path] = {"key": key, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def stage(self, st):
+        payload = {
+            "cmd": st.cmd,
+            "inputs": {p: self.file(p) for p in st.inputs},
+            "code": {p: self.file(p) for p in st.code},
+            "config": st.config,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def save_state(state):
+    """Grava o estado (atômico): chamado a cada etapa concluída, não só no fim."""
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def run_stage(st):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, st.name.replace(":", "_") + ".log")
+    t0 = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.run([sys.executable, *st.cmd], stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.perf_counter() - t0, log_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runner incremental do pipeline")
+    parser.add_argument("--jobs", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--dry-run", action="store_true", help="só mostra o que rodaria")
+    parser.add_argument("--force", nargs="*", default=[], help="etapas para rodar mesmo atualizadas")
+    parser.add_argument("--only", nargs="*", default=None, help="limita às etapas indicadas")
+    args = parser.parse_args()
+
+    cfg = yaml.safe_load(open("config.yaml"))
+    stages = build_stages(cfg)
+    if args.only is not None:
+        stages = {n: st for n, st in stages.items() if n in args.only}
+        for st in stages.values():
+            st.deps &= set(stages)
+
+    state = {"stages": {}, "files": {}}
+    if os.path.exists(STATE_PATH):
+        state = json.load(open(STATE_PATH))
+    hasher = Hasher(state.setdefault("files", {}))
+
+    print("=" * 70)
+    print(f"🔁 PIPELINE INCREMENTAL ({len(stages)} etapas, {args.jobs} em paralelo)")
+    print("=" * 70)
+
+    done, failed, running = set(), set(), {}
+    pending = dict(stages)
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while pending or running:
+            for name, st in list(pending.items()):
+                if st.deps & failed:
+                    print(f"⏭️  {name}: pulada (dependência falhou)")
+                    failed.add(name)
+                    del pending[name]
+                    continue
+                if not st.deps <= done:
+                    continue
+                del pending[name]
+                digest = hasher.stage(st)
+                outputs_ok = all(os.path.exists(o) for o in st.outputs)
+                missing = [i for i in st.inputs if not os.path.exists(i)]
+                if outputs_ok and (state["stages"].get(name) == digest or missing) and name not in args.force:
+                    print(f"✅ {name}: atualizada" + (" (entradas ausentes, mantendo saídas)" if missing else ""))
+                    done.add(name)
+                elif missing:
+                    print(f"❌ {name}: entradas ausentes: {', '.join(missing)}")
+                    failed.add(name)
+                elif args.dry_run:
+                    print(f"🔸 {name}: rodaria {' '.join(st.cmd)}")
+                    done.add(name)
+                else:
+                    print(f"🚀 {name}: rodando...")
+                    running[pool.submit(run_stage, st)] = (name, st, digest)
+
+            if not running:
+                if pending and not any(st.deps <= done | failed for st in pending.values()):
+                    raise SystemExit("❌ Dependências circulares entre etapas")
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, st, digest = running.pop(future)
+                code, elapsed, log_path = future.result()
+                if code == 0:
+                    # Hash das entradas como estavam ao iniciar a etapa: se mudarem
+                    # durante a execução, a próxima rodada refaz a etapa
+                    state["stages"][name] = digest
+                    for out in st.outputs:
+                        hasher.file(out)
+                    save_state(state)
+                    done.add(name)
+                    print(f"✅ {name}: concluída em {elapsed:.1f}s")
+                else:
+                    failed.add(name)
+                    print(f"❌ {name}: falhou (código {code}), log em {log_path}")
+
+    if not args.dry_run:
+        save_state(state)
+
+    print("\n" + "=" * 70)
+    print(f"{'🎉 PIPELINE COMPLETO!' if not failed else f'⚠️  {len(failed)} etapa(s) com falha'}")
+    print("=" * 70)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
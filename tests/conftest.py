@@ -0,0 +1,44 @@
+"""
+Configuração comum dos testes: os módulos da API e os auxiliares dos scripts
+são importados "planos", como fazem os próprios scripts (sys.path).
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("api", "scripts"):
+    path = os.path.join(project_root, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+CODES = [f"E0200{i:04d}" for i in range(12)]
+UNKNOWN = "E02099999"  # no parquet, mas sem centróide no lookup
+
+
+@pytest.fixture(scope="session")
+def od_files(tmp_path_factory):
+    """Parquet + lookup pequenos (empates, fluxos internos, código sem centróide) e o
+    DataFrame esperado depois do merge com os centróides (caminho antigo em pandas)."""
+    rng = np.random.default_rng(7)
+    pairs = [(o, d) for o in CODES + [UNKNOWN] for d in CODES + [UNKNOWN] if rng.random() < 0.6]
+    df = pd.DataFrame(pairs, columns=["origin_code", "dest_code"])
+    df["origin_name"] = df["origin_code"] + " nome"
+    df["dest_name"] = df["dest_code"] + " nome"
+    df["count"] = rng.choice([1, 2, 3, 5, 5, 8, 13], size=len(df)).astype("int32")  # muitos empates
+    df = df[["origin_code", "origin_name", "dest_code", "dest_name", "count"]]
+
+    root = tmp_path_factory.mktemp("od")
+    parquet_path, lookup_path = str(root / "od.parquet"), str(root / "lookup.csv")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), parquet_path)
+    lookup = pd.DataFrame({"code": CODES[::-1], "name": CODES[::-1],
+                           "lat": np.linspace(50, 55, len(CODES)), "lon": np.linspace(-3, 1, len(CODES))})
+    lookup.to_csv(lookup_path, index=False)
+
+    known = df[df["origin_code"].isin(CODES) & df["dest_code"].isin(CODES)].reset_index(drop=True)
+    return parquet_path, lookup_path, known
@@ -0,0 +1,136 @@
+"""
+LayerPager contra um FeatureServer local (http.server numa thread): montagem
+das páginas, retomada pelo cache depois de uma falha e exceededTransferLimit.
+"""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from arcgis_pages import LayerPager, PageError
+
+N_FEATURES = 5
+MAX_RECORDS = 2
+
+
+def feature(i):
+    return {"type": "Feature", "properties": {"OBJECTID": i + 1, "MSOA21CD": f"E0200000{i}"},
+            "geometry": {"type": "Point", "coordinates": [-1.0 + i, 52.0]}}
+
+
+class StandIn:
+    """Estado do servidor: limite real por resposta, offsets que falham e consultas recebidas."""
+
+    def __init__(self):
+        self.cap = MAX_RECORDS
+        self.flag_truncation = True
+        self.fail_offsets = set()
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def respond(self, path, params):
+        if path != "/layer/query":
+            return {"name": "msoa", "maxRecordCount": MAX_RECORDS, "objectIdField": "OBJECTID"}
+        if params.get("returnCountOnly") == "true":
+            return {"count": N_FEATURES}
+        offset, count = int(params["resultOffset"]), int(params["resultRecordCount"])
+        with self.lock:
+            self.queries.append(offset)
+        if offset in self.fail_offsets:
+            return {"error": {"code": 500, "message": "falha simulada"}}
+        rows = [feature(i) for i in range(offset, min(offset + count, N_FEATURES))]
+        truncated = len(rows) > self.cap
+        page = {"type": "FeatureCollection", "features": rows[:self.cap]}
+        if truncated and self.flag_truncation:
+            page["exceededTransferLimit"] = True
+        return page
+
+
+@pytest.fixture
+def server():
+    state = StandIn()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            body = json.dumps(state.respond(url.path, params)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{httpd.server_address[1]}/layer"
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def codes(pager):
+    return [f["properties"]["MSOA21CD"] for page in pager.pages() for f in page]
+
+
+def test_pages_assembled_in_order(server, tmp_path):
+    with LayerPager(server.url, str(tmp_path), workers=3) as pager:
+        assert (pager.count, pager.page_size, pager.offsets) == (N_FEATURES, MAX_RECORDS, [0, 2, 4])
+        assert pager.download() == (3, 0)
+        assert codes(pager) == [f"E0200000{i}" for i in range(N_FEATURES)]
+    assert sorted(server.queries) == [0, 2, 4]
+
+
+def test_resume_from_cache_after_failure(server, tmp_path):
+    server.fail_offsets = {2}
+    with LayerPager(server.url, str(tmp_path), workers=1) as pager:
+        with pytest.raises(PageError) as error:
+            pager.download()
+        assert error.value.offset == 2
+        assert pager.cached(0) and not pager.cached(2)
+
+    # Página corrompida no disco não passa no checksum e é baixada de novo
+    with open(pager.page_path(0), "ab") as f:
+        f.write(b" ")
+    server.fail_offsets.clear()
+    server.queries.clear()
+    with LayerPager(server.url, str(tmp_path), workers=2) as pager:
+        fetched, cached = pager.download()
+        assert fetched + cached == 3
+        assert codes(pager) == [f"E0200000{i}" for i in range(N_FEATURES)]
+    assert 0 in server.queries and 2 in server.queries
+    assert len(server.queries) == fetched
+
+
+def test_cached_run_makes_no_page_requests(server, tmp_path):
+    with LayerPager(server.url, str(tmp_path)) as pager:
+        pager.download()
+    server.queries.clear()
+    with LayerPager(server.url, str(tmp_path)) as pager:
+        assert pager.download() == (0, 3)
+    assert server.queries == []
+
+
+def test_exceeded_transfer_limit_completes_page(server, tmp_path):
+    server.cap = 1  # limite real menor que o maxRecordCount anunciado
+    with LayerPager(server.url, str(tmp_path), workers=2) as pager:
+        pager.download()
+        assert codes(pager) == [f"E0200000{i}" for i in range(N_FEATURES)]
+        with open(pager.page_path(0)) as f:
+            assert json.load(f)["exceededTransferLimit"] is False
+    assert sorted(server.queries) == [0, 1, 2, 3, 4]
+
+
+def test_short_page_without_flag_is_an_error(server, tmp_path):
+    server.cap, server.flag_truncation = 1, False
+    with LayerPager(server.url, str(tmp_path), workers=1) as pager:
+        with pytest.raises(PageError, match="esperados 2"):
+            pager.download()
+        assert not os.path.exists(pager.page_path(0))
@@ -0,0 +1,55 @@
+"""
+AreaStats contra o groupby antigo do analyze_top_areas.py: totais sobre todas
+as linhas do parquet (inclusive áreas sem centróide) e top-k pela FlowTable.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from area_stats import AreaStats, od_totals
+from flow_index import FlowTable
+
+from conftest import CODES, UNKNOWN
+
+
+@pytest.fixture(scope="module")
+def stats(od_files, tmp_path_factory):
+    parquet_path, lookup_path, known = od_files
+    flows = FlowTable.from_parquet(parquet_path, lookup_path)
+    built = AreaStats.build(flows, "msoa", k=3, totals=od_totals(parquet_path))
+    path = str(tmp_path_factory.mktemp("stats") / "area_stats.arrow")
+    built.write(path, {"parquet": parquet_path})
+    return AreaStats.load(path, {"parquet": parquet_path}), pd.read_parquet(parquet_path), known
+
+
+@pytest.mark.parametrize("column, key", [("outflow", "origin_code"), ("inflow", "dest_code")])
+def test_totals_match_groupby_over_all_rows(stats, column, key):
+    area_stats, df, _ = stats
+    expected = df.groupby(key)["count"].sum()
+    got = {str(c): int(v) for c, v in zip(area_stats.codes, area_stats.columns[column])}
+    assert all(got[c] == v for c, v in expected.items())
+    assert sum(got.values()) == df["count"].sum()
+    top = area_stats.top(column, 5)
+    assert area_stats.columns[column][top].tolist() == expected.sort_values(ascending=False).head(5).tolist()
+
+
+def test_area_without_centroid_has_only_totals(stats):
+    area_stats, df, _ = stats
+    i = area_stats.lookup(UNKNOWN)
+    assert i is not None and area_stats.names[i] == f"{UNKNOWN} nome"
+    area = area_stats.area_json(i)
+    assert area["internal"] == df.loc[(df.origin_code == UNKNOWN) & (df.dest_code == UNKNOWN), "count"].sum()
+    assert area["top_origins"] == [] and area["n_origins"] == 0
+
+
+def test_top_partners_use_mapped_flows(stats):
+    area_stats, _, known = stats
+    for code in CODES:
+        area = area_stats.area_json(area_stats.lookup(code))
+        rows = known[(known.dest_code == code) & (known.origin_code != code)]
+        expected = rows.sort_values("count", ascending=False, kind="stable").head(3)
+        assert [(o["code"], o["count"]) for o in area["top_origins"]] == \
+            list(zip(expected.origin_code, expected["count"].astype(int)))
+        assert area["n_origins"] == len(rows)
+        assert np.isclose(area["self_containment"] or 0, round(area["internal"] / area["outflow"], 4)
+                          if area["outflow"] else 0)
@@ -0,0 +1,86 @@
+"""
+BaseFlows (tabela base dos GeoJSON) contra o merge antigo em pandas: filtros
+por qualquer coluna (parquet ou lookup com o_/d_), cache Arrow e sua poda.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from flow_base import BaseFlows, prune_cache
+
+COLS = {c: c for c in ("origin_code", "origin_name", "dest_code", "dest_name", "count")}
+
+
+def reference(parquet_path, lookup_path, flt):
+    """Caminho antigo do 03_make_flows_geojson.py (com sort estável)."""
+    df = pd.read_parquet(parquet_path)
+    lut = pd.read_csv(lookup_path, dtype={"code": "string"})
+    lut = lut.rename(columns={"code": "code_area", "name": "area_name"})
+    df = df.merge(lut.add_prefix("o_"), left_on="origin_code", right_on="o_code_area", how="left")
+    df = df.merge(lut.add_prefix("d_"), left_on="dest_code", right_on="d_code_area", how="left")
+    df = df.dropna(subset=["o_lat", "o_lon", "d_lat", "d_lon"])
+    df = df[(df["o_lat"] != df["d_lat"]) | (df["o_lon"] != df["d_lon"])]
+    for k, v in flt.items():
+        df = df[df[k] == v]
+    df = df.sort_values("count", ascending=False, kind="stable")
+    return list(df[["origin_code", "dest_code", "count"]].itertuples(index=False, name=None))
+
+
+def rows_of(base, rows):
+    oc, dc = base.text["origin_code"], base.text["dest_code"]
+    return list(zip(oc.values[oc.indices[rows]].tolist(), dc.values[dc.indices[rows]].tolist(),
+                    base.counts[rows].tolist()))
+
+
+@pytest.mark.parametrize("flt", [
+    {},
+    {"dest_code": "E02000003"},
+    {"count": 5},
+    {"origin_name": "E02000004 nome"},
+    {"o_area_name": "E02000007"},
+    {"d_code_area": "E02000001", "count": 13},
+])
+def test_filters_match_pandas(od_files, flt):
+    parquet_path, lookup_path, _ = od_files
+    base = BaseFlows(parquet_path, lookup_path, COLS)
+    assert rows_of(base, base.top_rows(flt)) == reference(parquet_path, lookup_path, flt)
+
+
+def test_lat_filter_and_unknown_column(od_files):
+    parquet_path, lookup_path, _ = od_files
+    base = BaseFlows(parquet_path, lookup_path, COLS)
+    lat = pd.read_csv(lookup_path)["lat"].iloc[2]
+    assert rows_of(base, base.top_rows({"d_lat": lat})) == reference(parquet_path, lookup_path, {"d_lat": lat})
+    with pytest.raises(KeyError):
+        base.mask({"o_population": 1})
+    with pytest.raises(KeyError):
+        base.mask({"region": "x"})
+
+
+def test_duplicate_lookup_code_keeps_first_row(od_files, tmp_path):
+    parquet_path, lookup_path, _ = od_files
+    lut = pd.read_csv(lookup_path)
+    duplicated = str(tmp_path / "lookup.csv")
+    pd.concat([lut, lut.iloc[[0]].assign(lat=0.0)]).to_csv(duplicated, index=False)
+    assert len(BaseFlows(parquet_path, duplicated, COLS)) == len(BaseFlows(parquet_path, lookup_path, COLS))
+
+
+def test_cache_round_trip_and_prune(od_files, tmp_path):
+    parquet_path, lookup_path, _ = od_files
+    cache_dir = str(tmp_path / "cache")
+    fresh = BaseFlows.load(parquet_path, lookup_path, COLS, cache_dir=cache_dir)
+    cached = BaseFlows.load(parquet_path, lookup_path, COLS, cache_dir=cache_dir)
+    flt = {"o_area_name": "E02000002"}
+    assert rows_of(cached, cached.top_rows(flt)) == rows_of(fresh, fresh.top_rows(flt))
+
+    os.makedirs(os.path.join(cache_dir, "boundaries"))
+    for i, key in enumerate(["old1", "old2", "old3"]):
+        for prefix in ("base_flows", "base_areas"):
+            path = os.path.join(cache_dir, f"{prefix}-{key}.arrow")
+            open(path, "wb").close()
+            os.utime(path, (i, i))
+    prune_cache(cache_dir, keep=2)
+    left = sorted(os.listdir(cache_dir))
+    assert "boundaries" in left and len(left) == 5
+    assert not any("old1" in name or "old2" in name for name in left)
@@ -0,0 +1,95 @@
+"""
+FlowTable (índice CSR) contra o caminho antigo em pandas (merge com os
+centróides + dropna, filtro e sort_values) numa tabela pequena com empates,
+fluxos internos e códigos sem centróide.
+"""
+import numpy as np
+import pytest
+
+from flow_index import FlowTable
+
+from conftest import CODES, UNKNOWN
+
+
+@pytest.fixture(scope="module")
+def od(od_files):
+    parquet_path, lookup_path, known = od_files
+    return FlowTable.from_parquet(parquet_path, lookup_path), known
+
+
+def as_rows(flows, origin_ids, dest_ids, counts):
+    codes = flows.areas.codes
+    return list(zip(codes[origin_ids].tolist(), codes[dest_ids].tolist(), np.asarray(counts).tolist()))
+
+
+def reference(known, code, direction, limit=None):
+    column = "dest_code" if direction == "incoming" else "origin_code"
+    rows = known[known[column] == code].sort_values("count", ascending=False, kind="stable")
+    return list(rows[["origin_code", "dest_code", "count"]].head(limit).itertuples(index=False, name=None))
+
+
+def test_drops_areas_without_centroid(od):
+    flows, known = od
+    assert len(flows) == len(known)
+    assert UNKNOWN not in flows.areas.codes
+    assert flows.areas.lookup(UNKNOWN) is None
+
+
+@pytest.mark.parametrize("direction", ["incoming", "outgoing"])
+@pytest.mark.parametrize("limit", [None, 1, 3, 100])
+def test_flows_match_pandas(od, direction, limit):
+    flows, known = od
+    for code in CODES:
+        got = as_rows(flows, *flows.flows(code, direction, limit))
+        # Empates na ordem original das linhas, como o sort estável do pandas
+        assert got == reference(known, code, direction, limit)
+
+
+def test_flows_unknown_area_is_empty(od):
+    flows, _ = od
+    assert all(len(a) == 0 for a in flows.flows(UNKNOWN))
+
+
+@pytest.mark.parametrize("direction", ["incoming", "outgoing"])
+def test_rows_many_concatenates_areas(od, direction):
+    flows, known = od
+    selection = ["E02000003", "E02000000", "E02000007"]
+    ids = flows.areas.ids_of(selection)
+    rows = flows.index.rows_many(ids, direction)
+    got = as_rows(flows, flows.origin_ids[rows], flows.dest_ids[rows], flows.counts[rows])
+    assert got == [row for code in selection for row in reference(known, code, direction)]
+    assert len(flows.index.rows_many(ids[:0], direction)) == 0
+
+
+def test_selection_flows_both_counts_internal_once(od):
+    flows, known = od
+    selection = ["E02000001", "E02000004", "E02000005"]
+    ids = flows.areas.ids_of(selection)
+    got = as_rows(flows, *flows.selection_flows(ids, "both"))
+    expected = known[known["dest_code"].isin(selection) | known["origin_code"].isin(selection)]
+    assert sorted(got) == sorted(expected[["origin_code", "dest_code", "count"]].itertuples(index=False, name=None))
+    top = flows.selection_flows(ids, "both", limit=5)[2]
+    assert top.tolist() == sorted(expected["count"], reverse=True)[:5]
+
+
+@pytest.mark.parametrize("direction", ["incoming", "outgoing", "both"])
+def test_aggregate_selection_matches_groupby(od, direction):
+    flows, known = od
+    selection = ["E02000002", "E02000006", "E02000009"]
+    origin_ids, dest_ids, counts, summary = flows.aggregate_selection(flows.areas.ids_of(selection), direction)
+    selection_id = len(flows.areas)
+    inside_o, inside_d = known["origin_code"].isin(selection), known["dest_code"].isin(selection)
+
+    assert summary["areas"] == len(selection)
+    assert summary["internal"] == known.loc[inside_o & inside_d, "count"].sum()
+    codes = flows.areas.codes
+    if direction in ("incoming", "both"):
+        expected = known[inside_d & ~inside_o].groupby("origin_code")["count"].sum().to_dict()
+        mask = dest_ids == selection_id
+        assert dict(zip(codes[origin_ids[mask]].tolist(), counts[mask].tolist())) == expected
+        assert summary["incoming"] == sum(expected.values())
+    if direction in ("outgoing", "both"):
+        expected = known[inside_o & ~inside_d].groupby("dest_code")["count"].sum().to_dict()
+        mask = origin_ids == selection_id
+        assert dict(zip(codes[dest_ids[mask]].tolist(), counts[mask].tolist())) == expected
+        assert summary["outgoing"] == sum(expected.values())
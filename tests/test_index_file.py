@@ -0,0 +1,76 @@
+"""
+Índice mmap (.flowidx): ida e volta igual à FlowTable do parquet (inclusive
+nomes ausentes) e arquivos corrompidos/truncados viram StaleIndexError.
+"""
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from flow_index import FlowTable
+from index_file import MAGIC, StaleIndexError, load_index, write_index
+from od_datasets import load_dataset
+
+
+@pytest.fixture(scope="module")
+def index_files(od_files, tmp_path_factory):
+    parquet_path, lookup_path, _ = od_files
+    flows = FlowTable.from_parquet(parquet_path, lookup_path)
+    flows.areas.set_names([0], [None])
+    path = str(tmp_path_factory.mktemp("index") / "od.flowidx")
+    write_index(path, flows, {"parquet": parquet_path, "lookup_areas": lookup_path})
+    with open(path, "rb") as f:
+        return flows, path, f.read()
+
+
+def test_round_trip_keeps_missing_names(index_files):
+    flows, path, _ = index_files
+    loaded = load_index(path, verify=True)
+    assert loaded.areas.names.tolist() == flows.areas.names.tolist()
+    assert loaded.areas.names[0] is None and loaded.areas.name_json[0] == "null"
+    for a, b in zip(loaded.flows(flows.areas.codes[3]), flows.flows(flows.areas.codes[3])):
+        np.testing.assert_array_equal(a, b)
+
+
+def rewrite_header(raw, change):
+    (size,) = struct.unpack("<I", raw[8:12])
+    header = json.loads(raw[12:12 + size])
+    change(header)
+    encoded = json.dumps(header, separators=(",", ":")).encode().ljust(size)
+    assert len(encoded) == size
+    return raw[:12] + encoded + raw[12 + size:]
+
+
+def shrink_flows(header):
+    header["arrays"]["counts"]["shape"] = [header["n_flows"] - 1]
+
+
+def oversize(header):
+    header["arrays"]["area_lat"]["shape"] = [10 ** 9]
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda raw: b"NOTANIDX" + raw[8:],
+    lambda raw: raw[:10],
+    lambda raw: raw[:12] + b"}" + raw[13:],
+    lambda raw: raw[:len(raw) // 2],
+    lambda raw: rewrite_header(raw, shrink_flows),
+    lambda raw: rewrite_header(raw, oversize),
+    lambda raw: rewrite_header(raw, lambda h: h["arrays"].pop("area_name_present")),
+    lambda raw: b"",
+])
+def test_malformed_files_are_stale(index_files, tmp_path, corrupt):
+    _, _, raw = index_files
+    path = tmp_path / "bad.flowidx"
+    path.write_bytes(corrupt(raw))
+    with pytest.raises(StaleIndexError):
+        load_index(str(path))
+
+
+def test_load_dataset_falls_back_to_parquet(od_files, tmp_path):
+    parquet_path, lookup_path, _ = od_files
+    (tmp_path / "bad.flowidx").write_bytes(MAGIC + b"\xff\xff")
+    entry = {"parquet": parquet_path, "flow_index": str(tmp_path / "bad.flowidx")}
+    flows, source = load_dataset(entry, str(tmp_path), lookup_path)
+    assert source == "parquet" and len(flows) > 0
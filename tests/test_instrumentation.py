@@ -0,0 +1,21 @@
+"""
+Exposição do Prometheus: rótulos limitados e escapados, e o tipo dos valores
+extras (gauge por padrão, counter para totais acumulados).
+"""
+from instrumentation import Metrics, RequestTimer, direction_label
+
+
+def test_labels_are_bounded_and_escaped():
+    assert direction_label("incoming") == "incoming"
+    assert direction_label('x"}\nflows_fake 1') == "-"
+    metrics = Metrics()
+    metrics.observe(RequestTimer(), 'a"b\\c\nd', "both", 200, 10)
+    text = metrics.render()
+    assert 'endpoint="a\\"b\\\\c\\nd"' in text
+    assert "\nd" not in text.replace("\\nd", "")
+
+
+def test_extra_values_have_types():
+    text = Metrics().render({"flows_ready": 1, "flows_response_cache_hits_total": (7, "counter")})
+    assert "# TYPE flows_ready gauge\nflows_ready 1" in text
+    assert "# TYPE flows_response_cache_hits_total counter\nflows_response_cache_hits_total 7" in text
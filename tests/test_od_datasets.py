@@ -0,0 +1,28 @@
+"""
+DatasetRegistry: sem manifesto, o conjunto padrão leva o nome configurado, e
+um manifesto com o mesmo nome serve a mesma tabela.
+"""
+import pytest
+
+from flow_index import FlowTable
+from od_datasets import DatasetRegistry
+
+
+@pytest.fixture(scope="module")
+def flows(od_files):
+    parquet_path, lookup_path, _ = od_files
+    return FlowTable.from_parquet(parquet_path, lookup_path)
+
+
+def test_default_name_without_manifest(flows, od_files, tmp_path):
+    registry = DatasetRegistry(None, str(tmp_path), od_files[1], flows, default_name="odwp01ew-2021")
+    assert registry.default == "odwp01ew-2021" and registry.names() == ["odwp01ew-2021"]
+    assert registry.table("odwp01ew-2021") is flows
+    with pytest.raises(ValueError):
+        registry.table("default")
+
+
+def test_manifest_default_keeps_the_name(flows, od_files, tmp_path):
+    manifest = {"default": "odwp01ew-2021", "datasets": {"odwp01ew-2021": {"parquet": od_files[0]}}}
+    registry = DatasetRegistry(manifest, str(tmp_path), od_files[1], flows, default_name="odwp01ew-2021")
+    assert registry.table("odwp01ew-2021") is flows
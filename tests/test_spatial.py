@@ -0,0 +1,78 @@
+"""
+PointIndex (cKDTree na esfera + varreduras vetorizadas) contra força bruta
+com haversine em todos os pontos.
+"""
+import numpy as np
+import pytest
+
+from spatial import PointIndex, haversine_km, parse_circle, points_in_polygon
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(3)
+    lon, lat = rng.uniform(-6, 2, 3000), rng.uniform(49.9, 55.8, 3000)
+    return lon, lat, PointIndex(lon, lat)
+
+
+@pytest.mark.parametrize("radius_km", [0.0, 5.0, 40.0, 2000.0, 30000.0])
+def test_within_radius_matches_brute_force(points, radius_km):
+    lon, lat, index = points
+    dist = haversine_km(-1.5, 52.5, lon, lat)
+    ids, got = index.within_radius(-1.5, 52.5, radius_km)
+    np.testing.assert_array_equal(ids, np.flatnonzero(dist <= radius_km))
+    np.testing.assert_allclose(got, dist[ids])
+
+
+@pytest.mark.parametrize("k", [1, 7, 3000])
+def test_nearest_matches_brute_force(points, k):
+    lon, lat, index = points
+    dist = haversine_km(0.3, 51.2, lon, lat)
+    ids, got = index.nearest(0.3, 51.2, k)
+    expected = np.lexsort((np.arange(len(dist)), dist))[:k]
+    np.testing.assert_array_equal(ids, expected)
+    np.testing.assert_allclose(got, dist[expected])
+
+
+def test_bbox_and_polygon(points):
+    lon, lat, index = points
+    bbox = (-2.0, 51.0, 0.0, 53.0)
+    inside = (lon >= -2) & (lon <= 0) & (lat >= 51) & (lat <= 53)
+    np.testing.assert_array_equal(index.in_bbox(bbox), np.flatnonzero(inside))
+    # Quadrado = mesma região da bbox; triângulo contra um ray-casting escrito aqui
+    square = [[-2, 51], [0, 51], [0, 53], [-2, 53]]
+    np.testing.assert_array_equal(index.in_polygon(square), np.flatnonzero(inside))
+    triangle = [[-5, 50], [1, 50.5], [-1, 55]]
+    np.testing.assert_array_equal(index.in_polygon(triangle), np.flatnonzero(ray_cast(lon, lat, triangle)))
+    with pytest.raises(ValueError):
+        index.in_polygon([[0, 0], [1, 1]])
+
+
+def ray_cast(lon, lat, ring):
+    """Ponto a ponto, sem numpy vetorizado: paridade dos cruzamentos com as arestas."""
+    result = []
+    for x, y in zip(lon.tolist(), lat.tolist()):
+        inside = False
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        result.append(inside)
+    return np.array(result)
+
+
+def test_polygon_hand_picked_points():
+    lon = np.array([-1.0, -1.0, 0.5, -4.9, 0.9, -3.0])
+    lat = np.array([52.0, 56.0, 52.0, 50.1, 50.45, 54.0])
+    triangle = [[-5, 50], [1, 50.5], [-1, 55]]
+    assert PointIndex(lon, lat).in_polygon(triangle).tolist() == [0, 3]
+    assert points_in_polygon(lon, lat, triangle).tolist() == [True, False, False, True, False, False]
+
+
+def test_empty_index_and_circle_parsing():
+    index = PointIndex([], [])
+    assert len(index.nearest(0, 0, 3)[0]) == 0
+    assert len(index.within_radius(0, 0, 10)[0]) == 0
+    assert parse_circle("-0.1,51.5,5") == (-0.1, 51.5, 5.0)
+    for bad in ("1,2,-3", "nan,51.5,5", "0,inf,5"):
+        with pytest.raises(ValueError):
+            parse_circle(bad)
@@ -0,0 +1,30 @@
+"""
+TileArchive: ida e volta XYZ -> TMS e coordenadas fora do intervalo (z além
+do maxzoom não pode chegar ao SQLite, onde `1 << z` estoura o int64).
+"""
+import gzip
+
+import pytest
+
+from tile_archive import TileArchive, write_mbtiles
+
+
+@pytest.fixture(scope="module")
+def archive(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("tiles") / "flows.mbtiles")
+    tiles = [(z, x, y, gzip.compress(f"{z}/{x}/{y}".encode()))
+             for z in range(2, 4) for x in range(1 << z) for y in range(1 << z) if (x + y) % 2 == 0]
+    write_mbtiles(path, tiles, {"name": "flows", "minzoom": "2", "maxzoom": "3",
+                                "bounds": "-6,49,2,56", "center": "-1,52,2"})
+    return TileArchive(path)
+
+
+def test_tile_round_trip(archive):
+    assert gzip.decompress(archive.tile(3, 5, 1)) == b"3/5/1"
+    assert archive.tile(3, 5, 2) is None  # tile vazio
+    assert archive.tilejson("x")["minzoom"] == 2
+
+
+@pytest.mark.parametrize("z, x, y", [(0, 0, 0), (1, 0, 0), (4, 0, 0), (80, 0, 0), (3, 8, 0), (3, 0, 8), (2, -1, 0)])
+def test_out_of_range_is_none(archive, z, x, y):
+    assert archive.tile(z, x, y) is None